@@ -0,0 +1,4 @@
+'''Offline benchmarks for the MCP server's tools, run against local
+stand-ins for every upstream service. Each module runs on its own, e.g.
+python -m benchmarks.extraction; benchmarks/run.py runs them all and saves
+the results.'''
@@ -0,0 +1,71 @@
+'''Article text extraction as it was before the extractor was reused and
+the cleaning done in a single pass, kept as the baseline for the
+extraction benchmark.'''
+
+import re
+
+from boilerpy3 import extractors
+from boilerpy3.exceptions import HTMLExtractionError
+
+
+def get_text(html: str) -> str:
+    '''Uses boilerpy3 extractor and regex cribbed from old NLTK clean_html
+    function to try and extract text from HTML as cleanly as possible.
+    
+    Args:
+        html: the HTML string to be cleaned
+        
+    Returns:
+        Cleaned text string'''
+
+    if html is None:
+        return None
+
+    extractor = extractors.ArticleExtractor()
+
+    try:
+        html = extractor.get_content(html)
+
+    except HTMLExtractionError:
+        pass
+
+    except AttributeError:
+        pass
+
+    except TypeError:
+        pass
+
+    return clean_html(html)
+
+
+def clean_html(html: str) -> str:
+    '''
+    Remove HTML markup from the given string. 
+
+    Args:
+        html: the HTML string to be cleaned
+
+    Returns:
+        Cleaned string
+    '''
+
+    if html is None:
+        return None
+
+    # First we remove inline JavaScript/CSS:
+    cleaned = re.sub(r"(?is)<(script|style).*?>.*?(</\1>)", "", html.strip())
+
+    # Then we remove html comments. This has to be done before removing regular
+    # tags since comments can contain '>' characters.
+    cleaned = re.sub(r"(?s)<!--(.*?)-->[\n]?", "", cleaned)
+
+    # Next we can remove the remaining tags:
+    cleaned = re.sub(r"(?s)<.*?>", " ", cleaned)
+
+
+    # Finally, we deal with whitespace
+    cleaned = re.sub(r"&nbsp;", " ", cleaned)
+    cleaned = re.sub(r"  ", " ", cleaned)
+    cleaned = re.sub(r"  ", " ", cleaned)
+
+    return cleaned.strip()
@@ -0,0 +1,269 @@
+'''Deterministic synthetic corpus of feeds, article pages and queries. The
+same feed and article numbers always give the same content, so runs on
+different commits see identical inputs.
+
+Article pages are wrapped in the navigation, script, sidebar and footer
+boilerplate real news pages have, so text extraction has realistic work to
+do. Each article has a topic and a made-up codename, which makes it the one
+right answer for queries built from them.'''
+
+import random
+from email.utils import formatdate
+from html import escape
+
+# Topic vocabularies: article text and queries draw on the same words
+TOPICS = {
+    'aviation': ['air', 'traffic', 'control', 'runway', 'pilots', 'radar', 'airport', 'flight'],
+    'energy': ['solar', 'grid', 'battery', 'turbine', 'utility', 'power', 'storage', 'renewable'],
+    'space': ['rocket', 'orbit', 'satellite', 'launch', 'lunar', 'telescope', 'astronaut', 'mars'],
+    'security': ['malware', 'breach', 'vulnerability', 'patch', 'ransomware', 'encryption', 'phishing', 'exploit'],
+    'biology': ['protein', 'genome', 'cell', 'enzyme', 'species', 'mutation', 'bacteria', 'evolution'],
+    'economy': ['inflation', 'market', 'interest', 'rates', 'trade', 'tariff', 'growth', 'labor'],
+    'computing': ['processor', 'compiler', 'kernel', 'memory', 'cache', 'thread', 'database', 'latency'],
+    'climate': ['emissions', 'carbon', 'warming', 'glacier', 'drought', 'ocean', 'methane', 'forest']
+}
+
+FILLER = (
+    'the a of and to in that is for on with as was by it at from this be are have an '
+    'which has said new more one their after also would about been were other into year '
+    'first than some could people two over them most report officials according study'
+).split()
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sha', 'qui', 'dro', 'bel', 'nix', 'zo', 'pra', 'dun']
+
+TITLE_TEMPLATES = [
+    'How {codename} is changing {a} {b}',
+    '{Codename} project reports {a} {b} breakthrough',
+    'Inside the {a} {b} plan called {codename}',
+    'Why {codename} matters for {a} and {b}',
+    '{Codename}: what the new {a} {b} data shows'
+]
+
+# Article shape: paragraphs per article and words per paragraph
+PARAGRAPHS = (6, 12)
+PARAGRAPH_WORDS = (60, 120)
+
+# Dates: entry i of a feed is i hours older than the corpus epoch
+EPOCH = 1735689600
+
+
+def article(feed: int, index: int) -> dict:
+    '''Gets one article of the corpus.
+
+    Args:
+        feed: feed number
+        index: position of the article in the feed, 0 is the newest
+
+    Returns:
+        Dictionary with 'feed', 'index', 'title', 'topic', 'codename',
+        'published' (Unix timestamp) and 'paragraphs' keys
+    '''
+
+    rng = random.Random(f'article-{feed}-{index}')
+
+    topic = rng.choice(sorted(TOPICS))
+    words = TOPICS[topic]
+    codename = ''.join(rng.choice(SYLLABLES) for _ in range(3)) + str(feed * 1000 + index)
+    a, b = rng.sample(words, 2)
+
+    title = rng.choice(TITLE_TEMPLATES).format(
+        codename=codename,
+        Codename=codename.capitalize(),
+        a=a,
+        b=b
+    )
+
+    paragraphs = []
+
+    for _ in range(rng.randint(*PARAGRAPHS)):
+        paragraph = []
+
+        for _ in range(rng.randint(*PARAGRAPH_WORDS)):
+            roll = rng.random()
+
+            if roll < 0.2:
+                paragraph.append(rng.choice(words))
+
+            elif roll < 0.23:
+                paragraph.append(codename)
+
+            else:
+                paragraph.append(rng.choice(FILLER))
+
+        paragraphs.append(' '.join(paragraph).capitalize() + '.')
+
+    return {
+        'feed': feed,
+        'index': index,
+        'title': title,
+        'topic': topic,
+        'codename': codename,
+        'published': EPOCH - index * 3600,
+        'paragraphs': paragraphs
+    }
+
+
+def article_path(feed: int, index: int) -> str:
+    '''Gets the fixture server path of an article page.'''
+
+    return f'/articles/{feed}/{index}.html'
+
+
+def feed_path(feed: int) -> str:
+    '''Gets the fixture server path of a feed.'''
+
+    return f'/feeds/{feed}.xml'
+
+
+def site_path(feed: int) -> str:
+    '''Gets the fixture server path of the website a feed belongs to.'''
+
+    return f'/sites/{feed}/'
+
+
+def article_html(feed: int, index: int) -> str:
+    '''Renders an article page with typical news site boilerplate.
+
+    Args:
+        feed: feed number
+        index: position of the article in the feed
+
+    Returns:
+        HTML string
+    '''
+
+    item = article(feed, index)
+    navigation = ''.join(f'<li><a href="/section/{topic}">{topic.title()}</a></li>' for topic in TOPICS)
+    body = ''.join(f'<p>{escape(paragraph)}</p>\n' for paragraph in item['paragraphs'])
+
+    related = ''.join(
+        f'<li><a href="{article_path(feed, other)}">{escape(article(feed, other)["title"])}</a></li>'
+        for other in range(index + 1, index + 4)
+    )
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{escape(item['title'])} | Feed {feed} News</title>
+<link rel="alternate" type="application/rss+xml" href="{feed_path(feed)}">
+<style>body {{ font-family: sans-serif; }} .sidebar {{ float: right; width: 30%; }}</style>
+<script>window.analytics = {{ page: "{article_path(feed, index)}", ts: {item['published']} }};</script>
+</head>
+<body>
+<header><nav><ul>{navigation}</ul></nav><form><input name="q" placeholder="Search"></form></header>
+<!-- advertisement slot -->
+<div class="sidebar"><h3>Related</h3><ul>{related}</ul><p>Subscribe to our newsletter for daily updates.</p></div>
+<article>
+<h1>{escape(item['title'])}</h1>
+<p class="byline">By Staff Writer, {formatdate(item['published'], usegmt=True)}</p>
+{body}</article>
+<footer><p>Copyright Feed {feed} News. All rights reserved.</p><ul>{navigation}</ul></footer>
+<script>document.querySelectorAll("a").forEach(function (a) {{ a.rel = "noopener"; }});</script>
+</body>
+</html>
+'''
+
+
+def feed_xml(feed: int, base_url: str, entries: int) -> str:
+    '''Renders an RSS 2.0 feed whose entries link to the article pages.
+
+    Args:
+        feed: feed number
+        base_url: fixture server URL, without trailing slash
+        entries: number of entries in the feed
+
+    Returns:
+        RSS XML string
+    '''
+
+    items = []
+
+    for index in range(entries):
+        item = article(feed, index)
+        link = base_url + article_path(feed, index)
+
+        items.append(
+            '<item>'
+            f'<title>{escape(item["title"])}</title>'
+            f'<link>{link}</link>'
+            f'<guid isPermaLink="false">feed-{feed}-article-{index}</guid>'
+            f'<pubDate>{formatdate(item["published"], usegmt=True)}</pubDate>'
+            f'<description>{escape(item["paragraphs"][0][:200])}</description>'
+            '</item>'
+        )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0"><channel>'
+        f'<title>Feed {feed} News</title>'
+        f'<link>{base_url}{site_path(feed)}</link>'
+        '<description>Benchmark fixture feed</description>'
+        '<ttl>60</ttl>'
+        + ''.join(items) +
+        '</channel></rss>'
+    )
+
+
+def site_html(feed: int) -> str:
+    '''Renders a website home page advertising its feed.'''
+
+    return (
+        '<!DOCTYPE html><html><head>'
+        f'<title>Feed {feed} News</title>'
+        f'<link rel="alternate" type="application/rss+xml" title="RSS" href="{feed_path(feed)}">'
+        f'</head><body><h1>Feed {feed} News</h1></body></html>'
+    )
+
+
+def search_queries(feeds: int, entries: int) -> list:
+    '''Builds vector search queries, one per article, from its codename
+    and two of its topic's words.
+
+    Args:
+        feeds: number of feeds
+        entries: number of articles per feed
+
+    Returns:
+        List of (query, title of the one relevant article) tuples
+    '''
+
+    queries = []
+
+    for feed in range(feeds):
+        for index in range(entries):
+            item = article(feed, index)
+            rng = random.Random(f'query-{feed}-{index}')
+            words = rng.sample(TOPICS[item['topic']], 2)
+            queries.append((f'{item["codename"]} {words[0]} {words[1]}', item['title']))
+
+    return queries
+
+
+def approximate_title(title: str, seed: str) -> str:
+    '''Gets a title the way a user might misremember it: one word dropped
+    and one typo.
+
+    Args:
+        title: exact title
+        seed: seed for the changes
+
+    Returns:
+        Approximate title
+    '''
+
+    rng = random.Random(seed)
+    words = title.split()
+
+    if len(words) > 3:
+        del words[rng.randrange(1, len(words))]
+
+    target = rng.randrange(len(words))
+    word = words[target]
+
+    if len(word) > 3:
+        position = rng.randrange(1, len(word) - 1)
+        words[target] = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+    return ' '.join(words)
+
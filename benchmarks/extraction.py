@@ -0,0 +1,91 @@
+'''Article text extraction benchmark: times the current and the baseline
+extraction one page at a time and measures the memory each allocates per
+page. The baseline is benchmarks/baseline_extraction.py.
+
+    python -m benchmarks.extraction
+    python -m benchmarks.extraction --corpus <directory of saved .html pages>
+'''
+
+import argparse
+from pathlib import Path
+
+import benchmarks.baseline_extraction as baseline_extraction
+import benchmarks.corpus as corpus
+import functions.feed_extraction as extraction_funcs
+from benchmarks.timing import measure, measure_allocations, print_header, print_scenario
+
+# Synthetic pages are taken this many articles per feed
+ENTRIES = 20
+
+
+def main() -> None:
+    '''Parses arguments, runs the benchmark and prints the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.extraction',
+        description='Benchmarks article text extraction against the baseline extraction.'
+    )
+
+    parser.add_argument('--pages', type=int, default=100, help='number of article pages')
+    parser.add_argument('--corpus', help='directory of recorded .html article pages to extract instead')
+    args = parser.parse_args()
+
+    print_header()
+    print_scenario('extraction', run(load_pages(args.pages, args.corpus)))
+
+
+def load_pages(count: int, directory: str = None, entries: int = ENTRIES) -> list:
+    '''Gets article pages: recorded pages from directory if given,
+    synthetic pages otherwise.
+
+    Args:
+        count: maximum number of pages
+        directory: optional directory searched recursively for .html files
+        entries: synthetic articles per feed
+
+    Returns:
+        List of HTML strings
+    '''
+
+    if directory is not None:
+        paths = sorted(Path(directory).rglob('*.html'))[:count]
+
+        return [path.read_text(encoding='utf-8', errors='replace') for path in paths]
+
+    return [corpus.article_html(i // entries, i % entries) for i in range(count)]
+
+
+def run(pages: list) -> dict:
+    '''Times text extraction one page at a time and measures the memory it
+    allocates, for the current and the baseline extraction.
+
+    Args:
+        pages: list of HTML strings
+
+    Returns:
+        Dictionary with 'runs', 'allocations', 'pages' and
+        'mean_page_bytes' keys
+    '''
+
+    extractors = {
+        'get_text': extraction_funcs._get_text, # pylint: disable=protected-access
+        'get_text_baseline': baseline_extraction.get_text,
+        'clean_html': extraction_funcs._clean_html, # pylint: disable=protected-access
+        'clean_html_baseline': baseline_extraction.clean_html
+    }
+
+    # One call each first, so whichever runs first doesn't pay for
+    # warming up what they share
+    for extract in extractors.values():
+        extract(pages[0])
+
+    return {
+        'runs': {label: measure(extract, pages, 1) for label, extract in extractors.items()},
+        'allocations': {label: measure_allocations(extract, pages) for label, extract in extractors.items()},
+        'pages': len(pages),
+        'mean_page_bytes': round(sum(map(len, pages)) / len(pages))
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''Sync vs async tools under concurrent load: latency and throughput of
+get_feed on feeds never read before, from the sync tools with one thread
+per session and from the async tools on one event loop, at each
+concurrency level. Runs against the local stand-ins.
+
+    python -m benchmarks.load --concurrency 1 8 32
+'''
+
+import json
+import asyncio
+import argparse
+import itertools
+
+import benchmarks.stand_ins as stand_ins
+from benchmarks.timing import ameasure, measure, print_header, print_scenario
+
+
+def main() -> None:
+    '''Parses arguments, runs the benchmark and prints the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.load',
+        description='Benchmarks the sync and async get_feed at several concurrency levels.'
+    )
+
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='concurrency levels')
+    parser.add_argument('--requests', type=int, default=40, help='calls per run')
+    parser.add_argument('--n', type=int, default=3, help='articles read per get_feed call')
+    parser.add_argument('--http-latency', type=float, default=0.02, help='seconds per fixture request')
+    parser.add_argument('--redis-latency', type=float, default=0.002, help='seconds per Redis command')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='seconds per summary')
+    args = parser.parse_args()
+
+    # Before importing the tools starts the RAG ingest workers
+    stand_ins.use_offline_splitter()
+
+    installed = stand_ins.install(
+        http_latency=args.http_latency,
+        redis_latency=args.redis_latency,
+        llm_latency=args.llm_latency
+    )
+
+    import functions.async_tools as async_tools # pylint: disable=import-outside-toplevel
+    import functions.tools as tool_funcs # pylint: disable=import-outside-toplevel
+
+    fixtures = installed['fixtures']
+    feeds = itertools.count()
+    loop = asyncio.new_event_loop()
+
+    def feed_urls() -> list:
+        return [fixtures.feed_url(next(feeds)) for _ in range(args.requests)]
+
+    def check(feed_url: str, result: str) -> bool: # pylint: disable=unused-argument
+        if result == 'No feed found':
+            return False
+
+        return sum(1 for article in json.loads(result).values() if article.get('summary')) == args.n
+
+    runs = compare(
+        lambda website: tool_funcs.get_feed(website, n=args.n),
+        lambda website: async_tools.get_feed(website, n=args.n),
+        feed_urls,
+        args.concurrency,
+        loop,
+        check
+    )
+
+    print_header()
+    print_scenario('get_feed_cold', {'runs': runs})
+
+    tool_funcs.FEED_POLLER.stop()
+    tool_funcs.RAG_INGEST_POOL.shutdown()
+    loop.close()
+    fixtures.stop()
+    installed['llm'].stop()
+
+
+def compare(function, async_function, make_inputs, concurrency_levels: list, loop, check=None) -> dict:
+    '''Runs a sync function from threads and its async version on an event
+    loop, at each concurrency level.
+
+    Args:
+        function: callable taking one input
+        async_function: coroutine function taking one input
+        make_inputs: callable returning the inputs for one run, called once
+        per run so runs on cold inputs get new ones each time
+        concurrency_levels: list of numbers of calls in flight at once
+        loop: event loop to run async_function on
+        check: optional callable taking an input and the result, returning
+        False if the result is wrong
+
+    Returns:
+        Statistics per run, labelled 'sync c=<concurrency>' and
+        'async c=<concurrency>'
+    '''
+
+    runs = {}
+
+    for concurrency in concurrency_levels:
+        runs[f'sync c={concurrency}'] = measure(function, make_inputs(), concurrency, check)
+
+        runs[f'async c={concurrency}'] = loop.run_until_complete(
+            ameasure(async_function, make_inputs(), concurrency, check)
+        )
+
+    return runs
+
+
+if __name__ == '__main__':
+    main()
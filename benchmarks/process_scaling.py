@@ -0,0 +1,72 @@
+'''Process pool scaling benchmark: article text extraction throughput with
+extraction in the calling thread (0 workers) and in 1 or more worker
+processes. Scaling needs as many free cores as workers.
+
+    python -m benchmarks.process_scaling --workers 0 1 2 4 --concurrency 8
+'''
+
+import os
+import argparse
+
+import benchmarks.extraction as extraction
+import benchmarks.stand_ins as stand_ins
+import functions.feed_extraction as extraction_funcs
+import functions.process_pool as process_pool
+from benchmarks.timing import measure, print_header, print_scenario
+
+
+def main() -> None:
+    '''Parses arguments, runs the benchmark and prints the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.process_scaling',
+        description='Benchmarks extraction throughput for several process pool sizes.'
+    )
+
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4], help='process pool sizes')
+    parser.add_argument('--concurrency', type=int, default=8, help='extractions in flight at once')
+    parser.add_argument('--pages', type=int, default=100, help='number of article pages')
+    parser.add_argument('--corpus', help='directory of recorded .html article pages to extract instead')
+    args = parser.parse_args()
+
+    # Worker processes build a splitter when they start
+    stand_ins.use_offline_splitter()
+
+    pages = extraction.load_pages(args.pages, args.corpus)
+
+    print_header()
+    print_scenario('process_pool', run(pages, args.workers, args.concurrency))
+
+
+def run(pages: list, worker_counts: list, concurrency: int) -> dict:
+    '''Times extraction through the process pool for each pool size.
+
+    Args:
+        pages: list of HTML strings
+        worker_counts: process pool sizes to run with
+        concurrency: extractions in flight at once
+
+    Returns:
+        Dictionary with 'runs', statistics per pool size
+    '''
+
+    runs = {}
+
+    def extract(html: str) -> str:
+        return process_pool.run(extraction_funcs._get_text, html) # pylint: disable=protected-access
+
+    for n_workers in worker_counts:
+        process_pool.stop()
+        process_pool.start(n_workers)
+
+        runs[f'workers={n_workers} c={concurrency}'] = measure(extract, pages, concurrency)
+
+    # Back to the configured pool, as the server starts it
+    process_pool.stop()
+    process_pool.start(int(os.environ.get('PROCESS_WORKERS', '0')))
+
+    return {'runs': runs}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,557 @@
+'''Runs the benchmarks against local stand-ins and saves the results, so
+runs on different commits can be compared.
+
+    python -m benchmarks.run
+    python -m benchmarks.run get_feed context_search --concurrency 1 4 16
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Scenarios, run in this order:
+
+    startup         import time of the tools and the server module, and time
+                    until the Gradio app answers, each in a fresh process
+    serialization   cache envelope encode and decode times, and size ratio
+    extraction      article text extraction and markup stripping, one page
+                    at a time, with peak memory allocated per page, against
+                    the baseline in benchmarks/baseline_extraction.py
+    process_pool    extraction throughput with 0 (in-thread) and more worker
+                    processes
+    get_feed_cold   get_feed on feeds never seen before: discovery, feed,
+                    article fetches, extraction, summaries and ingest
+    get_feed        get_feed on feeds already read once
+    get_feeds       async get_feeds over --batch cold feeds at a time
+    context_search  passage search over the ingested articles
+    find_article    title lookup from a description of the article
+    get_summary     summary lookup from an approximate title
+    get_link        link lookup from an approximate title
+    search_recall   recall@1/3/5 and latency of vector_store.search_articles
+                    with each aggregation
+
+The tool scenarios run the sync tools and the async tools at each
+concurrency level. Latencies are in milliseconds, throughput in calls per
+second.'''
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import logging
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import benchmarks.corpus as corpus
+import benchmarks.extraction as extraction
+import benchmarks.load as load
+import benchmarks.process_scaling as process_scaling
+import benchmarks.search_recall as search_recall
+import benchmarks.serialization as serialization
+import benchmarks.stand_ins as stand_ins
+import benchmarks.startup as startup
+from benchmarks.timing import ameasure, print_header, print_scenario
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+SCENARIOS = [
+    'startup',
+    'serialization',
+    'extraction',
+    'process_pool',
+    'get_feed_cold',
+    'get_feed',
+    'get_feeds',
+    'context_search',
+    'find_article',
+    'get_summary',
+    'get_link',
+    'search_recall'
+]
+
+# Run before the stand-ins start any threads, so worker processes are
+# forked from a single-threaded process as they are in the server
+PRE_INSTALL_SCENARIOS = ['startup', 'serialization', 'extraction', 'process_pool']
+
+# Cold feeds are numbered from here, clear of the warm feeds
+COLD_FEEDS_START = 10000
+
+# Seconds to wait for the RAG ingest queue to drain before searching
+INGEST_TIMEOUT = 300
+
+def main() -> None:
+    '''Parses arguments, runs the scenarios, prints and saves the
+    results.'''
+
+    args = parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(levelname)s - %(name)s - %(message)s')
+
+    # Before any worker process or ingest thread builds a splitter
+    stand_ins.use_offline_splitter()
+
+    results = {
+        'commit': _commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {name: value for name, value in vars(args).items() if name not in ('compare', 'no_save')},
+        'scenarios': {}
+    }
+
+    bench = Bench(args)
+
+    for scenario in [name for name in SCENARIOS if name in args.scenarios]:
+        if scenario not in PRE_INSTALL_SCENARIOS:
+            bench.install()
+
+        print(f'Running {scenario}...', file=sys.stderr, flush=True)
+        results['scenarios'][scenario] = getattr(bench, scenario)()
+
+    bench.close()
+
+    print_results(results)
+
+    if args.compare is not None:
+        with open(args.compare, encoding='utf-8') as input_file:
+            print_comparison(json.load(input_file), results)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output_path = RESULTS_DIR / f'{stamp}-{results["commit"]}.json'
+
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+
+        print(f'\nSaved results to {output_path}')
+
+
+def parse_args() -> argparse.Namespace:
+    '''Parses the command line.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Benchmarks the MCP tools against local stand-ins for their upstream services.'
+    )
+
+    parser.add_argument('scenarios', nargs='*', default=SCENARIOS, help='scenarios to run, defaults to all')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='concurrency levels')
+    parser.add_argument('--requests', type=int, default=40, help='calls per tool run')
+    parser.add_argument('--feeds', type=int, default=12, help='number of warm feeds')
+    parser.add_argument('--entries', type=int, default=20, help='entries per feed')
+    parser.add_argument('--n', type=int, default=3, help='articles read per get_feed call')
+    parser.add_argument('--batch', type=int, default=4, help='feeds per get_feeds call')
+    parser.add_argument('--hosts', type=int, default=8, help='fixture server ports feeds are spread over')
+    parser.add_argument('--http-latency', type=float, default=0.02, help='seconds per fixture request')
+    parser.add_argument('--redis-latency', type=float, default=0.002, help='seconds per Redis command')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='seconds per summary')
+    parser.add_argument('--pages', type=int, default=100, help='article pages for extraction and serialization')
+    parser.add_argument('--corpus', help='directory of recorded .html article pages to extract instead')
+    parser.add_argument('--process-workers', type=int, nargs='+', default=[0, 1, 2, 4], help='process pool sizes')
+    parser.add_argument('--startup-runs', type=int, default=3, help='fresh processes per startup measurement')
+    parser.add_argument('--no-launch', action='store_true', help='only time imports in the startup scenario')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--no-save', action='store_true', help='do not save the results')
+    parser.add_argument('--log-level', default='WARNING', help='log level of the functions modules')
+
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+
+    if len(unknown) > 0:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}, choose from {", ".join(SCENARIOS)}')
+
+    return args
+
+
+class Bench:
+    '''Scenario runner. Each scenario method returns a dictionary with
+    'runs', statistics per run label, and optionally 'upstream', the
+    requests the stand-ins answered during the scenario.'''
+
+    def __init__(self, args: argparse.Namespace):
+        '''Args:
+            args: parsed command line
+        '''
+
+        self.args = args
+        self.stand_ins = None
+        self.loop = None
+        self.cold_feeds = itertools.count(COLD_FEEDS_START)
+        self.warm = False
+
+
+    def install(self) -> None:
+        '''Starts the stand-ins on first use. The async tools share one event
+        loop, as they do in the server.'''
+
+        if self.stand_ins is not None:
+            return
+
+        args = self.args
+
+        self.stand_ins = stand_ins.install(
+            hosts=args.hosts,
+            entries=args.entries,
+            http_latency=args.http_latency,
+            redis_latency=args.redis_latency,
+            llm_latency=args.llm_latency
+        )
+
+        self.loop = asyncio.new_event_loop()
+
+
+    def close(self) -> None:
+        '''Stops the stand-ins and the event loop.'''
+
+        if self.stand_ins is None:
+            return
+
+        import functions.tools as tool_funcs # pylint: disable=import-outside-toplevel
+
+        tool_funcs.FEED_POLLER.stop()
+        tool_funcs.RAG_INGEST_POOL.shutdown()
+
+        self.loop.close()
+        self.stand_ins['fixtures'].stop()
+        self.stand_ins['llm'].stop()
+
+
+    def startup(self) -> dict:
+        '''Times imports and app launch, each in a fresh interpreter.'''
+
+        return startup.run(self.args.startup_runs, launch=not self.args.no_launch)
+
+
+    def serialization(self) -> dict:
+        '''Times cache envelope encoding and decoding of extracted article
+        texts, and decoding values stored without an envelope.'''
+
+        return serialization.run(self.pages())
+
+
+    def extraction(self) -> dict:
+        '''Times text extraction one page at a time and measures the memory
+        it allocates, for the current and the baseline extraction.'''
+
+        return extraction.run(self.pages())
+
+
+    def process_pool(self) -> dict:
+        '''Times extraction through the process pool for each pool size, at
+        the highest concurrency level.'''
+
+        return process_scaling.run(self.pages(), self.args.process_workers, max(self.args.concurrency))
+
+
+    def get_feed_cold(self) -> dict:
+        '''Calls get_feed on website URLs of feeds never seen before.'''
+
+        def websites() -> list:
+            return [self.stand_ins['fixtures'].site_url(next(self.cold_feeds)) for _ in range(self.args.requests)]
+
+        return self.tool_runs('get_feed', websites, self.check_feed)
+
+
+    def get_feed(self) -> dict:
+        '''Calls get_feed on the feeds read by warm_up().'''
+
+        self.warm_up()
+        fixtures = self.stand_ins['fixtures']
+
+        def websites() -> list:
+            return [fixtures.feed_url(i % self.args.feeds) for i in range(self.args.requests)]
+
+        return self.tool_runs('get_feed', websites, self.check_feed)
+
+
+    def get_feeds(self) -> dict:
+        '''Calls the async get_feeds on batches of cold feeds.'''
+
+        import functions.async_tools as async_tools # pylint: disable=import-outside-toplevel
+
+        fixtures = self.stand_ins['fixtures']
+        runs = {}
+        before = self.upstream_counts()
+
+        def check(websites: list, result: str) -> bool:
+            return len(json.loads(result)['articles']) == len(websites) * self.args.n
+
+        for concurrency in self.args.concurrency:
+            batches = [
+                [fixtures.site_url(next(self.cold_feeds)) for _ in range(self.args.batch)]
+                for _ in range(max(1, self.args.requests // self.args.batch))
+            ]
+
+            runs[f'async c={concurrency}'] = self.loop.run_until_complete(
+                ameasure(lambda websites: async_tools.get_feeds(websites, n=self.args.n), batches, concurrency, check)
+            )
+
+        return {'runs': runs, 'upstream': self.upstream_delta(before)}
+
+
+    def context_search(self) -> dict:
+        '''Searches passages with queries describing the ingested
+        articles.'''
+
+        self.ingested()
+
+        def queries() -> list:
+            return [query for query, _ in self.queries()]
+
+        return self.tool_runs('context_search', queries, lambda query, result: len(result) > 0)
+
+
+    def find_article(self) -> dict:
+        '''Finds titles from queries describing the ingested articles,
+        counting a call as failed if it answers with the wrong title.'''
+
+        self.ingested()
+        titles = dict(self.queries())
+
+        return self.tool_runs(
+            'find_article',
+            lambda: list(titles),
+            lambda query, result: result == titles[query]
+        )
+
+
+    def get_summary(self) -> dict:
+        '''Gets summaries by approximate title.'''
+
+        self.ingested()
+
+        return self.tool_runs(
+            'get_summary',
+            self.approximate_titles,
+            lambda title, result: not result.startswith('No article called')
+        )
+
+
+    def get_link(self) -> dict:
+        '''Gets links by approximate title.'''
+
+        self.ingested()
+
+        return self.tool_runs(
+            'get_link',
+            self.approximate_titles,
+            lambda title, result: result.startswith('http')
+        )
+
+
+    def search_recall(self) -> dict:
+        '''Measures how often search_articles ranks the article a query
+        describes in the top 1, 3 and 5, with each aggregation.'''
+
+        self.ingested()
+
+        return search_recall.run(self.queries())
+
+
+    def tool_runs(self, tool: str, make_inputs, check) -> dict:
+        '''Runs a sync and an async tool at each concurrency level.
+
+        Args:
+            tool: name of the function in both functions.tools and
+            functions.async_tools
+            make_inputs: callable returning the inputs for one run, called
+            once per run so cold scenarios get new inputs each time
+            check: callable taking an input and the tool's result, returning
+            False if the result is wrong
+
+        Returns:
+            Scenario results
+        '''
+
+        import functions.async_tools as async_tools # pylint: disable=import-outside-toplevel
+        import functions.tools as tool_funcs # pylint: disable=import-outside-toplevel
+
+        before = self.upstream_counts()
+
+        runs = load.compare(
+            self.bind(getattr(tool_funcs, tool)),
+            self.bind(getattr(async_tools, tool)),
+            make_inputs,
+            self.args.concurrency,
+            self.loop,
+            check
+        )
+
+        return {'runs': runs, 'upstream': self.upstream_delta(before)}
+
+
+    def bind(self, function):
+        '''Passes --n to the feed tools, the other tools take their input
+        only.'''
+
+        if function.__name__ == 'get_feed':
+            return lambda website: function(website, n=self.args.n)
+
+        return function
+
+
+    def check_feed(self, website: str, result: str) -> bool: # pylint: disable=unused-argument
+        '''Checks get_feed returned n summarized articles.'''
+
+        if result == 'No feed found':
+            return False
+
+        articles = json.loads(result).values()
+
+        return sum(1 for article in articles if article.get('summary')) == self.args.n
+
+
+    def warm_up(self) -> None:
+        '''Reads the warm feeds once, so get_feed and the search scenarios
+        have their articles.'''
+
+        import functions.tools as tool_funcs # pylint: disable=import-outside-toplevel
+
+        if self.warm:
+            return
+
+        fixtures = self.stand_ins['fixtures']
+
+        with ThreadPoolExecutor(max_workers=max(self.args.concurrency)) as executor:
+            list(executor.map(lambda feed: tool_funcs.get_feed(fixtures.feed_url(feed), n=self.args.n), range(self.args.feeds)))
+
+        self.warm = True
+
+
+    def ingested(self) -> None:
+        '''Reads the warm feeds and waits for their articles to be
+        ingested.'''
+
+        import functions.tools as tool_funcs # pylint: disable=import-outside-toplevel
+
+        self.warm_up()
+
+        deadline = time.time() + INGEST_TIMEOUT
+
+        while time.time() < deadline:
+            status = tool_funcs.RAG_INGEST_POOL.status()
+
+            if status['queue_depth'] == 0 and len(status['in_flight']) == 0:
+                return
+
+            time.sleep(0.1)
+
+        raise TimeoutError(f'RAG ingest did not finish in {INGEST_TIMEOUT} seconds')
+
+
+    def queries(self) -> list:
+        '''Gets (query, title) pairs for the articles of the warm feeds.'''
+
+        return corpus.search_queries(self.args.feeds, self.args.n)
+
+
+    def approximate_titles(self) -> list:
+        '''Gets approximate titles of the articles of the warm feeds.'''
+
+        inputs = [
+            corpus.approximate_title(title, f'title-{i}')
+            for i, (_, title) in enumerate(self.queries())
+        ]
+
+        return list(itertools.islice(itertools.cycle(inputs), self.args.requests))
+
+
+    def pages(self) -> list:
+        '''Gets the article pages for the extraction scenarios: the
+        recorded pages in --corpus if given, synthetic pages otherwise.'''
+
+        return extraction.load_pages(self.args.pages, self.args.corpus, self.args.entries)
+
+
+    def upstream_counts(self) -> dict:
+        '''Gets the number of requests each stand-in has answered so far.'''
+
+        fixtures = self.stand_ins['fixtures']
+
+        with fixtures.lock:
+            counts = {f'http_{kind}': count for kind, count in fixtures.stats.items()}
+
+        counts['redis_commands'] = self.stand_ins['redis'].commands
+        counts['llm_completions'] = self.stand_ins['llm'].completions
+
+        return counts
+
+
+    def upstream_delta(self, before: dict) -> dict:
+        '''Gets the requests the stand-ins answered since before.'''
+
+        return {name: count - before[name] for name, count in self.upstream_counts().items()}
+
+
+def print_results(results: dict) -> None:
+    '''Prints one line per scenario run.'''
+
+    print(f'\nCommit {results["commit"]}, Python {results["python"]}, {results["cpus"]} CPUs\n')
+    print_header()
+
+    for scenario, result in results['scenarios'].items():
+        print_scenario(scenario, result)
+
+
+def print_comparison(baseline: dict, results: dict) -> None:
+    '''Prints p50, p95 and throughput changes against an earlier run, for
+    the scenario runs both have.'''
+
+    print(f'\nCompared with {baseline["commit"]} ({baseline["timestamp"]}):\n')
+    print(f'{"scenario":<16}{"run":<22}{"p50 ms":>24}{"p95 ms":>24}{"calls/s":>24}')
+
+    for scenario, result in results['scenarios'].items():
+        baseline_runs = baseline['scenarios'].get(scenario, {}).get('runs', {})
+
+        for label, stats in result['runs'].items():
+            if label not in baseline_runs:
+                continue
+
+            old = baseline_runs[label]
+
+            print(
+                f'{scenario:<16}{label:<22}'
+                + ''.join(_change(old.get(name), stats.get(name)) for name in ('p50_ms', 'p95_ms', 'throughput'))
+            )
+
+
+def _change(old: float, new: float) -> str:
+    '''Formats a value's change as "old -> new (+x%)", right-aligned.'''
+
+    if old is None or new is None:
+        return f'{"n/a":>24}'
+
+    percent = f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+
+    return f'{old:>8.1f} ->{new:>7.1f} {percent:>5}'
+
+
+def _commit() -> str:
+    '''Gets the short hash of HEAD, with -dirty if the tree has changes,
+    'unknown' outside a git checkout.'''
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return commit + ('-dirty' if status else '')
+
+
+if __name__ == '__main__':
+    main()
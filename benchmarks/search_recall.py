@@ -0,0 +1,111 @@
+'''Search recall benchmark: how often vector_store.search_articles ranks the
+article a query describes in its top 1, 3 and 5, and how long it takes,
+with each aggregation. Queries are built from an article's codename and
+topic words, see corpus.search_queries().
+
+    python -m benchmarks.search_recall --feeds 12 --entries 3
+'''
+
+import argparse
+
+import benchmarks.corpus as corpus
+import benchmarks.stand_ins as stand_ins
+import functions.rag as rag
+import functions.vector_store as vector_store
+from benchmarks.timing import measure, print_header, print_scenario
+
+RECALL_AT = [1, 3, 5]
+
+
+def main() -> None:
+    '''Parses arguments, indexes the corpus, runs the benchmark and prints
+    the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.search_recall',
+        description='Benchmarks recall@k and latency of search_articles with each aggregation.'
+    )
+
+    parser.add_argument('--feeds', type=int, default=12, help='number of feeds')
+    parser.add_argument('--entries', type=int, default=3, help='articles indexed per feed')
+    args = parser.parse_args()
+
+    vector_store.set_store(index_corpus(args.feeds, args.entries))
+
+    print_header()
+    print_scenario('search_recall', run(corpus.search_queries(args.feeds, args.entries)))
+
+
+def index_corpus(feeds: int, entries: int) -> vector_store.LocalVectorStore:
+    '''Chunks the corpus articles and adds them to an in-memory local store
+    with the hashing embedder, so nothing is downloaded.
+
+    Args:
+        feeds: number of feeds
+        entries: number of articles per feed
+
+    Returns:
+        LocalVectorStore
+    '''
+
+    store = vector_store.LocalVectorStore(embedder=vector_store.hashing_embedder)
+    splitter = stand_ins.offline_splitter()
+
+    # Ingested the way the RAG ingest pool does it, with the same ids and
+    # metadata
+    for feed in range(feeds):
+        for index in range(entries):
+            item = corpus.article(feed, index)
+
+            rag._ingest_article( # pylint: disable=protected-access
+                store,
+                splitter.chunks,
+                {
+                    'id': f'{feed}-{index}',
+                    'title': item['title'],
+                    'content': '\n'.join([item['title']] + item['paragraphs'])
+                },
+                rag.UPSERT_BATCH_SIZE
+            )
+
+    return store
+
+
+def run(queries: list) -> dict:
+    '''Measures recall@k and latency of search_articles over the current
+    store, for each aggregation.
+
+    Args:
+        queries: list of (query, title of the one relevant article) tuples
+
+    Returns:
+        Dictionary with 'runs', statistics and recall per aggregation, and
+        'queries', the number of queries
+    '''
+
+    relevant = dict(queries)
+    runs = {}
+
+    for aggregation in vector_store.AGGREGATIONS:
+        ranks = {}
+
+        def search(query: str, aggregation: str = aggregation) -> list:
+            articles = vector_store.search_articles(query, k=max(RECALL_AT), aggregation=aggregation)
+            titles = [article['title'] for article in articles]
+            ranks[query] = titles.index(relevant[query]) if relevant[query] in titles else None
+
+            return titles
+
+        stats = measure(search, list(relevant), 1)
+
+        for k in RECALL_AT:
+            hits = sum(1 for rank in ranks.values() if rank is not None and rank < k)
+            stats[f'recall@{k}'] = round(hits / len(relevant), 3)
+
+        runs[aggregation] = stats
+
+    return {'runs': runs, 'queries': len(relevant)}
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''Cache serialization benchmark: encode and decode times of the cache
+envelope for extracted article texts, decode time of values stored without
+an envelope, and the encoded size relative to the plain text.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --corpus <directory of saved .html pages>
+'''
+
+import argparse
+
+import benchmarks.extraction as extraction
+import functions.feed_extraction as extraction_funcs
+import functions.serialization as serialization
+from benchmarks.timing import measure, print_header, print_scenario
+
+
+def main() -> None:
+    '''Parses arguments, runs the benchmark and prints the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.serialization',
+        description='Benchmarks cache envelope encoding and decoding of article texts.'
+    )
+
+    parser.add_argument('--pages', type=int, default=100, help='number of article pages')
+    parser.add_argument('--corpus', help='directory of recorded .html article pages to extract instead')
+    args = parser.parse_args()
+
+    print_header()
+    print_scenario('serialization', run(extraction.load_pages(args.pages, args.corpus)))
+
+
+def run(pages: list) -> dict:
+    '''Times encoding and decoding the texts extracted from pages.
+
+    Args:
+        pages: list of HTML strings
+
+    Returns:
+        Dictionary with 'runs', 'codec' and 'size_ratio' (encoded bytes over
+        text bytes) keys
+    '''
+
+    texts = [extraction_funcs._get_text(html) for html in pages] # pylint: disable=protected-access
+    encoded = [serialization.encode(text) for text in texts]
+
+    return {
+        'runs': {
+            'encode': measure(serialization.encode, texts, 1),
+            'decode': measure(serialization.decode, encoded, 1),
+            'decode_legacy': measure(serialization.decode, texts, 1)
+        },
+        'codec': serialization.CODEC,
+        'size_ratio': round(sum(map(len, encoded)) / sum(len(text.encode('utf-8')) for text in texts), 3)
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+'''Local stand-ins for the server's upstream services, so the benchmarks
+run offline and repeatably: an HTTP server for feeds, websites and article
+pages, an in-memory Redis, an OpenAI-compatible summarization server and a
+local vector store. install() wires them into the functions modules.'''
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from semantic_text_splitter import TextSplitter
+
+import benchmarks.corpus as corpus
+import functions.cache as cache
+import functions.rag as rag_funcs
+import functions.summarization as summarization_funcs
+import functions.vector_store as vector_store
+
+# Approximate characters per token, for the offline splitter
+CHARS_PER_TOKEN = 4
+
+# Model id the fake LLM server reports
+MODEL_ID = 'benchmark-summarizer'
+
+
+class FixtureServer:
+    '''Serves the synthetic corpus: feeds with ETags, website home pages
+    advertising their feed, and article pages. Feeds are spread over
+    several listening ports, so the per-host fetch limits behave as they do
+    with feeds on different websites. Counts requests of each kind and per
+    path, the connections accepted and the response body bytes sent.'''
+
+    def __init__(self, hosts: int = 8, entries: int = 20, latency: float = 0.0):
+        '''Args:
+            hosts: number of ports to listen on, feed k is served from port
+            k % hosts
+            entries: number of entries in each feed
+            latency: seconds to wait before answering each request
+        '''
+
+        self.entries = entries
+        self.latency = latency
+        self.servers = []
+        self.stats = {
+            'feeds': 0,
+            'not_modified': 0,
+            'sites': 0,
+            'articles': 0,
+            'connections': 0,
+            'bytes': 0
+        }
+        self.paths = Counter()
+        self.lock = threading.Lock()
+
+        for _ in range(hosts):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), _FixtureHandler)
+            server.daemon_threads = True
+            server.fixtures = self
+            self.servers.append(server)
+
+
+    def start(self) -> None:
+        '''Starts serving, each port from its own background thread.'''
+
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, name='fixtures', daemon=True).start()
+
+
+    def stop(self) -> None:
+        '''Stops serving.'''
+
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+    def base_url(self, feed: int) -> str:
+        '''Gets the URL of the host feed is served from.'''
+
+        port = self.servers[feed % len(self.servers)].server_address[1]
+
+        return f'http://127.0.0.1:{port}'
+
+
+    def feed_url(self, feed: int) -> str:
+        '''Gets the URL of a feed.'''
+
+        return self.base_url(feed) + corpus.feed_path(feed)
+
+
+    def site_url(self, feed: int) -> str:
+        '''Gets the URL of the website home page a feed belongs to.'''
+
+        return self.base_url(feed) + corpus.site_path(feed)
+
+
+    def count(self, kind: str, amount: int = 1) -> None:
+        '''Adds amount to the count of kind.'''
+
+        with self.lock:
+            self.stats[kind] += amount
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    '''Answers GET requests from the corpus.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        '''Counts the new connection, the handler lives as long as it does.'''
+
+        super().setup()
+        self.server.fixtures.count('connections')
+
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Serves a feed, website or article page, or 404.'''
+
+        fixtures = self.server.fixtures
+        path = self.path.split('?')[0]
+        parts = path.strip('/').split('/')
+
+        with fixtures.lock:
+            fixtures.paths[path] += 1
+
+        if fixtures.latency > 0:
+            time.sleep(fixtures.latency)
+
+        try:
+            if len(parts) == 2 and parts[0] == 'feeds' and parts[1].endswith('.xml'):
+                feed = int(parts[1][:-4])
+                host = f'http://{self.headers["Host"]}'
+                body = corpus.feed_xml(feed, host, fixtures.entries).encode('utf-8')
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+
+                if self.headers.get('If-None-Match') == etag:
+                    fixtures.count('not_modified')
+                    self._send(304, b'', 'application/rss+xml', etag)
+                    return
+
+                fixtures.count('feeds')
+                self._send(200, body, 'application/rss+xml', etag)
+
+            elif len(parts) == 2 and parts[0] == 'sites':
+                fixtures.count('sites')
+                self._send(200, corpus.site_html(int(parts[1])).encode('utf-8'), 'text/html; charset=utf-8')
+
+            elif len(parts) == 3 and parts[0] == 'articles' and parts[2].endswith('.html'):
+                fixtures.count('articles')
+                html = corpus.article_html(int(parts[1]), int(parts[2][:-5]))
+                self._send(200, html.encode('utf-8'), 'text/html; charset=utf-8')
+
+            else:
+                self._send(404, b'Not found', 'text/plain')
+
+        except ValueError:
+            self._send(404, b'Not found', 'text/plain')
+
+
+    def _send(self, status: int, body: bytes, content_type: str, etag: str = None) -> None:
+        '''Sends a complete response.'''
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+
+        if etag is not None:
+            self.send_header('ETag', etag)
+
+        self.end_headers()
+
+        # Counted first, so the count is in by the time the client has it
+        self.server.fixtures.count('bytes', len(body))
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        '''Keeps request logs off stderr.'''
+
+
+class InMemoryRedis:
+    '''Redis stand-in with the methods the cache uses: get, set, mget and
+    mset. Optionally waits latency seconds per command to model the round
+    trip to a hosted Redis.'''
+
+    def __init__(self, latency: float = 0.0):
+        '''Args:
+            latency: seconds to wait per command
+        '''
+
+        self.latency = latency
+        self.data = {}
+        self.expiry = {}
+        self.commands = 0
+        self.lock = threading.Lock()
+
+
+    def get(self, key: str):
+        '''Gets one value, None if missing or expired.'''
+
+        self._round_trip()
+
+        with self.lock:
+            return self._get(key)
+
+
+    def set(self, key: str, value, ex: int = None) -> bool:
+        '''Sets one value, expiring after ex seconds if given.'''
+
+        self._round_trip()
+
+        with self.lock:
+            self._set(key, value, ex)
+
+        return True
+
+
+    def mget(self, *keys) -> list:
+        '''Gets several values in one command.'''
+
+        self._round_trip()
+
+        with self.lock:
+            return [self._get(key) for key in keys]
+
+
+    def mset(self, mapping: dict) -> bool:
+        '''Sets several values in one command.'''
+
+        self._round_trip()
+
+        with self.lock:
+            for key, value in mapping.items():
+                self._set(key, value, None)
+
+        return True
+
+
+    def _round_trip(self) -> None:
+        '''Counts a command and waits out the modelled latency.'''
+
+        with self.lock:
+            self.commands += 1
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+
+    def _get(self, key: str):
+        '''Gets a value, with the lock held.'''
+
+        expires = self.expiry.get(key)
+
+        if expires is not None and expires < time.time():
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+
+        return self.data.get(key)
+
+
+    def _set(self, key: str, value, ex: int) -> None:
+        '''Sets a value, with the lock held.'''
+
+        self.data[key] = value
+
+        if ex is not None:
+            self.expiry[key] = time.time() + ex
+
+        else:
+            self.expiry.pop(key, None)
+
+
+class AsyncInMemoryRedis:
+    '''Async client for an InMemoryRedis, waiting out its latency on the
+    event loop instead of in a thread.'''
+
+    def __init__(self, redis: InMemoryRedis):
+        '''Args:
+            redis: InMemoryRedis holding the data
+        '''
+
+        self.redis = redis
+
+
+    async def get(self, key: str):
+        '''Async version of InMemoryRedis.get().'''
+
+        await self._round_trip()
+
+        with self.redis.lock:
+            return self.redis._get(key) # pylint: disable=protected-access
+
+
+    async def set(self, key: str, value, ex: int = None) -> bool:
+        '''Async version of InMemoryRedis.set().'''
+
+        await self._round_trip()
+
+        with self.redis.lock:
+            self.redis._set(key, value, ex) # pylint: disable=protected-access
+
+        return True
+
+
+    async def mget(self, *keys) -> list:
+        '''Async version of InMemoryRedis.mget().'''
+
+        await self._round_trip()
+
+        with self.redis.lock:
+            return [self.redis._get(key) for key in keys] # pylint: disable=protected-access
+
+
+    async def mset(self, mapping: dict) -> bool:
+        '''Async version of InMemoryRedis.mset().'''
+
+        await self._round_trip()
+
+        with self.redis.lock:
+            for key, value in mapping.items():
+                self.redis._set(key, value, None) # pylint: disable=protected-access
+
+        return True
+
+
+    async def _round_trip(self) -> None:
+        '''Counts a command and waits out the modelled latency.'''
+
+        with self.redis.lock:
+            self.redis.commands += 1
+
+        if self.redis.latency > 0:
+            await asyncio.sleep(self.redis.latency)
+
+
+class FakeLLMServer:
+    '''OpenAI-compatible server answering /v1/models and
+    /v1/chat/completions with a canned summary after a configurable
+    delay, standing in for the Modal summarization endpoint. Counts model
+    listings and completions, and the most completions in progress at
+    once.'''
+
+    def __init__(self, latency: float = 0.5):
+        '''Args:
+            latency: seconds each chat completion takes
+        '''
+
+        self.latency = latency
+        self.models = 0
+        self.completions = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _LLMHandler)
+        self.server.daemon_threads = True
+        self.server.llm = self
+
+
+    def start(self) -> None:
+        '''Starts serving from a background thread.'''
+
+        threading.Thread(target=self.server.serve_forever, name='fake-llm', daemon=True).start()
+
+
+    def stop(self) -> None:
+        '''Stops serving.'''
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    @property
+    def base_url(self) -> str:
+        '''OpenAI API base URL of the server.'''
+
+        return f'http://127.0.0.1:{self.server.server_address[1]}/v1'
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    '''Answers the two OpenAI API endpoints the summarizer calls.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Lists the one model.'''
+
+        if self.path.rstrip('/') != '/v1/models':
+            self._send(404, {'error': 'not found'})
+            return
+
+        with self.server.llm.lock:
+            self.server.llm.models += 1
+
+        self._send(200, {
+            'object': 'list',
+            'data': [{'id': MODEL_ID, 'object': 'model', 'created': 0, 'owned_by': 'benchmarks'}]
+        })
+
+
+    def do_POST(self): # pylint: disable=invalid-name
+        '''Answers a chat completion with the first words of the prompt.'''
+
+        llm = self.server.llm
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send(404, {'error': 'not found'})
+            return
+
+        with llm.lock:
+            llm.completions += 1
+            llm.active += 1
+            llm.max_active = max(llm.max_active, llm.active)
+
+        time.sleep(llm.latency)
+
+        with llm.lock:
+            llm.active -= 1
+
+        prompt = request['messages'][-1]['content']
+        summary = 'Summary: ' + ' '.join(prompt.split()[-40:])
+
+        self._send(200, {
+            'id': f'chatcmpl-{llm.completions}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', MODEL_ID),
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': summary}
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+
+    def _send(self, status: int, payload: dict) -> None:
+        '''Sends a JSON response.'''
+
+        body = json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        '''Keeps request logs off stderr.'''
+
+
+def offline_splitter() -> TextSplitter:
+    '''Builds a character-based splitter of about the same chunk size as
+    rag.build_splitter(), which needs to download its tokenizer.
+
+    Returns:
+        TextSplitter
+    '''
+
+    return TextSplitter(rag_funcs.CHUNK_TOKENS * CHARS_PER_TOKEN)
+
+
+def use_offline_splitter() -> None:
+    '''Makes the RAG ingest workers, and worker processes forked after
+    this, chunk with offline_splitter().'''
+
+    rag_funcs.build_splitter = offline_splitter
+
+
+def install(
+        hosts: int = 8,
+        entries: int = 20,
+        http_latency: float = 0.0,
+        redis_latency: float = 0.0,
+        llm_latency: float = 0.5
+) -> dict:
+    '''Starts the stand-ins and points the functions modules at them. Call
+    before anything uses the cache, vector store or summarization client.
+
+    Args:
+        hosts: number of fixture server ports, see FixtureServer
+        entries: number of entries in each feed
+        http_latency: seconds the fixture server waits per request
+        redis_latency: seconds the Redis stand-in waits per command
+        llm_latency: seconds each summary takes
+
+    Returns:
+        Dictionary with the 'fixtures', 'redis', 'llm' and 'store'
+        stand-ins
+    '''
+
+    fixtures = FixtureServer(hosts=hosts, entries=entries, latency=http_latency)
+    fixtures.start()
+
+    llm = FakeLLMServer(latency=llm_latency)
+    llm.start()
+
+    redis = InMemoryRedis(latency=redis_latency)
+    cache.set_client(redis, AsyncInMemoryRedis(redis))
+
+    store = vector_store.LocalVectorStore(embedder=vector_store.hashing_embedder)
+    vector_store.set_store(store)
+
+    os.environ.setdefault('MODAL_API_KEY', 'benchmark')
+    summarization_funcs.MODAL_BASE_URL = llm.base_url
+
+    return {'fixtures': fixtures, 'redis': redis, 'llm': llm, 'store': store}
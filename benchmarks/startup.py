@@ -0,0 +1,118 @@
+'''Startup benchmark: import time of the tools and the server module, and
+time until the Gradio app answers, each in a fresh interpreter.
+
+    python -m benchmarks.startup --runs 3
+    python -m benchmarks.startup --no-launch
+'''
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from benchmarks.timing import print_header, print_scenario, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+STARTUP_SCRIPT = '''
+import json, socket, sys, time, urllib.request
+start_time = time.perf_counter()
+result = {}
+import functions.tools, functions.async_tools
+result['import_tools'] = time.perf_counter() - start_time
+try:
+    import rss_server
+    result['import_server'] = time.perf_counter() - start_time
+    if sys.argv[1] == 'launch':
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        rss_server.demo.launch(
+            server_name='127.0.0.1', server_port=port, prevent_thread_lock=True, quiet=True
+        )
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5)
+                break
+            except OSError:
+                time.sleep(0.05)
+        result['serving'] = time.perf_counter() - start_time
+        rss_server.demo.close()
+except Exception as e:
+    result['error'] = f'{type(e).__name__}: {e}'
+print(json.dumps(result))
+'''
+
+
+def main() -> None:
+    '''Parses arguments, runs the benchmark and prints the results.'''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.startup',
+        description='Benchmarks import and launch time of the server, each in a fresh process.'
+    )
+
+    parser.add_argument('--runs', type=int, default=3, help='fresh processes per measurement')
+    parser.add_argument('--no-launch', action='store_true', help='only time the imports')
+    args = parser.parse_args()
+
+    print_header()
+    print_scenario('startup', run(args.runs, launch=not args.no_launch))
+
+
+def run(runs: int, launch: bool = True) -> dict:
+    '''Times imports and app launch, each in a fresh interpreter started
+    from an empty directory, so the server's log directory lands there.
+
+    Args:
+        runs: number of fresh processes
+        launch: also launch the app and time until it answers
+
+    Returns:
+        Dictionary with 'runs', statistics per phase, and 'errors' if any
+        process failed
+    '''
+
+    timings = {}
+    errors = []
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT), os.environ.get('PYTHONPATH', '')]))
+
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as directory:
+            process = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT, 'launch' if launch else 'imports'],
+                cwd=directory,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=300,
+                check=False
+            )
+
+        try:
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        except (IndexError, ValueError):
+            errors.append(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'no output')
+            continue
+
+        if 'error' in result:
+            errors.append(result.pop('error'))
+
+        for phase, seconds in result.items():
+            timings.setdefault(phase, []).append(seconds)
+
+    results = {'runs': {phase: summarize(seconds, sum(seconds)) for phase, seconds in timings.items()}}
+
+    if len(errors) > 0:
+        results['errors'] = sorted(set(errors))
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+'''Timing helpers shared by the benchmarks: latency percentiles and
+throughput of repeated calls, the memory they allocate, and printing the
+results.'''
+
+import json
+import math
+import time
+import asyncio
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+PERCENTILES = [50, 95, 99]
+
+
+def measure(function, inputs: list, concurrency: int, check=None) -> dict:
+    '''Calls function on each input from concurrency threads.
+
+    Args:
+        function: callable taking one input
+        inputs: list of inputs
+        concurrency: number of calls in flight at once
+        check: optional callable taking an input and the result, returning
+        False if the result is wrong
+
+    Returns:
+        Statistics, see summarize()
+    '''
+
+    def call(item) -> tuple:
+        start_time = time.perf_counter()
+
+        try:
+            result = function(item)
+
+        except Exception: # pylint: disable=broad-exception-caught
+            return time.perf_counter() - start_time, 'error'
+
+        latency = time.perf_counter() - start_time
+
+        if check is not None and not check(item, result):
+            return latency, 'failure'
+
+        return latency, 'ok'
+
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(call, inputs))
+
+    return summarize_outcomes(outcomes, time.perf_counter() - start_time, concurrency)
+
+
+def measure_allocations(function, inputs: list) -> dict:
+    '''Calls function on each input with tracemalloc tracing, separately
+    from the timed runs since tracing slows every allocation down.
+
+    Args:
+        function: callable taking one input
+        inputs: list of inputs
+
+    Returns:
+        Mean and maximum peak KiB allocated per call, and the KiB still
+        allocated after all of the calls
+    '''
+
+    peaks = []
+    tracemalloc.start()
+
+    try:
+        start_size, _ = tracemalloc.get_traced_memory()
+
+        for item in inputs:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            function(item)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+
+        end_size, _ = tracemalloc.get_traced_memory()
+
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'mean_peak_kib': round(sum(peaks) / len(peaks) / 1024, 1) if peaks else None,
+        'max_peak_kib': round(max(peaks) / 1024, 1) if peaks else None,
+        'retained_kib': round((end_size - start_size) / 1024, 1)
+    }
+
+
+async def ameasure(function, inputs: list, concurrency: int, check=None) -> dict:
+    '''Async version of measure(), keeping concurrency calls in flight on
+    the running event loop.'''
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(item) -> tuple:
+        async with semaphore:
+            start_time = time.perf_counter()
+
+            try:
+                result = await function(item)
+
+            except Exception: # pylint: disable=broad-exception-caught
+                return time.perf_counter() - start_time, 'error'
+
+            latency = time.perf_counter() - start_time
+
+        if check is not None and not check(item, result):
+            return latency, 'failure'
+
+        return latency, 'ok'
+
+    start_time = time.perf_counter()
+    outcomes = await asyncio.gather(*[call(item) for item in inputs])
+
+    return summarize_outcomes(outcomes, time.perf_counter() - start_time, concurrency)
+
+
+def summarize_outcomes(outcomes: list, wall_time: float, concurrency: int) -> dict:
+    '''Summarizes (latency, outcome) pairs from measure() or ameasure().'''
+
+    stats = summarize([latency for latency, _ in outcomes], wall_time)
+    stats['concurrency'] = concurrency
+    stats['errors'] = sum(1 for _, outcome in outcomes if outcome == 'error')
+    stats['failures'] = sum(1 for _, outcome in outcomes if outcome == 'failure')
+
+    return stats
+
+
+def summarize(latencies: list, wall_time: float) -> dict:
+    '''Gets latency percentiles and throughput.
+
+    Args:
+        latencies: list of latencies in seconds
+        wall_time: seconds from the first call starting to the last one
+        finishing
+
+    Returns:
+        Dictionary with 'calls', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms',
+        'max_ms' and 'throughput' (calls per second) keys
+    '''
+
+    latencies = sorted(latencies)
+    stats = {'calls': len(latencies)}
+
+    for percentile in PERCENTILES:
+        stats[f'p{percentile}_ms'] = round(_nearest_rank(latencies, percentile) * 1000, 3)
+
+    stats['mean_ms'] = round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None
+    stats['max_ms'] = round(latencies[-1] * 1000, 3) if latencies else None
+    stats['throughput'] = round(len(latencies) / wall_time, 2) if wall_time > 0 else None
+
+    return stats
+
+
+def print_header() -> None:
+    '''Prints the column headings for print_scenario().'''
+
+    print(f'{"scenario":<16}{"run":<22}{"calls":>6}{"err":>5}{"fail":>5}'
+          f'{"p50 ms":>11}{"p95 ms":>11}{"p99 ms":>11}{"calls/s":>10}  extra')
+
+
+def print_scenario(scenario: str, result: dict) -> None:
+    '''Prints one line per run of a scenario, then the scenario's other
+    results.
+
+    Args:
+        scenario: scenario name
+        result: dictionary with 'runs', statistics per run label, and any
+        other results of the scenario
+
+    Returns:
+        None
+    '''
+
+    for label, stats in result['runs'].items():
+        extra = ' '.join(f'{name}={value}' for name, value in stats.items() if name.startswith('recall@'))
+
+        print(
+            f'{scenario:<16}{label:<22}{stats["calls"]:>6}{stats.get("errors", 0):>5}'
+            f'{stats.get("failures", 0):>5}{stats["p50_ms"]:>11.2f}{stats["p95_ms"]:>11.2f}'
+            f'{stats["p99_ms"]:>11.2f}{stats["throughput"] or 0:>10.2f}  {extra}'
+        )
+
+    notes = {name: value for name, value in result.items() if name != 'runs'}
+
+    if len(notes) > 0:
+        print(f'{"":<16}{json.dumps(notes)}')
+
+
+def _nearest_rank(ordered: list, percentile: float) -> float:
+    '''Gets a percentile of a sorted list by the nearest-rank method, NaN
+    if it is empty.'''
+
+    if len(ordered) == 0:
+        return math.nan
+
+    return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
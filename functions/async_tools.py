@@ -0,0 +1,356 @@
+'''Async versions of the MCP server's tool functions. Feed, cache and search
+requests are awaited on the server's event loop instead of holding a worker
+thread each, so many slow feeds and searches can be in flight at once.
+Article fetches and summaries run on the same worker pools as in
+functions.tools, so their limits hold across both sets of tools. The ingest
+pool, feed poller and caches are shared with functions.tools too.'''
+
+import re
+import time
+import json
+import asyncio
+import logging
+from typing import Tuple
+
+import functions.cache as cache
+import functions.feed_extraction as extraction_funcs
+import functions.identity as identity
+import functions.metrics as metrics
+import functions.summarization as summarization_funcs
+import functions.title_index as title_index
+import functions.tools as tool_funcs
+import functions.vector_store as vector_store
+
+# Separates websites given to get_feeds() as one string
+WEBSITE_SEPARATORS = re.compile(r'[,\n]')
+
+
+@metrics.tool
+async def get_feed(website: str, n: int = 3) -> list:
+    '''Gets RSS feed content from a given website. Can take a website or RSS
+    feed URL directly, or the name of a website. Will attempt to find RSS
+    feed and return title, summary and link to full article for most recent
+    n items in feed. This function is slow and resource heavy, only call it when
+    the user wants to check a feed for new content, or asks for content from a
+    feed that you have not retrieved yet.
+
+    Args:
+        website: URL or name of website to extract RSS feed content from
+        n: (optional) number of articles to parse from feed, defaults to 3
+
+    Returns:
+        JSON string containing the feed content or 'No feed found' if a RSS
+        feed for the requested website could not be found
+    '''
+
+    start_time = time.time()
+
+    logger = logging.getLogger(__name__ + '.get_feed()')
+    logger.info('Getting feed content for: %s', website)
+
+    # Feed discovery may use a blocking search client, keep it off the loop
+    feed_uri = await asyncio.to_thread(extraction_funcs.find_feed_uri, website)
+    logger.info('find_feed_uri() returned %s', feed_uri)
+
+    if 'No feed found' in feed_uri:
+        logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+        return 'No feed found'
+
+    articles = await _run_feed(feed_uri, n)
+
+    logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+
+    return json.dumps(articles)
+
+
+@metrics.tool
+async def get_feeds(websites: list, n: int = 3, sort_by_date: bool = False) -> str:
+    '''Gets RSS feed content from several websites at once. Use this function
+    instead of calling get_feed() repeatedly when the user asks for content
+    from more than one source, it is about as fast as the slowest single
+    source. Each website can be a website or RSS feed URL, or the name of a
+    website.
+
+    Args:
+        websites: list of URLs or names of websites to extract RSS feed
+        content from, a comma or newline separated string also works
+        n: (optional) number of articles to parse from each feed, defaults
+        to 3
+        sort_by_date: (optional) if True, return articles from all feeds
+        newest first instead of grouped by feed, defaults to False
+
+    Returns:
+        JSON string containing 'articles', a list of articles with 'source',
+        'title', 'link', 'published' and 'summary' keys, and 'not_found', a
+        list of the websites no RSS feed could be found for
+    '''
+
+    start_time = time.time()
+
+    logger = logging.getLogger(__name__ + '.get_feeds()')
+
+    if isinstance(websites, str):
+        websites = WEBSITE_SEPARATORS.split(websites)
+
+    websites = list(dict.fromkeys(website.strip() for website in websites if website.strip()))
+    logger.info('Getting feed content for: %s', websites)
+
+    # Everything below runs concurrently, held to the fetch and summary
+    # pools' limits, so the slowest source sets the pace
+    feed_uris = await asyncio.gather(*[
+        asyncio.to_thread(extraction_funcs.find_feed_uri, website)
+        for website in websites
+    ])
+
+    sources = {}
+    not_found = []
+
+    for website, feed_uri in zip(websites, feed_uris):
+        if 'No feed found' in feed_uri:
+            not_found.append(website)
+
+        # Two names for the same feed only need it read once
+        elif feed_uri not in sources:
+            sources[feed_uri] = website
+
+    results = await asyncio.gather(
+        *[_run_feed(feed_uri, int(n)) for feed_uri in sources],
+        return_exceptions=True
+    )
+
+    articles = []
+
+    for (feed_uri, website), result in zip(sources.items(), results):
+        if isinstance(result, Exception):
+            logger.error('Error getting %s: %s', feed_uri, result)
+            not_found.append(website)
+            continue
+
+        articles.extend(
+            {'source': website, **article}
+            for article in result.values() if 'title' in article
+        )
+
+    # Undated articles go last
+    if sort_by_date:
+        articles.sort(key=lambda article: article['published'] or '', reverse=True)
+
+    logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+
+    return json.dumps({'articles': articles, 'not_found': not_found})
+
+
+async def _run_feed(feed_uri: str, n: int) -> dict:
+    '''Runs feed through the pipeline, sharing the run with any concurrent
+    callers for the same feed, and tracks it in the feed poller.
+
+    Args:
+        feed_uri: RSS feed URI
+        n: number of articles to parse from feed
+
+    Returns:
+        Dictionary of finished articles, must not be modified
+    '''
+
+    # Shares the run with sync get_feed() calls for the same feed too
+    articles = await tool_funcs.FEED_FLIGHTS.ado((feed_uri, n), _feed_pipeline, feed_uri, n)
+
+    # Keep this feed warm in the background from now on
+    tool_funcs.FEED_POLLER.track(
+        feed_uri,
+        n,
+        [item['title'] for item in articles.values() if 'title' in item]
+    )
+
+    return articles
+
+
+async def _feed_pipeline(feed_uri: str, n: int) -> dict:
+    '''Reads the feed, then gets article content and summarizes each
+    article as soon as its content is in. The articles go to RAG ingest
+    together once all of their content is in.
+
+    Args:
+        feed_uri: RSS feed URI
+        n: number of articles to parse from feed
+
+    Returns:
+        Dictionary of articles with 'title', 'link', 'published' and
+        'summary' keys, keyed by position in the feed
+    '''
+
+    logger = logging.getLogger(__name__ + '._feed_pipeline()')
+
+    # Can fork worker processes, keep it off the loop
+    if not tool_funcs.STARTED:
+        await asyncio.to_thread(tool_funcs.start)
+
+    with metrics.stage('read_feed'):
+        entries, pending = await extraction_funcs.aread_feed(feed_uri, n)
+    logger.info('aread_feed() returned %s entries', len(entries))
+
+    articles = tool_funcs.feed_articles(entries)
+    cached_summaries = await cache.aget_many(tool_funcs.cached_summary_keys(entries))
+
+    new_summaries = {}
+
+    async def get_content(i: int) -> None:
+        '''Waits for an article's content.'''
+
+        item = entries[i]
+
+        if i in pending:
+            try:
+                item['content'] = await pending[i]
+
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logger.error('Error fetching "%s": %s', item['link'], e)
+
+        if item['content'] is not None:
+            item['hash'] = identity.content_hash(item['content'])
+
+    content_tasks = {
+        i: asyncio.ensure_future(get_content(i))
+        for i, entry in entries.items() if 'title' in entry
+    }
+
+    async def ingest() -> None:
+        '''Sends the articles to RAG ingest together, once all of their
+        content is in.'''
+
+        await asyncio.gather(*content_tasks.values())
+
+        items = [entries[i].copy() for i in content_tasks if entries[i]['content'] is not None]
+
+        # put_many() can wait for queue space, depending on the ingest policy
+        with metrics.stage('ingest_put'):
+            await asyncio.to_thread(
+                tool_funcs.RAG_INGEST_POOL.put_many,
+                items,
+                timeout=tool_funcs.INGEST_PUT_TIMEOUT
+            )
+
+        logger.info('%s articles sent to RAG ingest', len(items))
+
+    async def summarize(i: int) -> None:
+        '''Waits for an article's content, then summarizes it.'''
+
+        await content_tasks[i]
+        item = entries[i]
+
+        if item['content'] is None:
+            return
+
+        summary = cached_summaries.get(identity.summary_key(item['hash']))
+
+        if summary:
+            logger.info('Got summary from Redis cache: "%s"', item['title'])
+
+        else:
+            summary = await summarization_funcs.asummarize_content(
+                item['title'],
+                item['content'],
+                use_cache=False
+            )
+
+            logger.info('Summary of "%s" generated', item['title'])
+
+            if summary is not None:
+                new_summaries[identity.summary_key(item['hash'])] = summary
+
+        articles[i]['summary'] = summary
+
+    await asyncio.gather(ingest(), *[summarize(i) for i in content_tasks])
+
+    # Add the new entries and summaries to the cache
+    await extraction_funcs.astore_entries(entries, list(pending.keys()), extra=new_summaries)
+
+    return articles
+
+
+@metrics.tool
+async def context_search(query: str, article_title: str = None) -> list[Tuple[float, str]]:
+    '''Searches for context relevant to query. Use this Function to search
+    for additional general information if needed before answering the user's question
+    about an article. If article_title is provided the search will only return
+    results from that article. If article_title is omitted, the search will
+    include all articles currently in the cache.
+
+    Ags:
+        query: user query to find context for
+        article_title: optional, use this argument to search only for
+        context from a specific article, defaults to None
+
+    Returns:
+        Text relevant to the query
+    '''
+
+    search_args = tool_funcs.context_search_args(article_title)
+    articles = await vector_store.asearch_articles(query, **search_args)
+
+    return tool_funcs.context_passages(query, articles)
+
+
+@metrics.tool
+async def find_article(query: str) -> list[Tuple[float, str]]:
+    '''Uses vector search to find the most likely title of the article
+    referred to by query. Use this function if the user is asking about
+    an article, but it is not clear what the exact title of the article is.
+
+    Args:
+        query: query to to find source article tile for
+
+    Returns:
+        Article title
+    '''
+
+    title = title_index.TITLES.resolve(query, threshold=tool_funcs.FIND_ARTICLE_TITLE_THRESHOLD)
+
+    if title is None:
+        title = tool_funcs.found_title(query, await vector_store.asearch_articles(query, k=1))
+
+    return title
+
+
+@metrics.tool
+async def get_summary(title: str) -> str:
+    '''Uses article title to retrieve summary of article content.
+
+    Args:
+        title: title of article, approximate titles are matched to the
+        closest title seen in a feed
+
+    Returns:
+        Short summary of article content.
+    '''
+
+    return tool_funcs.lookup_answer(title, 'summary', await _lookup_article(title, 'summary'))
+
+
+@metrics.tool
+async def get_link(title: str) -> str:
+    '''Uses article title to look up direct link to article content webpage.
+
+    Args:
+        title: title of article, approximate titles are matched to the
+        closest title seen in a feed
+
+    Returns:
+        Article webpage URL.
+    '''
+
+    return tool_funcs.lookup_answer(title, 'link', await _lookup_article(title, 'link'))
+
+
+async def _lookup_article(title: str, field: str) -> str:
+    '''Async version of functions.tools._lookup_article().'''
+
+    keys = tool_funcs.lookup_keys(title, field)
+    value = None
+
+    try:
+        while True:
+            value = await cache.aget(keys.send(value))
+
+    except StopIteration as lookup:
+        return lookup.value
@@ -0,0 +1,427 @@
+'''Two-tier cache for article links, content, summaries and feed URIs: a
+size-bounded in-process LRU with TTLs in front of Redis.'''
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from upstash_redis import Redis
+from upstash_redis.asyncio import Redis as AsyncRedis
+
+import functions.metrics as metrics
+
+# In-process tier settings: maximum number of keys held, how long values are
+# kept in seconds and how long a miss is remembered before asking Redis again
+LOCAL_MAX_SIZE = 4096
+LOCAL_TTL = 3600
+NEGATIVE_TTL = 30
+
+REDIS_URL = 'https://sensible-midge-19304.upstash.io'
+
+# Redis clients, the Upstash ones are created on first use so the module can
+# be imported without credentials, or replaced with set_client(). The async
+# functions fall back to running the sync client in a worker thread if
+# there is no async client. The async Upstash client is recreated for each
+# event loop it is used from.
+REDIS = None
+ASYNC_REDIS = None
+ASYNC_REDIS_LOOP = None
+UPSTASH_CLIENTS = True
+CLIENT_LOCK = threading.Lock()
+
+LOCAL = OrderedDict()
+LOCAL_LOCK = threading.Lock()
+
+STATS = {
+    'local_hits': 0,
+    'negative_hits': 0,
+    'redis_hits': 0,
+    'misses': 0
+}
+
+# Marks keys we know are not in Redis
+_MISSING = object()
+
+
+def set_client(client, async_client=None) -> None:
+    '''Replaces the Redis client used by the cache, e.g. with a local redis-py
+    client or an in-memory fake. The client needs get, set, mget(*keys) and
+    mset(mapping) methods. Clears the in-process tier.
+
+    Args:
+        client: Redis compatible client
+        async_client: optional client with the same methods as coroutines,
+        the async functions use client in a worker thread if not given
+
+    Returns:
+        None
+    '''
+
+    global REDIS, ASYNC_REDIS, ASYNC_REDIS_LOOP, UPSTASH_CLIENTS # pylint: disable=global-statement
+
+    with CLIENT_LOCK:
+        REDIS = client
+        ASYNC_REDIS = async_client
+        ASYNC_REDIS_LOOP = None
+        UPSTASH_CLIENTS = False
+
+    clear_local()
+
+
+def get(key: str):
+    '''Gets single value from the cache.
+
+    Args:
+        key: cache key
+
+    Returns:
+        Cached value, None if the key is not in the cache
+    '''
+
+    return get_many([key])[key]
+
+
+def set(key: str, value, ttl: int = None) -> None: # pylint: disable=redefined-builtin
+    '''Sets single value in the cache.
+
+    Args:
+        key: cache key
+        value: value to store
+        ttl: optional expiry in seconds, defaults to no expiry in Redis and
+        LOCAL_TTL in process
+
+    Returns:
+        None
+    '''
+
+    if value is None:
+        return
+
+    with metrics.upstream('redis', 'set'):
+        if ttl is None:
+            _client().set(key, value)
+
+        else:
+            _client().set(key, value, ex=ttl)
+
+    _local_put(key, value, ttl)
+
+
+def get_many(keys: list) -> dict:
+    '''Gets several values from the cache. Keys found in process are served
+    locally, the rest are fetched from Redis in one MGET round-trip.
+
+    Args:
+        keys: list of cache keys
+
+    Returns:
+        Dictionary of key: value, value is None for keys not in the cache
+    '''
+
+    logger = logging.getLogger(__name__ + '.get_many')
+
+    # Remove duplicates, keeping order
+    keys = list(dict.fromkeys(keys))
+    results, remote_keys = _local_get_many(keys)
+
+    if len(remote_keys) == 0:
+        return results
+
+    with metrics.upstream('redis', 'mget'):
+        values = _client().mget(*remote_keys)
+
+    logger.info('Got %s keys from Redis in one request', len(remote_keys))
+
+    return _merge_remote(keys, results, remote_keys, values)
+
+
+async def aget(key: str):
+    '''Async version of get().'''
+
+    return (await aget_many([key]))[key]
+
+
+async def aset(key: str, value, ttl: int = None) -> None:
+    '''Async version of set().'''
+
+    if value is None:
+        return
+
+    client = _async_client()
+
+    if client is None:
+        await asyncio.to_thread(set, key, value, ttl)
+        return
+
+    with metrics.upstream('redis', 'set'):
+        if ttl is None:
+            await client.set(key, value)
+
+        else:
+            await client.set(key, value, ex=ttl)
+
+    _local_put(key, value, ttl)
+
+
+async def aget_many(keys: list) -> dict:
+    '''Async version of get_many().'''
+
+    logger = logging.getLogger(__name__ + '.aget_many')
+
+    keys = list(dict.fromkeys(keys))
+    results, remote_keys = _local_get_many(keys)
+
+    if len(remote_keys) == 0:
+        return results
+
+    client = _async_client()
+
+    with metrics.upstream('redis', 'mget'):
+        if client is None:
+            values = await asyncio.to_thread(_client().mget, *remote_keys)
+
+        else:
+            values = await client.mget(*remote_keys)
+
+    logger.info('Got %s keys from Redis in one request', len(remote_keys))
+
+    return _merge_remote(keys, results, remote_keys, values)
+
+
+async def aset_many(mapping: dict) -> None:
+    '''Async version of set_many().'''
+
+    logger = logging.getLogger(__name__ + '.aset_many')
+
+    mapping = {key: value for key, value in mapping.items() if value is not None}
+
+    if len(mapping) == 0:
+        return
+
+    client = _async_client()
+
+    with metrics.upstream('redis', 'mset'):
+        if client is None:
+            await asyncio.to_thread(_client().mset, mapping)
+
+        else:
+            await client.mset(mapping)
+
+    logger.info('Set %s keys in Redis in one request', len(mapping))
+
+    for key, value in mapping.items():
+        _local_put(key, value)
+
+
+def _async_client():
+    '''Gets the async Redis client for the running event loop.
+
+    Returns:
+        Async client, None if the sync client should be used instead
+    '''
+
+    global ASYNC_REDIS, ASYNC_REDIS_LOOP # pylint: disable=global-statement
+
+    loop = asyncio.get_running_loop()
+
+    with CLIENT_LOCK:
+        if UPSTASH_CLIENTS and (ASYNC_REDIS is None or ASYNC_REDIS_LOOP is not loop):
+            ASYNC_REDIS = AsyncRedis(url=REDIS_URL, token=os.environ['UPSTASH_REDIS_KEY'])
+            ASYNC_REDIS_LOOP = loop
+
+        return ASYNC_REDIS
+
+
+def _client():
+    '''Gets the Redis client, creating the Upstash client on first use.
+
+    Returns:
+        Redis client
+    '''
+
+    global REDIS # pylint: disable=global-statement
+
+    with CLIENT_LOCK:
+        if REDIS is None:
+            REDIS = Redis(url=REDIS_URL, token=os.environ['UPSTASH_REDIS_KEY'])
+
+        return REDIS
+
+
+def _local_get_many(keys: list) -> tuple:
+    '''Looks keys up in the in-process tier.
+
+    Args:
+        keys: list of unique cache keys
+
+    Returns:
+        Tuple of (results, remote_keys): dictionary of key: value for the
+        keys held in process and list of keys to ask Redis for
+    '''
+
+    results = {}
+    remote_keys = []
+
+    for key in keys:
+        value = _local_get(key)
+
+        if value is _MISSING:
+            results[key] = None
+
+        elif value is not None:
+            results[key] = value
+
+        else:
+            remote_keys.append(key)
+
+    return results, remote_keys
+
+
+def _merge_remote(keys: list, results: dict, remote_keys: list, values: list) -> dict:
+    '''Adds values fetched from Redis to results and the in-process tier.
+
+    Args:
+        keys: all keys looked up, in order
+        results: dictionary of key: value from the in-process tier
+        remote_keys: keys asked from Redis
+        values: values Redis returned for remote_keys
+
+    Returns:
+        Dictionary of key: value for all keys
+    '''
+
+    for key, value in zip(remote_keys, values):
+        results[key] = value
+
+        with LOCAL_LOCK:
+            if value is None:
+                STATS['misses'] += 1
+
+            else:
+                STATS['redis_hits'] += 1
+
+        if value is None:
+            _local_put(key, _MISSING, NEGATIVE_TTL)
+
+        else:
+            _local_put(key, value)
+
+    return {key: results[key] for key in keys}
+
+
+def set_many(mapping: dict) -> None:
+    '''Sets several values in the cache in one MSET round-trip. None values
+    are skipped.
+
+    Args:
+        mapping: dictionary of key: value to store
+
+    Returns:
+        None
+    '''
+
+    logger = logging.getLogger(__name__ + '.set_many')
+
+    mapping = {key: value for key, value in mapping.items() if value is not None}
+
+    if len(mapping) == 0:
+        return
+
+    with metrics.upstream('redis', 'mset'):
+        _client().mset(mapping)
+
+    logger.info('Set %s keys in Redis in one request', len(mapping))
+
+    for key, value in mapping.items():
+        _local_put(key, value)
+
+
+def get_stats() -> dict:
+    '''Gets cache hit and miss counters.
+
+    Returns:
+        Dictionary of counters, plus number of keys held in process and the
+        overall hit ratio
+    '''
+
+    with LOCAL_LOCK:
+        stats = dict(STATS)
+        stats['local_size'] = len(LOCAL)
+
+    lookups = stats['local_hits'] + stats['negative_hits'] + stats['redis_hits'] + stats['misses']
+    hits = stats['local_hits'] + stats['redis_hits']
+    stats['hit_ratio'] = hits / lookups if lookups > 0 else 0.0
+
+    return stats
+
+
+def clear_local() -> None:
+    '''Empties the in-process tier.
+
+    Returns:
+        None
+    '''
+
+    with LOCAL_LOCK:
+        LOCAL.clear()
+
+
+def _local_get(key: str):
+    '''Gets value from the in-process tier, counting hits.
+
+    Args:
+        key: cache key
+
+    Returns:
+        Cached value, _MISSING for a remembered miss, None if the key is not
+        held or has expired
+    '''
+
+    with LOCAL_LOCK:
+        item = LOCAL.get(key)
+
+        if item is None:
+            return None
+
+        expires, value = item
+
+        if expires < time.monotonic():
+            del LOCAL[key]
+            return None
+
+        LOCAL.move_to_end(key)
+
+        if value is _MISSING:
+            STATS['negative_hits'] += 1
+
+        else:
+            STATS['local_hits'] += 1
+
+        return value
+
+
+def _local_put(key: str, value, ttl: int = None) -> None:
+    '''Adds value to the in-process tier, evicting the least recently used
+    keys if it is full.
+
+    Args:
+        key: cache key
+        value: value to store
+        ttl: optional expiry in seconds, defaults to LOCAL_TTL
+
+    Returns:
+        None
+    '''
+
+    if ttl is None:
+        ttl = LOCAL_TTL
+
+    with LOCAL_LOCK:
+        LOCAL[key] = (time.monotonic() + ttl, value)
+        LOCAL.move_to_end(key)
+
+        while len(LOCAL) > LOCAL_MAX_SIZE:
+            LOCAL.popitem(last=False)
@@ -0,0 +1,203 @@
+'''Feed URI discovery. The website's own <link rel="alternate"> feeds and
+the usual feed paths are probed in parallel with a findfeed search, and
+the first valid feed found wins.'''
+
+import re
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse
+
+from findfeed import search as feed_search
+from googlesearch import search as google_search
+
+import functions.http_client as http_client
+
+COMMON_EXTENSIONS = ['com', 'net', 'org', 'edu', 'gov', 'co', 'us']
+
+# Paths tried on the website's host, in order of preference for ties
+FEED_PATHS = ['/feed', '/rss', '/atom.xml', '/feed.xml', '/rss.xml', '/index.xml']
+
+# Discovery concurrency and how long to wait for any candidate in seconds.
+# Probes still running when a feed is found finish in the background.
+DISCOVERY_WORKERS = 16
+DISCOVERY_TIMEOUT = 20
+
+DISCOVERY_POOL = ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS, thread_name_prefix='discovery')
+
+# <link> tags and their attributes, and how the start of a feed looks
+LINK_PATTERN = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+ATTRIBUTE_PATTERN = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+FEED_TYPES = ['application/rss+xml', 'application/atom+xml', 'application/feed+json']
+FEED_START_PATTERN = re.compile(r'<(rss|feed|rdf:RDF)\b', re.IGNORECASE)
+FEED_SNIFF_LENGTH = 2048
+
+
+def looks_like_url(website: str) -> bool:
+    '''Checks if website is a URL rather than the name of a website.
+
+    Args:
+        website: website URL or name
+
+    Returns:
+        True if website has a scheme or ends in a common top level domain
+    '''
+
+    if urlparse(website).scheme in ('http', 'https'):
+        return True
+
+    host = website.split('/')[0]
+
+    return host.split('.')[-1].lower() in COMMON_EXTENSIONS
+
+
+def get_url(company_name: str) -> str:
+    '''Finds the website associated with the name of a company or
+    publication.
+
+    Args:
+        company_name: the name of the company, publication or site to find
+        the URL for
+
+    Returns:
+        The URL for the company, publication or website, None if not found
+    '''
+
+    logger = logging.getLogger(__name__ + '.get_url')
+    logger.info('Getting website URL for %s', company_name)
+
+    query = f'{company_name} official website'
+
+    try:
+        for url in google_search(query, num_results=5):
+            if 'facebook' not in url and 'linkedin' not in url:
+                return url
+
+    except Exception as e: # pylint: disable=broad-exception-caught
+        logger.error('Error searching for %s: %s', company_name, e)
+
+    return None
+
+
+def discover(website_url: str) -> str:
+    '''Finds the feed URI for a website, taking the first valid result of
+    the <link rel="alternate"> probe, the common path probes and a findfeed
+    search, all run in parallel.
+
+    Args:
+        website_url: the website to find the feed for
+
+    Returns:
+        Feed URI, None if no feed was found
+    '''
+
+    logger = logging.getLogger(__name__ + '.discover')
+
+    if website_url is None:
+        return None
+
+    if urlparse(website_url).scheme == '':
+        website_url = f'https://{website_url}'
+
+    parsed = urlparse(website_url)
+    root = f'{parsed.scheme}://{parsed.netloc}'
+
+    candidates = {DISCOVERY_POOL.submit(_probe_links, website_url): 'link rel=alternate'}
+
+    for path in FEED_PATHS:
+        candidates[DISCOVERY_POOL.submit(_probe_path, root + path)] = path
+
+    candidates[DISCOVERY_POOL.submit(_search, website_url)] = 'findfeed'
+
+    waiting = set(candidates)
+
+    while len(waiting) > 0:
+        done, waiting = wait(waiting, timeout=DISCOVERY_TIMEOUT, return_when=FIRST_COMPLETED)
+
+        if len(done) == 0:
+            logger.info('Timed out finding feed for %s', website_url)
+            break
+
+        for future in done:
+            try:
+                feed_uri = future.result()
+
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logger.error('%s probe for %s failed: %s', candidates[future], website_url, e)
+                continue
+
+            if feed_uri is not None:
+                logger.info('Found %s by %s', feed_uri, candidates[future])
+                return feed_uri
+
+    return None
+
+
+def _probe_links(website_url: str) -> str:
+    '''Gets the first feed the website's page advertises with a
+    <link rel="alternate"> tag.
+
+    Args:
+        website_url: the website page to read
+
+    Returns:
+        Absolute feed URI, None if the page doesn't link a feed
+    '''
+
+    html = http_client.get_html(website_url)
+
+    if html is None:
+        return None
+
+    for tag in LINK_PATTERN.findall(html):
+        attributes = {
+            match[0].lower(): next(value for value in match[1:] if value)
+            for match in ATTRIBUTE_PATTERN.findall(tag)
+            if any(match[1:])
+        }
+
+        if ('alternate' in attributes.get('rel', '').lower().split()
+                and attributes.get('type', '').lower() in FEED_TYPES
+                and 'href' in attributes):
+            return urljoin(website_url, attributes['href'])
+
+    return None
+
+
+def _probe_path(uri: str) -> str:
+    '''Checks if uri serves a feed.
+
+    Args:
+        uri: candidate feed URI
+
+    Returns:
+        uri if the response looks like an RSS, Atom or RDF feed, None
+        otherwise
+    '''
+
+    content = http_client.get_html(uri)
+
+    if content is None:
+        return None
+
+    if FEED_START_PATTERN.search(content[:FEED_SNIFF_LENGTH]) is None:
+        return None
+
+    return uri
+
+
+def _search(website_url: str) -> str:
+    '''Finds the feed URI for a website with findfeed.
+
+    Args:
+        website_url: the website to find the feed for
+
+    Returns:
+        Feed URI, None if findfeed found nothing
+    '''
+
+    feeds = feed_search(website_url)
+
+    if len(feeds) > 0:
+        return str(feeds[0].url)
+
+    return None
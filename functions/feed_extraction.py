@@ -1,32 +1,86 @@
 '''Helper functions for MCP tools.'''
 
-import os
 import re
+import time
+import asyncio
+import html as html_lib
 import logging
-import urllib.request
-from urllib.error import HTTPError, URLError
+import calendar
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
 
 import feedparser
 from boilerpy3 import extractors
 from boilerpy3.exceptions import HTMLExtractionError
-from findfeed import search as feed_search
-from googlesearch import search as google_search
-from upstash_redis import Redis
 
-FEED_URIS = {}
+import functions.cache as cache
+import functions.feed_discovery as feed_discovery
+import functions.http_client as http_client
+import functions.identity as identity
+import functions.metrics as metrics
+import functions.process_pool as process_pool
+import functions.serialization as serialization
+from functions.single_flight import SingleFlight
+import functions.title_index as title_index
+
 RSS_EXTENSIONS = ['xml', 'rss', 'atom']
-COMMON_EXTENSIONS = ['com', 'net', 'org', 'edu', 'gov', 'co', 'us']
-REDIS = Redis(
-    url='https://sensible-midge-19304.upstash.io',
-    token=os.environ['UPSTASH_REDIS_KEY']
-)
+
+# Seconds to remember that no feed was found for a website
+NO_FEED_TTL = 600
+
+# Seconds in each sy:updatePeriod
+UPDATE_PERIODS = {
+    'hourly': 3600,
+    'daily': 86400,
+    'weekly': 604800,
+    'monthly': 2592000,
+    'yearly': 31536000
+}
+
+# Article fetching concurrency: total worker threads, maximum simultaneous
+# requests to any one host. Request timeouts are set on the shared client.
+# The async tools fetch on the same pool, so the limits hold for both.
+FETCH_WORKERS = 8
+FETCH_PER_HOST = 2
+
+FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+HOST_SEMAPHORES = {}
+HOST_SEMAPHORES_LOCK = threading.Lock()
+
+# Concurrent requests for the same website, feed or article share one
+# lookup, feed request or article fetch, whether they come from the sync or
+# the async tools
+URI_FLIGHTS = SingleFlight('feed URI lookup')
+FEED_FLIGHTS = SingleFlight('feed request')
+FETCH_FLIGHTS = SingleFlight('article fetch')
+
+# Last parsed version of each feed, for conditional GETs, and incremental
+# parsing state per feed URI: the feed it was last built from and its
+# recently seen entries by article id, most recently seen last. Both are
+# kept for the MAX_FEEDS most recently read feeds, and at most
+# FEED_STATE_SIZE entries are kept per feed.
+PARSED_FEEDS = OrderedDict()
+PARSED_FEEDS_LOCK = threading.Lock()
+FEED_STATES = OrderedDict()
+FEED_STATES_LOCK = threading.Lock()
+MAX_FEEDS = 500
+FEED_STATE_SIZE = 100
+ENTRY_KEYS = ['id', 'title', 'link', 'published', 'content']
+
+# Per-thread boilerpy3 extractors and the pattern used to strip markup
+EXTRACTORS = threading.local()
+MARKUP_PATTERN = re.compile(r'(?is)<(script|style)\b.*?</\1\s*>|<!--.*?-->|<[^>]*>')
 
 def find_feed_uri(website: str) -> str:
     '''Attempts to find URI for RSS feed. First checks if string provided in
     website is a feed URI, it it's not, checks if website is a URL, if so,
     uses that to find the RSS feed URI. If the provided string is neither,
     defaults to Google search to find website URL and then uses that to try
-    and find the Feed.
+    and find the Feed, see feed_discovery.discover(). Concurrent calls for
+    the same website share one lookup, and a failed lookup is remembered for
+    NO_FEED_TTL seconds.
 
     Args:
         website: target resource to find RSS feed URI for, can be website URL or
@@ -36,54 +90,60 @@ def find_feed_uri(website: str) -> str:
         RSS feed URI for website
     '''
 
+    with metrics.stage('find_feed_uri'):
+        return URI_FLIGHTS.do(website, _find_feed_uri, website)
+
+
+def _find_feed_uri(website: str) -> str:
+    '''Finds URI for RSS feed, see find_feed_uri().'''
+
     logger = logging.getLogger(__name__ + '.find_feed_uri')
     logger.info('Finding feed URI for %s', website)
 
-    # Find the feed URI
-    feed_uri = None
-
-    # If the website contains xml, rss or atom, assume it's an RSS URI
+    # If the website contains xml, rss or atom, assume it's an RSS URI,
+    # nothing to look up or cache then
     if any(extension in website.lower() for extension in RSS_EXTENSIONS):
-        feed_uri = website
         logger.info('%s looks like a feed URI already - using it directly', website)
+        return website
 
-    # Next, check the cache to see if we already have this feed's URI locally
-    elif website in FEED_URIS:
-        feed_uri = FEED_URIS[website]
-        logger.info('%s feed URI in local cache: %s', website, feed_uri)
-
-    # If we still haven't found it, check to see if the URI is in the Redis cache
+    # Otherwise, check to see if the URI or a recent miss is in the cache.
+    # Misses are kept under their own key: ones stored under the URI key
+    # before they were given an expiry would never be looked up again.
     cache_key = f'{website} feed uri'
-    cache_hit = False
+    miss_key = f'{website} no feed'
+    cached = cache.get_many([cache_key, miss_key])
+    cached_uri = cached[cache_key]
 
-    if feed_uri is None:
-        cached_uri = REDIS.get(cache_key)
+    if cached_uri and not cached_uri.startswith('No feed found'):
+        logger.info('%s feed URI in cache: %s', website, cached_uri)
+        return cached_uri
 
-        if cached_uri:
-            cache_hit = True
-            feed_uri = cached_uri
-            logger.info('%s feed URI in Redis cache: %s', website, feed_uri)
+    if cached[miss_key]:
+        logger.info('%s recently had no feed', website)
+        return cached[miss_key]
 
-    # If still none of those methods get it - try feedparse if it looks like a url
-    # or else just google it
-    if feed_uri is None:
-        if website.split('.')[-1] in COMMON_EXTENSIONS:
-            website_url = website
-            logger.info('%s looks like a website URL', website)
+    # If still none of those methods get it - probe the website if it looks
+    # like a url or else just google it
+    if feed_discovery.looks_like_url(website):
+        website_url = website
+        logger.info('%s looks like a website URL', website)
 
-        else:
-            website_url = _get_url(website)
-            logger.info('Google result for %s: %s', website, website_url)
+    else:
+        website_url = feed_discovery.get_url(website)
+        logger.info('Google result for %s: %s', website, website_url)
 
-        feed_uri = _get_feed(website_url)
-        logger.info('get_feed() returned %s', feed_uri)
+    feed_uri = feed_discovery.discover(website_url)
+    logger.info('discover() returned %s', feed_uri)
 
-        # Add to local cache
-        FEED_URIS[website] = feed_uri
+    # Remember misses for a while only, the site may add a feed or the
+    # lookup may have failed transiently
+    if feed_uri is None:
+        feed_uri = f'No feed found for {website_url}'
+        cache.set(miss_key, feed_uri, ttl=NO_FEED_TTL)
+        return feed_uri
 
-    # Add the feed URI to the redis cache if it wasn't already there
-    if cache_hit is False:
-        REDIS.set(cache_key, feed_uri)
+    # Add the feed URI to the cache
+    cache.set(cache_key, feed_uri)
 
     return feed_uri
 
@@ -97,110 +157,572 @@ def parse_feed(feed_uri: str, n: int) -> list:
 
     Returns:
         List of dictionaries for the n most recent entries in the RSS feed.
-        Each dictionary contains 'title', 'link' and 'content' keys.
+        Each dictionary contains 'id', 'title', 'link', 'published' and
+        'content' keys.
     '''
 
     logger = logging.getLogger(__name__ + '.parse_feed')
 
-    feed = feedparser.parse(feed_uri)
-    logger.info('%s yielded %s entries', feed_uri, len(feed.entries))
+    entries, pending = read_feed(feed_uri, n)
+
+    # Collect fetched article content in feed order, failures only affect
+    # the entry they came from
+    for i, future in pending.items():
+        try:
+            entries[i]['content'] = future.result()
+
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error('Error fetching "%s": %s', entries[i]['link'], e)
+
+    store_entries(entries, list(pending.keys()))
+
+    logger.info('Entries contains %s elements', len(list(entries.keys())))
+
+    return entries
+
+
+def read_feed(feed_uri: str, n: int) -> tuple:
+    '''Reads the n most recent entries from a remote RSS feed URI without
+    waiting for article content. Entries read before come back complete
+    from the feed's state and cached entries from the cache, content for new
+    entries is fetched in the background.
+
+    Args:
+        feed_uri: The RSS feed to get content from
+        n: the number of feed entries to read
+
+    Returns:
+        Tuple of (entries, pending). entries is a dictionary of entry
+        dictionaries with 'id', 'title', 'link', 'published' (Unix timestamp,
+        None if the entry is not dated) and 'content' keys, keyed by
+        position in the feed. pending is a dictionary of futures resolving
+        to the content of new entries, keyed by the same positions. Pass
+        new entries to store_entries() once their content is in.
+    '''
+
+    logger = logging.getLogger(__name__ + '.read_feed')
+
+    feed = _get_parsed_feed(feed_uri)
+
+    # Entries seen before come from the feed's state, only the new ones
+    # need the cache, so an unchanged feed costs no cache requests at all
+    entries, new_feed_entries = _plan_entries(feed_uri, feed, n)
+    logger.info('%s yielded %s entries, %s new', feed_uri, len(feed.entries), len(new_feed_entries))
+
+    # Look up all of the new entries in the cache at once
+    cached = cache.get_many(_entry_cache_keys([entry for _, entry in new_feed_entries]))
+
+    new_entries, feed_content, to_fetch, new_titles = _build_entries(new_feed_entries, cached)
+    entries.update(new_entries)
+
+    pending = {}
+
+    for i, text in feed_content.items():
+        pending[i] = Future()
+        pending[i].set_result(text)
+
+    # Fetch the rest of the article content from the links in the background
+    for i, link in to_fetch.items():
+        pending[i] = FETCH_FLIGHTS.submit(
+            FETCH_POOL,
+            entries[i]['id'],
+            _fetch_content,
+            link
+        )
+
+    cache.set_many(new_titles)
+    _remember_entries(feed_uri, feed, entries)
+
+    return entries, pending
+
+
+async def aread_feed(feed_uri: str, n: int) -> tuple:
+    '''Async version of read_feed(), using the async HTTP and cache clients.
+
+    Args:
+        feed_uri: The RSS feed to get content from
+        n: the number of feed entries to read
+
+    Returns:
+        Tuple of (entries, pending), as read_feed() but pending holds
+        asyncio tasks. Articles are fetched on FETCH_POOL, as in
+        read_feed(). Pass new entries to astore_entries() once their
+        content is in.
+    '''
+
+    logger = logging.getLogger(__name__ + '.aread_feed')
+
+    feed = await _aget_parsed_feed(feed_uri)
+
+    entries, new_feed_entries = _plan_entries(feed_uri, feed, n)
+    logger.info('%s yielded %s entries, %s new', feed_uri, len(feed.entries), len(new_feed_entries))
+
+    cached = await cache.aget_many(_entry_cache_keys([entry for _, entry in new_feed_entries]))
+
+    new_entries, feed_content, to_fetch, new_titles = _build_entries(new_feed_entries, cached)
+    entries.update(new_entries)
+
+    pending = {}
+
+    for i, text in feed_content.items():
+        pending[i] = asyncio.get_running_loop().create_future()
+        pending[i].set_result(text)
+
+    for i, link in to_fetch.items():
+        pending[i] = asyncio.create_task(
+            FETCH_FLIGHTS.asubmit(FETCH_POOL, entries[i]['id'], _fetch_content, link)
+        )
+
+    await cache.aset_many(new_titles)
+    _remember_entries(feed_uri, feed, entries)
+
+    return entries, pending
+
+
+def _plan_entries(feed_uri: str, feed: feedparser.FeedParserDict, n: int) -> tuple:
+    '''Answers the feed's first n entries from its state where possible.
+    An entry is answered if it has been seen with the same title and its
+    content is in.
+
+    Args:
+        feed_uri: The RSS feed URI
+        feed: the parsed feed
+        n: the number of feed entries to read
+
+    Returns:
+        Tuple of (entries, new_feed_entries). entries is a dictionary of the
+        entry dictionaries answered, keyed by position in the feed.
+        new_feed_entries is a list of (position, feedparser entry) tuples
+        for the rest.
+    '''
+
+    with FEED_STATES_LOCK:
+        state = _feed_state(feed_uri)
+        changed = state['feed'] is not feed
+
+    # Only a changed feed can have titles we haven't indexed
+    if changed:
+        for entry in feed.entries:
+            if 'title' in entry:
+                title_index.TITLES.add(entry.title)
 
     entries = {}
+    new_feed_entries = []
+
+    with FEED_STATES_LOCK:
+        for i, entry in enumerate(feed.entries[:n]):
+
+            if 'title' not in entry or 'link' not in entry:
+                entries[i] = {}
+                continue
+
+            seen = state['recent'].get(identity.article_id(entry))
+
+            if seen is not None and seen['title'] == entry.title and seen['content'] is not None:
+                entries[i] = {key: seen[key] for key in ENTRY_KEYS}
+
+            else:
+                new_feed_entries.append((i, entry))
+
+    return entries, new_feed_entries
+
+
+def _remember_entries(feed_uri: str, feed: feedparser.FeedParserDict, entries: dict) -> None:
+    '''Records entries in the feed's state. The entry dictionaries are kept
+    as they are, so content filled in by the caller later is seen by the
+    next read.
+
+    Args:
+        feed_uri: The RSS feed URI
+        feed: the parsed feed entries came from
+        entries: entry dictionaries, keyed by position in the feed
+
+    Returns:
+        None
+    '''
+
+    with FEED_STATES_LOCK:
+        state = _feed_state(feed_uri)
+        state['feed'] = feed
+
+        for entry in entries.values():
+            if 'id' in entry:
+                state['recent'][entry['id']] = entry
+                state['recent'].move_to_end(entry['id'])
+
+        while len(state['recent']) > FEED_STATE_SIZE:
+            state['recent'].popitem(last=False)
+
+
+def _feed_state(feed_uri: str) -> dict:
+    '''Gets a feed's incremental parsing state, creating it if needed, and
+    marks it most recently used. Call with FEED_STATES_LOCK held.
+
+    Args:
+        feed_uri: The RSS feed URI
+
+    Returns:
+        State dictionary with 'feed' and 'recent' keys
+    '''
+
+    if feed_uri not in FEED_STATES:
+        FEED_STATES[feed_uri] = {'feed': None, 'recent': OrderedDict()}
 
-    for i, entry in enumerate(feed.entries):
+        while len(FEED_STATES) > MAX_FEEDS:
+            FEED_STATES.popitem(last=False)
+
+    FEED_STATES.move_to_end(feed_uri)
+
+    return FEED_STATES[feed_uri]
+
+
+def _entry_time(entry) -> float:
+    '''Gets an entry's published or updated date as a Unix timestamp, None
+    if it has neither.'''
+
+    parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+
+    if parsed is None:
+        return None
+
+    return calendar.timegm(parsed)
+
+
+def _entry_cache_keys(feed_entries: list) -> list:
+    '''Gets the cache keys to look up for feed entries: their links and
+    content by stable id, and which id each title points to.
+
+    Args:
+        feed_entries: feedparser entries
+
+    Returns:
+        List of cache keys
+    '''
+
+    cache_keys = []
+
+    for entry in feed_entries:
+        if 'title' in entry and 'link' in entry:
+            entry_id = identity.article_id(entry)
+
+            cache_keys.extend([
+                identity.link_key(entry_id),
+                identity.content_key(entry_id),
+                identity.title_key(entry.title)
+            ])
+
+    return cache_keys
+
+
+def _build_entries(feed_entries: list, cached: dict) -> tuple:
+    '''Builds entry dictionaries from feed entries and their cache lookups.
+
+    Args:
+        feed_entries: list of (position, feedparser entry) tuples
+        cached: result of looking up _entry_cache_keys() in the cache
+
+    Returns:
+        Tuple of (entries, feed_content, to_fetch, new_titles). entries is as
+        returned by read_feed(), with content None for new entries.
+        feed_content maps positions of new entries whose content came in the
+        feed to that content, to_fetch maps positions of the other new
+        entries to their links and new_titles holds title keys to update.
+    '''
+
+    logger = logging.getLogger(__name__ + '.build_entries')
+
+    entries = {}
+    feed_content = {}
+    to_fetch = {}
+    new_titles = {}
+
+    for i, entry in feed_entries:
 
         entry_content = {}
 
         if 'title' in entry and 'link' in entry:
 
             title = entry.title
+            entry_id = identity.article_id(entry)
+            entry_content['id'] = entry_id
             entry_content['title'] = title
+            entry_content['published'] = _entry_time(entry)
 
-            # Check the Redis cache
-            cached_link = REDIS.get(f'{title} link')
+            # Point the title at this article if it doesn't already
+            if cached[identity.title_key(title)] != entry_id:
+                new_titles[identity.title_key(title)] = entry_id
 
-            if cached_link:
+            # Check the Redis cache. A link without content is left over
+            # from a failed fetch, so the article is fetched again
+            cached_link = cached[identity.link_key(entry_id)]
+            cached_content = serialization.decode(cached[identity.content_key(entry_id)])
+
+            if cached_link and cached_content is not None:
                 logger.info('Entry in Redis cache: "%s"', title)
                 entry_content['link'] = cached_link
-                entry_content['content'] = REDIS.get(f'{title} content')
+                entry_content['content'] = cached_content
 
             # If its not in the Redis cache, parse it from the feed data
             else:
-                entry_content['title'] = entry.title
                 entry_content['link'] = entry.link
                 entry_content['content'] = None
 
                 # Grab the article content from the feed, if provided
                 if 'content' in entry:
-                    entry_content['content'] = entry.content
+                    feed_content[i] = _get_entry_text(entry.content)
 
-                # If not, try to get the article content from the link
-                elif entry_content['content'] is None:
+                # If not, the article page needs to be fetched from the link
+                else:
+                    to_fetch[i] = entry.link
 
-                    html = _get_html(entry_content['link'])
-                    content = _get_text(html)
-                    entry_content['content'] = content
+        entries[i] = entry_content
 
-                # Add everything to the cache
-                REDIS.set(f'{title} link', entry_content['link'])
-                REDIS.set(f'{title} content', entry_content['content'])
+    return entries, feed_content, to_fetch, new_titles
 
-                logger.info('Parsed entry: "%s"', title)
 
-        entries[i] = entry_content
+def store_entries(entries: dict, new_entries: list, extra: dict = None) -> None:
+    '''Adds newly parsed entries to the cache.
 
-        if i == n-1:
-            break
+    Args:
+        entries: dictionary of entry dictionaries from read_feed()
+        new_entries: keys of the entries to store
+        extra: optional dictionary of other cache key: value pairs to
+        store in the same request, e.g. new summaries
 
-    logger.info('Entries contains %s elements', len(list(entries.keys())))
+    Returns:
+        None
+    '''
 
-    return entries
+    cache.set_many({**_entry_cache_values(entries, new_entries), **(extra or {})})
+
+
+async def astore_entries(entries: dict, new_entries: list, extra: dict = None) -> None:
+    '''Async version of store_entries().'''
 
+    await cache.aset_many({**_entry_cache_values(entries, new_entries), **(extra or {})})
 
-def _get_url(company_name: str) -> str:
-    '''Finds the website associated with the name of a company or
-    publication.
+
+def _entry_cache_values(entries: dict, new_entries: list) -> dict:
+    '''Gets the cache keys and values to store for new entries.
 
     Args:
-        company_name: the name of the company, publication or site to find
-        the URL for
+        entries: dictionary of entry dictionaries from read_feed()
+        new_entries: keys of the entries to store
 
     Returns:
-        The URL for the company, publication or website.
+        Dictionary of cache key: value
     '''
 
-    logger = logging.getLogger(__name__ + '.get_url')
-    logger.info('Getting website URL for %s', company_name)
+    logger = logging.getLogger(__name__ + '.store_entries')
+
+    new_values = {}
+
+    for i in new_entries:
+
+        # Nothing to store if the fetch failed, the next read retries it
+        if entries[i]['content'] is None:
+            logger.info('No content for entry: "%s"', entries[i]['title'])
+            continue
+
+        entry_id = entries[i]['id']
+        new_values[identity.link_key(entry_id)] = entries[i]['link']
+        new_values[identity.content_key(entry_id)] = serialization.encode(entries[i]['content'])
+        new_values[identity.hash_key(entry_id)] = identity.content_hash(entries[i]['content'])
+
+        logger.info('Parsed entry: "%s"', entries[i]['title'])
+
+    return new_values
+
+
+def get_update_interval(feed_uri: str) -> float:
+    '''Gets how often a feed says it is updated, from its <ttl> or
+    sy:updatePeriod/sy:updateFrequency elements.
+
+    Args:
+        feed_uri: RSS feed URI, must have been read already
+
+    Returns:
+        Update interval in seconds, None if the feed doesn't say
+    '''
+
+    feed = _parsed_feed(feed_uri)
+
+    if feed is None:
+        return None
+
+    channel = feed.feed
+
+    try:
+        if 'ttl' in channel:
+            return float(channel['ttl']) * 60
+
+        if 'sy_updateperiod' in channel:
+            period = UPDATE_PERIODS[channel['sy_updateperiod'].strip().lower()]
+            frequency = float(channel.get('sy_updatefrequency', 1))
 
-    query = f'{company_name} official website'
+            return period / max(frequency, 1)
 
-    for url in google_search(query, num_results=5):
-        if 'facebook' not in url and 'linkedin' not in url:
-            return url
+    except (KeyError, ValueError):
+        pass
 
     return None
 
 
-def _get_feed(website_url: str) -> str:
-    '''Finds the RSS feed URI for a website given the website's url.
-    
+def format_date(timestamp: float) -> str:
+    '''Formats an entry date for tool output.
+
     Args:
-        website_url: The url for the website to find the RSS feed for
-        
+        timestamp: Unix timestamp, as in read_feed() entries
+
     Returns:
-        The website's RSS feed URI as a string
+        ISO 8601 UTC date string, None if timestamp is None
     '''
 
-    logger = logging.getLogger(__name__ + '.get_content')
-    logger.info('Getting feed URI for: %s', website_url)
+    if timestamp is None:
+        return None
+
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
 
-    feeds = feed_search(website_url)
 
-    if len(feeds) > 0:
-        return str(feeds[0].url)
+def _fetch_content(url: str) -> str:
+    '''Fetches article page and extracts its text, holding the host's
+    semaphore so that no single site gets more than FETCH_PER_HOST
+    simultaneous requests.
 
-    else:
-        return f'No feed found for {website_url}'
+    Args:
+        url: the article webpage to get text content from
+
+    Returns:
+        Cleaned article text as string
+    '''
+
+    host = urlparse(url).netloc
+
+    with HOST_SEMAPHORES_LOCK:
+        if host not in HOST_SEMAPHORES:
+            HOST_SEMAPHORES[host] = threading.BoundedSemaphore(FETCH_PER_HOST)
+
+        semaphore = HOST_SEMAPHORES[host]
+
+    # Fetch time includes waiting for the host's semaphore
+    with metrics.stage('article_fetch'), semaphore:
+        html = _get_html(url)
+
+    # Extraction is CPU-bound, run it in a worker process if they are enabled
+    with metrics.stage('text_extraction'):
+        return process_pool.run(_get_text, html)
+
+
+def _get_parsed_feed(feed_uri: str) -> feedparser.FeedParserDict:
+    '''Gets feed with a conditional GET, re-using the previously parsed
+    feed if the server reports it has not changed. Concurrent calls for the
+    same feed share one request.
+
+    Args:
+        feed_uri: The RSS feed to get
+
+    Returns:
+        Parsed feed
+    '''
+
+    return FEED_FLIGHTS.do(feed_uri, _fetch_parsed_feed, feed_uri)
+
+
+def _fetch_parsed_feed(feed_uri: str) -> feedparser.FeedParserDict:
+    '''Gets and parses feed, see _get_parsed_feed().'''
+
+    logger = logging.getLogger(__name__ + '.get_parsed_feed')
+
+    modified, content, headers = http_client.conditional_get(feed_uri)
+
+    if not modified:
+        feed = _parsed_feed(feed_uri)
+
+        if feed is not None:
+            logger.info('%s unchanged, using previously parsed feed', feed_uri)
+            return feed
+
+        # We have validators but lost the parsed feed, ask again unconditionally
+        http_client.forget(feed_uri)
+        modified, content, headers = http_client.conditional_get(feed_uri)
+
+    return _parse_feed_content(feed_uri, content, headers)
+
+
+async def _aget_parsed_feed(feed_uri: str) -> feedparser.FeedParserDict:
+    '''Async version of _get_parsed_feed(). Concurrent calls for the same
+    feed share one request.'''
+
+    return await FEED_FLIGHTS.ado(feed_uri, _afetch_parsed_feed, feed_uri)
+
+
+async def _afetch_parsed_feed(feed_uri: str) -> feedparser.FeedParserDict:
+    '''Gets and parses feed, see _aget_parsed_feed().'''
+
+    logger = logging.getLogger(__name__ + '.aget_parsed_feed')
+
+    modified, content, headers = await http_client.aconditional_get(feed_uri)
+
+    if not modified:
+        feed = _parsed_feed(feed_uri)
+
+        if feed is not None:
+            logger.info('%s unchanged, using previously parsed feed', feed_uri)
+            return feed
+
+        http_client.forget(feed_uri)
+        modified, content, headers = await http_client.aconditional_get(feed_uri)
+
+    return await asyncio.to_thread(_parse_feed_content, feed_uri, content, headers)
+
+
+def _parse_feed_content(feed_uri: str, content: bytes, headers: dict) -> feedparser.FeedParserDict:
+    '''Parses feed response body and keeps the result for conditional GETs.
+
+    Args:
+        feed_uri: The RSS feed URI
+        content: response body, None if the request failed
+        headers: response headers
+
+    Returns:
+        Parsed feed
+    '''
+
+    if content is None:
+        return feedparser.parse(b'')
+
+    headers['content-location'] = feed_uri
+    with metrics.stage('feed_parse'):
+        feed = feedparser.parse(content, response_headers=headers)
+
+    with PARSED_FEEDS_LOCK:
+        PARSED_FEEDS[feed_uri] = feed
+        PARSED_FEEDS.move_to_end(feed_uri)
+
+        while len(PARSED_FEEDS) > MAX_FEEDS:
+            PARSED_FEEDS.popitem(last=False)
+
+    return feed
+
+
+def _parsed_feed(feed_uri: str) -> feedparser.FeedParserDict:
+    '''Gets the last parsed version of a feed and marks it most recently
+    used.
+
+    Args:
+        feed_uri: The RSS feed URI
+
+    Returns:
+        Parsed feed, None if it hasn't been read or has been dropped
+    '''
+
+    with PARSED_FEEDS_LOCK:
+        if feed_uri not in PARSED_FEEDS:
+            return None
+
+        PARSED_FEEDS.move_to_end(feed_uri)
+
+        return PARSED_FEEDS[feed_uri]
 
 
 def _get_html(url: str) -> str:
@@ -213,48 +735,32 @@ def _get_html(url: str) -> str:
         Webpage HTML source as string
     '''
 
-    header={
-        "Accept": ("text/html,application/xhtml+xml,application/xml;q=0.9,image/avif," +
-                   "image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7"),
-        "Accept-Language": "en-US,en;q=0.9",
-        "Connection": "keep-alive",
-        "Sec-Fetch-Site": "cross-site",
-        "Sec-Fetch-User": "?1",
-        "Upgrade-Insecure-Requests": "1",
-        "User-Agent": ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36" +
-                       "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36")
-    }
-
-    # Create the request with header
-    request_params = urllib.request.Request(
-        url=url,
-        headers=header
-    )
-
-    # Get the html string
-    try:
-        with urllib.request.urlopen(request_params) as response:
-            status_code = response.getcode()
+    return http_client.get_html(url)
 
-            if status_code == 200:
-                content = response.read()
-                encoding = response.headers.get_content_charset()
 
-                if encoding is None:
-                    encoding = "utf-8"
+def _get_entry_text(content: list) -> str:
+    '''Gets plain text from the content feedparser found in a feed entry.
 
-                content = content.decode(encoding)
+    Args:
+        content: list of feedparser content dictionaries with 'type' and
+        'value' keys
 
-            else:
-                content = None
+    Returns:
+        Plain text of all of the content blocks
+    '''
+
+    blocks = []
+
+    for block in content:
+        value = block.get('value', '')
 
-    except HTTPError:
-        content = None
+        if 'html' in block.get('type', 'text/html'):
+            value = _clean_html(value)
 
-    except URLError:
-        content = None
+        if value:
+            blocks.append(value)
 
-    return content
+    return '\n'.join(blocks)
 
 
 def _get_text(html: str) -> str:
@@ -270,21 +776,28 @@ def _get_text(html: str) -> str:
     if html is None:
         return None
 
-    extractor = extractors.ArticleExtractor()
+    # One extractor per thread, re-used for every page that thread fetches
+    if not hasattr(EXTRACTORS, 'article'):
+        EXTRACTORS.article = extractors.ArticleExtractor()
 
     try:
-        html = extractor.get_content(html)
+        text = EXTRACTORS.article.get_content(html)
 
     except HTMLExtractionError:
-        pass
+        text = None
 
     except AttributeError:
-        pass
+        text = None
 
     except TypeError:
-        pass
+        text = None
 
-    return _clean_html(html)
+    # boilerpy3 gives back plain text, so only fall back to stripping
+    # markup ourselves if it failed
+    if text is None:
+        return _clean_html(html)
+
+    return _normalize_whitespace(text)
 
 
 def _clean_html(html: str) -> str:
@@ -301,20 +814,30 @@ def _clean_html(html: str) -> str:
     if html is None:
         return None
 
-    # First we remove inline JavaScript/CSS:
-    cleaned = re.sub(r"(?is)<(script|style).*?>.*?(</\1>)", "", html.strip())
+    # Remove inline JavaScript/CSS, comments and the remaining tags in one
+    # pass. Comments are matched before regular tags since they can contain
+    # '>' characters.
+    cleaned = MARKUP_PATTERN.sub(' ', html)
+
+    # Then decode entities, including &nbsp;
+    cleaned = html_lib.unescape(cleaned)
 
-    # Then we remove html comments. This has to be done before removing regular
-    # tags since comments can contain '>' characters.
-    cleaned = re.sub(r"(?s)<!--(.*?)-->[\n]?", "", cleaned)
+    return _normalize_whitespace(cleaned)
 
-    # Next we can remove the remaining tags:
-    cleaned = re.sub(r"(?s)<.*?>", " ", cleaned)
 
+def _normalize_whitespace(text: str) -> str:
+    '''Collapses runs of spaces and tabs to one space and runs of blank
+    lines to one newline.
+
+    Args:
+        text: the string to normalize
+
+    Returns:
+        Normalized string
+    '''
 
-    # Finally, we deal with whitespace
-    cleaned = re.sub(r"&nbsp;", " ", cleaned)
-    cleaned = re.sub(r"  ", " ", cleaned)
-    cleaned = re.sub(r"  ", " ", cleaned)
+    # str.split() is several times faster than substituting whitespace
+    # character classes with a regex, and drops blank lines as it goes
+    lines = (' '.join(line.split()) for line in text.split('\n'))
 
-    return cleaned.strip()
+    return '\n'.join(line for line in lines if line)
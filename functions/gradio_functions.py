@@ -2,25 +2,32 @@
 
 import os
 import re
+import time
 import logging
+import threading
+from collections import deque
 
-from openai import OpenAI
+import functions.log_buffer as log_buffer
+import functions.summarization as summarization_funcs
 
-def call_modal() -> None:
-    '''Sends request to Modal to spin up container'''
+# Summarization endpoint warm-up: 'cold' until start_warm_up() is called,
+# then 'warming' and finally 'ready' or 'failed'
+WARM_UP = {'state': 'cold', 'seconds': None, 'error': None}
+WARM_UP_LOCK = threading.Lock()
 
-    logger = logging.getLogger(__name__ + '.call_modal()')
 
-    # Call the modal container so it spins up
-    client = OpenAI(api_key=os.environ['MODAL_API_KEY'])
+def call_modal() -> str:
+    '''Sends request to Modal to spin up container
 
-    client.base_url = (
-        'https://gperdrizet--vllm-openai-compatible-summarization-serve.modal.run/v1'
-    )
+    Returns:
+        The model's reply, None if the request failed
+    '''
+
+    logger = logging.getLogger(__name__ + '.call_modal()')
 
-    # Default to first avalible model
-    model = client.models.list().data[0]
-    model_id = model.id
+    # Call the modal container so it spins up, this also looks up the model
+    # for the summarization client so the first summary doesn't have to
+    client, model_id = summarization_funcs.get_client()
 
     messages = [
         {
@@ -52,21 +59,89 @@ def call_modal() -> None:
 
     logger.info('Reply: %s', reply)
 
+    return reply
+
+
+def start_warm_up() -> threading.Thread:
+    '''Calls Modal in a background thread so the server can start serving
+    while the container spins up. Progress is recorded in WARM_UP.
+
+    Returns:
+        The warm-up thread
+    '''
+
+    with WARM_UP_LOCK:
+        WARM_UP['state'] = 'warming'
+
+    thread = threading.Thread(target=_warm_up, name='modal-warm-up', daemon=True)
+    thread.start()
+
+    return thread
+
+
+def get_readiness() -> str:
+    '''Gets the summarization endpoint warm-up state for display.
+
+    Returns:
+        Warm-up state as string
+    '''
 
-def update_log(n: int = 10):
-    '''Gets updated logging output from disk to display to user.
+    with WARM_UP_LOCK:
+        warm_up = dict(WARM_UP)
+
+    if warm_up['state'] == 'ready':
+        return f'Summarization endpoint ready ({warm_up["seconds"]} s warm-up)'
+
+    if warm_up['state'] == 'failed':
+        return f'Summarization endpoint warm-up failed: {warm_up["error"]}'
+
+    return f'Summarization endpoint {warm_up["state"]}'
+
+
+def _warm_up() -> None:
+    '''Runs call_modal(), recording how it went in WARM_UP.'''
+
+    start_time = time.time()
+
+    try:
+        reply = call_modal()
+        error = None if reply is not None else 'no reply from model'
+
+    except Exception as e: # pylint: disable=broad-exception-caught
+        error = str(e)
+
+    if error is not None:
+        logging.getLogger(__name__ + '._warm_up()').error('Warm-up failed: %s', error)
+
+        with WARM_UP_LOCK:
+            WARM_UP.update({'state': 'failed', 'error': error})
+
+        return
+
+    with WARM_UP_LOCK:
+        WARM_UP.update({'state': 'ready', 'seconds': round(time.time() - start_time, 2)})
+
+
+def update_log(state: dict = None, n: int = 10) -> tuple:
+    '''Gets updated logging output from the in-memory log buffer to display
+    to user. Only records added since the session's last update are read.
     
     Args:
+        state: the session's log cursor and displayed lines, as returned by
+        the previous call, None on the first call
         n: number of most recent lines of log output to display
 
     Returns:
-        Logging output as string
+        Tuple of (logging output as string, new state)
     '''
 
-    with open('logs/rss_server.log', 'r', encoding='utf-8') as log_file:
-        lines = log_file.readlines()
+    if state is None:
+        state = {'cursor': 0, 'lines': deque(maxlen=n)}
+
+    state['cursor'], new_lines = log_buffer.LOG_BUFFER.since(state['cursor'])
+    state['lines'].extend(new_lines[-n:])
 
-    return ''.join(lines[-n:])
+    return '\n'.join(state['lines']), state
 
 
 def delete_old_logs(directory:str, basename:str) -> None:
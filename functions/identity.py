@@ -0,0 +1,81 @@
+'''Stable article identities and the cache keys built from them.
+
+Articles are identified by a hash of their feed GUID, or of their link if
+the feed doesn't give GUIDs, so the same article keeps its identity when it
+is retitled and two feeds' articles with the same title don't collide.
+Summaries and vectors are keyed on a hash of the article content, so
+unchanged content is never summarized or embedded twice.'''
+
+import json
+import hashlib
+
+# Number of hex digits kept from the hashes
+ID_LENGTH = 16
+
+
+def article_id(entry: dict) -> str:
+    '''Gets the stable identity of a feed entry.
+
+    Args:
+        entry: feedparser entry, or dictionary with 'id' and/or 'link' keys
+
+    Returns:
+        Article id as hex string
+    '''
+
+    guid = entry.get('id') or entry.get('link')
+
+    return hashlib.sha1(guid.encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def content_hash(content) -> str:
+    '''Gets the hash of article content.
+
+    Args:
+        content: article text, or other JSON serializable content
+
+    Returns:
+        Content hash as hex string
+    '''
+
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, default=str)
+
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def link_key(article: str) -> str:
+    '''Cache key for an article's link, by article id.'''
+
+    return f'{article} link'
+
+
+def content_key(article: str) -> str:
+    '''Cache key for an article's content, by article id.'''
+
+    return f'{article} content'
+
+
+def hash_key(article: str) -> str:
+    '''Cache key for the hash of an article's content, by article id.'''
+
+    return f'{article} hash'
+
+
+def title_key(title: str) -> str:
+    '''Cache key for the id of the latest article with a title.'''
+
+    return f'{title} id'
+
+
+def summary_key(digest: str) -> str:
+    '''Cache key for a summary, by content hash.'''
+
+    return f'{digest} summary'
+
+
+def embedded_key(digest: str) -> str:
+    '''Cache key marking content as ingested into the vector store, by
+    content hash.'''
+
+    return f'{digest} embedded'
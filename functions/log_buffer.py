@@ -0,0 +1,68 @@
+'''In-memory tail of the server log, so the UI log panel can show recent
+output without reading the log file.'''
+
+import logging
+from collections import deque
+from itertools import islice
+
+# Number of formatted records kept
+LOG_BUFFER_SIZE = 1000
+
+
+class RingBufferHandler(logging.Handler):
+    '''Logging handler keeping the last capacity formatted records, each
+    numbered with a sequence number that increases by one per record.
+    Readers keep the last sequence number they saw as a cursor and ask only
+    for the records after it.'''
+
+    def __init__(self, capacity: int = LOG_BUFFER_SIZE):
+        '''Args:
+            capacity: number of records to keep
+        '''
+
+        super().__init__()
+
+        self.records = deque(maxlen=capacity)
+        self.last_seq = 0
+
+
+    def emit(self, record: logging.LogRecord) -> None:
+        '''Formats and stores record. Called with the handler's lock held.'''
+
+        try:
+            message = self.format(record)
+
+        except Exception: # pylint: disable=broad-exception-caught
+            self.handleError(record)
+            return
+
+        self.last_seq += 1
+        self.records.append(message)
+
+
+    def since(self, cursor: int = 0) -> tuple:
+        '''Gets the records added after cursor. Costs O(number of new
+        records).
+
+        Args:
+            cursor: last sequence number already seen, 0 for everything kept
+
+        Returns:
+            Tuple of (cursor, lines): the sequence number of the last record
+            and the list of new formatted records, oldest first. Records
+            that have already left the buffer are skipped.
+        '''
+
+        with self.lock:
+            n_new = min(self.last_seq - cursor, len(self.records))
+
+            if n_new <= 0:
+                return self.last_seq, []
+
+            lines = list(islice(reversed(self.records), n_new))
+
+            return self.last_seq, lines[::-1]
+
+
+# Shared handler, added to the root logger by the server
+LOG_BUFFER = RingBufferHandler()
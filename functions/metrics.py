@@ -0,0 +1,437 @@
+'''Latency histograms and counters for the feed pipeline stages, upstream
+services and tools, served in the Prometheus text format on /metrics of the
+Gradio app, and optionally on a small HTTP server of their own.'''
+
+import os
+import time
+import inspect
+import logging
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Path mount() serves metrics on, and where start_server() listens, a port
+# of 0 disables it
+METRICS_PATH = '/metrics'
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    '''Latency histogram with one series per combination of label values.'''
+
+    def __init__(self, name: str, help_text: str, label_names: list, buckets: list = None):
+        '''Args:
+            name: metric name
+            help_text: metric description
+            label_names: names of the labels each observation is made with
+            buckets: bucket upper bounds, defaults to BUCKETS
+        '''
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets if buckets is not None else BUCKETS
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def observe(self, value: float, *labels) -> None:
+        '''Records one observation.
+
+        Args:
+            value: observed value in seconds
+            *labels: label values, in label_names order
+
+        Returns:
+            None
+        '''
+
+        bucket = bisect_left(self.buckets, value)
+
+        with self.lock:
+            if labels not in self.series:
+                self.series[labels] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+            series = self.series[labels]
+
+            if bucket < len(self.buckets):
+                series['buckets'][bucket] += 1
+
+            series['sum'] += value
+            series['count'] += 1
+
+
+    @contextmanager
+    def time(self, *labels):
+        '''Observes the time spent in the with block, including when it
+        raises.
+
+        Args:
+            *labels: label values, in label_names order
+        '''
+
+        start_time = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.observe(time.perf_counter() - start_time, *labels)
+
+
+    def render(self) -> list:
+        '''Gets the histogram in the Prometheus text format.
+
+        Returns:
+            List of lines
+        '''
+
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+
+        with self.lock:
+            series = {labels: dict(values, buckets=list(values['buckets'])) for labels, values in self.series.items()}
+
+        for labels, values in sorted(series.items()):
+            label_pairs = dict(zip(self.label_names, labels))
+            cumulative = 0
+
+            for bound, count in zip(self.buckets, values['buckets']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(label_pairs, le=bound)} {cumulative}')
+
+            lines.append(f'{self.name}_bucket{_labels(label_pairs, le="+Inf")} {values["count"]}')
+            lines.append(f'{self.name}_sum{_labels(label_pairs)} {values["sum"]}')
+            lines.append(f'{self.name}_count{_labels(label_pairs)} {values["count"]}')
+
+        return lines
+
+
+class Counter:
+    '''Counter with one series per combination of label values.'''
+
+    def __init__(self, name: str, help_text: str, label_names: list):
+        '''Args:
+            name: metric name, should end in _total
+            help_text: metric description
+            label_names: names of the labels each increment is made with
+        '''
+
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series = {}
+        self.lock = threading.Lock()
+
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        '''Adds amount to the counter.
+
+        Args:
+            *labels: label values, in label_names order
+            amount: how much to add, defaults to 1
+
+        Returns:
+            None
+        '''
+
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+
+    def render(self) -> list:
+        '''Gets the counter in the Prometheus text format.
+
+        Returns:
+            List of lines
+        '''
+
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+
+        with self.lock:
+            series = dict(self.series)
+
+        for labels, value in sorted(series.items()):
+            lines.append(f'{self.name}{_labels(dict(zip(self.label_names, labels)))} {value}')
+
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'rss_stage_seconds',
+    'Time spent in each feed pipeline stage',
+    ['stage']
+)
+
+UPSTREAM_SECONDS = Histogram(
+    'rss_upstream_seconds',
+    'Latency of requests to upstream services',
+    ['upstream', 'operation']
+)
+
+UPSTREAM_ERRORS = Counter(
+    'rss_upstream_errors_total',
+    'Requests to upstream services that raised',
+    ['upstream', 'operation']
+)
+
+TOOL_SECONDS = Histogram(
+    'rss_tool_seconds',
+    'Time spent in each MCP tool call',
+    ['tool']
+)
+
+TOOL_ERRORS = Counter(
+    'rss_tool_errors_total',
+    'MCP tool calls that raised',
+    ['tool']
+)
+
+METRICS = [STAGE_SECONDS, UPSTREAM_SECONDS, UPSTREAM_ERRORS, TOOL_SECONDS, TOOL_ERRORS]
+
+# Callables returning current values of gauges and externally kept
+# counters, see register_collector()
+COLLECTORS = []
+
+
+def stage(name: str):
+    '''Times a pipeline stage.
+
+    Args:
+        name: stage name
+
+    Returns:
+        Context manager observing the time spent in its with block
+    '''
+
+    return STAGE_SECONDS.time(name)
+
+
+@contextmanager
+def upstream(name: str, operation: str):
+    '''Times a request to an upstream service and counts it as an error if
+    it raises.
+
+    Args:
+        name: upstream service, e.g. 'redis', 'vector', 'llm' or 'http'
+        operation: what was asked of it
+    '''
+
+    with UPSTREAM_SECONDS.time(name, operation):
+        try:
+            yield
+
+        except Exception:
+            UPSTREAM_ERRORS.inc(name, operation)
+            raise
+
+
+def tool(function):
+    '''Decorator timing a tool function and counting its errors. Works for
+    plain functions, coroutine functions and generator functions, and keeps
+    the signature and docstring the MCP server builds the tool from.
+
+    Args:
+        function: tool function, labelled with its name
+
+    Returns:
+        Wrapped function
+    '''
+
+    name = function.__name__
+
+    if inspect.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with _tool_call(name):
+                return await function(*args, **kwargs)
+
+    elif inspect.isgeneratorfunction(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _tool_call(name):
+                yield from function(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _tool_call(name):
+                return function(*args, **kwargs)
+
+    return wrapper
+
+
+def register_collector(collector) -> None:
+    '''Adds a callable that reports values kept elsewhere, e.g. cache hit
+    counts or queue depths, each time metrics are rendered.
+
+    Args:
+        collector: callable returning a list of (name, type, help, samples)
+        tuples, where type is 'gauge' or 'counter' and samples is a list of
+        (labels dictionary, value) tuples
+
+    Returns:
+        None
+    '''
+
+    COLLECTORS.append(collector)
+
+
+def render() -> str:
+    '''Gets all metrics in the Prometheus text format.
+
+    Returns:
+        Metrics exposition as string
+    '''
+
+    logger = logging.getLogger(__name__ + '.render')
+
+    lines = []
+
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    for collector in COLLECTORS:
+        try:
+            collected = collector()
+
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.error('Error collecting metrics: %s', e)
+            continue
+
+        for name, metric_type, help_text, samples in collected:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+            for labels, value in samples:
+                lines.append(f'{name}{_labels(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def mount(app, path: str = METRICS_PATH) -> None:
+    '''Serves render() on path of a FastAPI app, e.g. the Gradio app's, so
+    metrics are scraped from the same address as the app.
+
+    Args:
+        app: FastAPI application
+        path: path to serve metrics on
+
+    Returns:
+        None
+    '''
+
+    # Imported here, the rest of the module doesn't need a web framework
+    from fastapi.responses import Response # pylint: disable=import-outside-toplevel
+
+    app.add_api_route(
+        path,
+        lambda: Response(render(), media_type=CONTENT_TYPE),
+        methods=['GET'],
+        include_in_schema=False
+    )
+
+    logging.getLogger(__name__ + '.mount').info('Serving metrics on %s', path)
+
+
+def start_server(port: int = None, host: str = None) -> ThreadingHTTPServer:
+    '''Serves render() on /metrics from a background thread, for scraping
+    from a port of its own.
+
+    Args:
+        port: port to listen on, defaults to METRICS_PORT
+        host: address to listen on, defaults to METRICS_HOST
+
+    Returns:
+        The server, None if the port is 0 or can't be listened on
+    '''
+
+    logger = logging.getLogger(__name__ + '.start_server')
+
+    port = METRICS_PORT if port is None else port
+    host = METRICS_HOST if host is None else host
+
+    if port == 0:
+        return None
+
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+
+    except OSError as e:
+        logger.error('Not serving metrics on %s:%s: %s', host, port, e)
+        return None
+
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+
+    logger.info('Serving metrics on http://%s:%s/metrics', host, server.server_address[1])
+
+    return server
+
+
+@contextmanager
+def _tool_call(name: str):
+    '''Times a tool call and counts it as an error if it raises.'''
+
+    with TOOL_SECONDS.time(name):
+        try:
+            yield
+
+        except Exception:
+            TOOL_ERRORS.inc(name)
+            raise
+
+
+def _labels(labels: dict, **extra) -> str:
+    '''Formats labels as a Prometheus label set, empty string if there are
+    none.'''
+
+    labels = {**labels, **extra}
+
+    if len(labels) == 0:
+        return ''
+
+    pairs = []
+
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+
+    return '{' + ','.join(pairs) + '}'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    '''Answers GET /metrics with render().'''
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Serves the metrics, or 404 for any other path.'''
+
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = render().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        '''Sends request logs to the module logger instead of stderr.'''
+
+        logging.getLogger(__name__ + '._MetricsHandler').debug(format, *args)
@@ -0,0 +1,199 @@
+'''Background feed poller that keeps article content, summaries and vectors
+for feeds users have requested warm in the cache.'''
+
+import time
+import logging
+import threading
+
+import functions.feed_extraction as extraction_funcs
+
+# Polling intervals in seconds: the first re-poll of a new feed, and the
+# bounds the adaptive interval is kept between
+POLL_INITIAL_INTERVAL = 900
+POLL_MIN_INTERVAL = 300
+POLL_MAX_INTERVAL = 6 * 3600
+
+# How much to shrink the interval when a feed has new entries and grow it
+# when it doesn't
+POLL_SPEEDUP = 0.5
+POLL_BACKOFF = 1.5
+
+
+class FeedPoller:
+    '''Re-polls tracked feeds in a background thread. Each feed's interval
+    adapts to how often it has new entries, and is never shorter than the
+    update period the feed itself advertises with <ttl> or sy:updatePeriod.
+    New entries are handed to the process callback, which is expected to run
+    them through the same pipeline as get_feed() so the cache is warm when a
+    user asks for them.'''
+
+    def __init__(self, process):
+        '''Args:
+            process: callable taking (feed_uri, n) and returning a dictionary
+            of articles with 'title' keys
+        '''
+
+        self.process = process
+        self.feeds = {}
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+
+    def start(self) -> None:
+        '''Starts the polling thread.'''
+
+        self.thread = threading.Thread(target=self._run, name='feed-poller', daemon=True)
+        self.thread.start()
+
+
+    def stop(self) -> None:
+        '''Stops the polling thread after the current poll finishes.'''
+
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+
+    def track(self, feed_uri: str, n: int, titles: list = None) -> None:
+        '''Adds feed to the set being polled, or updates the number of entries
+        to keep warm if it is already tracked.
+
+        Args:
+            feed_uri: RSS feed URI
+            n: number of most recent entries to pre-process
+            titles: optional titles of the entries just retrieved, used to
+            detect new entries on the next poll
+
+        Returns:
+            None
+        '''
+
+        with self.condition:
+            if feed_uri in self.feeds:
+                self.feeds[feed_uri]['n'] = max(n, self.feeds[feed_uri]['n'])
+
+            else:
+                self.feeds[feed_uri] = {
+                    'n': n,
+                    'interval': POLL_INITIAL_INTERVAL,
+                    'next_poll': time.monotonic() + POLL_INITIAL_INTERVAL,
+                    'titles': set(titles or [])
+                }
+
+                logging.getLogger(__name__ + '.track').info('Tracking %s', feed_uri)
+
+            self.condition.notify_all()
+
+
+    def status(self) -> dict:
+        '''Gets tracked feeds with their current interval and seconds until
+        their next poll.
+
+        Returns:
+            Dictionary keyed by feed URI
+        '''
+
+        now = time.monotonic()
+
+        with self.condition:
+            return {
+                feed_uri: {
+                    'n': feed['n'],
+                    'interval': round(feed['interval']),
+                    'next_poll_in': round(max(0, feed['next_poll'] - now))
+                }
+                for feed_uri, feed in self.feeds.items()
+            }
+
+
+    def _run(self) -> None:
+        '''Polling loop: waits for the next feed to come due and polls it.'''
+
+        logger = logging.getLogger(__name__ + '.FeedPoller._run')
+
+        while True:
+
+            with self.condition:
+                if self.stopping:
+                    return
+
+                due = [
+                    feed_uri for feed_uri, feed in self.feeds.items()
+                    if feed['next_poll'] <= time.monotonic()
+                ]
+
+                if len(due) == 0:
+                    next_poll = min(
+                        (feed['next_poll'] for feed in self.feeds.values()),
+                        default=time.monotonic() + POLL_MIN_INTERVAL
+                    )
+
+                    self.condition.wait(timeout=max(0, next_poll - time.monotonic()))
+                    continue
+
+            for feed_uri in due:
+                try:
+                    self._poll(feed_uri)
+
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    logger.error('Error polling %s: %s', feed_uri, e)
+
+                    with self.condition:
+                        self._schedule(feed_uri, changed=False)
+
+
+    def _poll(self, feed_uri: str) -> None:
+        '''Polls one feed, pre-processing its entries and rescheduling it.
+
+        Args:
+            feed_uri: RSS feed URI
+
+        Returns:
+            None
+        '''
+
+        logger = logging.getLogger(__name__ + '.FeedPoller._poll')
+
+        with self.condition:
+            n = self.feeds[feed_uri]['n']
+            seen = self.feeds[feed_uri]['titles']
+
+        articles = self.process(feed_uri, n)
+        titles = {article['title'] for article in articles.values() if 'title' in article}
+        changed = len(titles - seen) > 0
+
+        logger.info('Polled %s, %s new entries', feed_uri, len(titles - seen))
+
+        with self.condition:
+            self.feeds[feed_uri]['titles'] = titles
+            self._schedule(feed_uri, changed)
+
+
+    def _schedule(self, feed_uri: str, changed: bool) -> None:
+        '''Sets the feed's next poll time, shrinking the interval if it had
+        new entries and growing it if it didn't. Caller must hold the
+        condition.
+
+        Args:
+            feed_uri: RSS feed URI
+            changed: whether the last poll found new entries
+
+        Returns:
+            None
+        '''
+
+        feed = self.feeds[feed_uri]
+        interval = feed['interval'] * (POLL_SPEEDUP if changed else POLL_BACKOFF)
+
+        # Don't poll more often than the feed says it updates
+        advertised = extraction_funcs.get_update_interval(feed_uri)
+
+        if advertised is not None:
+            interval = max(interval, advertised)
+
+        feed['interval'] = min(max(interval, POLL_MIN_INTERVAL), POLL_MAX_INTERVAL)
+        feed['next_poll'] = time.monotonic() + feed['interval']
@@ -0,0 +1,121 @@
+'''Optional process pool for the CPU-bound stages: article text extraction
+and semantic chunking. Disabled unless PROCESS_WORKERS is set, in which case
+those stages run in warm worker processes instead of threads in the server
+process, so they don't contend for the GIL with request handling.'''
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Number of worker processes, 0 runs everything in the calling thread
+PROCESS_WORKERS = int(os.environ.get('PROCESS_WORKERS', '0'))
+
+POOL = None
+
+# Set in each worker process by _init_worker()
+SPLITTER = None
+
+
+def start(n_workers: int = None) -> None:
+    '''Starts the worker processes, if enabled. Call before starting any
+    threads, since workers are forked from the calling process.
+
+    Args:
+        n_workers: number of worker processes, defaults to PROCESS_WORKERS
+
+    Returns:
+        None
+    '''
+
+    global POOL, PROCESS_WORKERS # pylint: disable=global-statement
+
+    if n_workers is not None:
+        PROCESS_WORKERS = n_workers
+
+    if PROCESS_WORKERS < 1 or POOL is not None:
+        return
+
+    POOL = ProcessPoolExecutor(
+        max_workers=PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker
+    )
+
+    # Fork and warm up all of the workers now, rather than on first use
+    for future in [POOL.submit(os.getpid) for _ in range(PROCESS_WORKERS)]:
+        future.result()
+
+    logging.getLogger(__name__ + '.start').info('Started %s worker processes', PROCESS_WORKERS)
+
+
+def stop() -> None:
+    '''Stops the worker processes.'''
+
+    global POOL # pylint: disable=global-statement
+
+    if POOL is not None:
+        POOL.shutdown()
+        POOL = None
+
+
+def enabled() -> bool:
+    '''Checks whether work is being sent to worker processes.
+
+    Returns:
+        True if the pool is running
+    '''
+
+    return POOL is not None
+
+
+def run(function, *args):
+    '''Runs function in a worker process if the pool is running, otherwise
+    in the calling thread.
+
+    Args:
+        function: module level function to run
+        *args: arguments for function
+
+    Returns:
+        Return value of function
+    '''
+
+    if POOL is None:
+        return function(*args)
+
+    return POOL.submit(function, *args).result()
+
+
+def chunk(text: str) -> list:
+    '''Semantically chunks text with the worker process's splitter.
+
+    Args:
+        text: text to chunk
+
+    Returns:
+        List of chunk strings
+    '''
+
+    return POOL.submit(_chunk, text).result()
+
+
+def _init_worker() -> None:
+    '''Loads the tokenizer and builds the splitter once per worker process.'''
+
+    global SPLITTER # pylint: disable=global-statement
+
+    # Imported here, rag imports this module
+    import functions.rag as rag_funcs # pylint: disable=import-outside-toplevel
+
+    try:
+        SPLITTER = rag_funcs.build_splitter()
+
+    except Exception as e: # pylint: disable=broad-exception-caught
+        logging.getLogger(__name__ + '._init_worker').error('Error loading tokenizer: %s', e)
+
+
+def _chunk(text: str) -> list:
+    '''Chunks text in a worker process.'''
+
+    return SPLITTER.chunks(text)
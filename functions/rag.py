@@ -1,52 +1,402 @@
 '''Collection of function for RAG on article texts.'''
 
-import os
+import time
 import logging
-import queue
+import threading
+from collections import Counter, deque
 from semantic_text_splitter import TextSplitter
 from tokenizers import Tokenizer
-from upstash_vector import Index
 
+import functions.cache as cache
+import functions.identity as identity
+import functions.metrics as metrics
+import functions.process_pool as process_pool
+import functions.vector_store as vector_store
 
-def ingest(rag_ingest_queue: queue.Queue) -> None:
-    '''Semantically chunks article and upsert to Upstash vector db
-    using article title as namespace.'''
+# Chunk size in tokens and number of chunks sent per upsert request
+CHUNK_TOKENS = 256
+UPSERT_BATCH_SIZE = 32
 
-    logger = logging.getLogger(__name__ + '.ingest()')
+# Ingest pool defaults: number of worker threads, maximum queued articles,
+# most articles a worker takes off the queue at once, what to do when the
+# queue is full and how many latencies to keep
+INGEST_WORKERS = 2
+INGEST_QUEUE_SIZE = 100
+INGEST_TAKE_SIZE = 8
+INGEST_POLICY = 'coalesce'
+INGEST_POLICIES = ['block', 'drop-oldest', 'coalesce']
+LATENCY_HISTORY = 50
 
-    index = Index(
-        url='https://living-whale-89944-us1-vector.upstash.io',
-        token=os.environ['UPSTASH_VECTOR_KEY']
-    )
 
-    while True:
+class IngestPool:
+    '''Pool of RAG ingest worker threads reading from a bounded queue.
 
-        namespaces = index.list_namespaces()
+    put() and put_many() follow the pool's backpressure policy: 'block'
+    waits for space when the queue is full, 'drop-oldest' discards the
+    oldest queued article to make room and 'coalesce' skips articles whose
+    id is already queued or being ingested, then blocks like 'block'.
+    Articles that time out waiting for space are dropped. Different
+    articles that share a title are both ingested.'''
 
-        item = rag_ingest_queue.get()
-        logger.info('Upserting "%s": %s', item['title'], item)
-        title = item['title']
+    def __init__(
+            self,
+            n_workers: int = INGEST_WORKERS,
+            max_queue: int = INGEST_QUEUE_SIZE,
+            policy: str = INGEST_POLICY,
+            take_size: int = INGEST_TAKE_SIZE,
+            upsert_batch_size: int = UPSERT_BATCH_SIZE
+    ):
 
-        if title not in namespaces:
-            text = item['content']
-            logger.info('Got "%s" from RAG ingest queue', title)
+        if policy not in INGEST_POLICIES:
+            raise ValueError(f'Unknown ingest policy: {policy}')
 
-            tokenizer=Tokenizer.from_pretrained('bert-base-uncased')
-            splitter=TextSplitter.from_huggingface_tokenizer(tokenizer, 256)
-            chunks=splitter.chunks(text)
+        self.n_workers = n_workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.take_size = take_size
+        self.upsert_batch_size = upsert_batch_size
 
-            for i, chunk in enumerate(chunks):
+        self.queue = deque()
+        self.queued_ids = Counter()
+        self.in_flight = {}
+        self.embedded = set()
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self.counts = {'ingested': 0, 'skipped': 0, 'coalesced': 0, 'dropped': 0, 'failed': 0}
 
-                index.upsert(
-                    [
-                        (
-                            hash(f'{title}-{i}'),
-                            chunk,
-                            {'namespace': title}
-                        )
-                    ],
-                )
-            logger.info('Ingested %s chunks into vector DB', i + 1)
+        self.condition = threading.Condition()
+        self.accepting = True
+        self.stopping = False
+        self.idle = 0
+        self.workers = []
+
+
+    def start(self) -> None:
+        '''Starts the worker threads.'''
+
+        for i in range(self.n_workers):
+            worker = threading.Thread(
+                target=self._work,
+                name=f'rag-ingest-{i}',
+                daemon=True
+            )
+
+            worker.start()
+            self.workers.append(worker)
+
+
+    def put(self, item: dict, timeout: float = None) -> bool:
+        '''Adds article to the ingest queue following the backpressure policy.
+
+        Args:
+            item: article dictionary with 'id', 'title' and 'content' keys
+            timeout: seconds to wait for space when blocking, defaults to
+            waiting indefinitely
+
+        Returns:
+            True if the article was queued, False if it was coalesced,
+            timed out or the pool is shutting down
+        '''
+
+        return self.put_many([item], timeout=timeout) == 1
+
+
+    def put_many(self, items: list, timeout: float = None) -> int:
+        '''Adds several articles to the ingest queue at once, following the
+        backpressure policy for each. Articles queued together are taken by
+        the idle workers together, so checking and marking them as ingested
+        costs one cache request per worker rather than per article.
+
+        Args:
+            items: list of article dictionaries with 'id', 'title' and
+            'content' keys
+            timeout: seconds to wait for space for all of the articles when
+            blocking, defaults to waiting indefinitely. Articles still
+            waiting then are dropped.
+
+        Returns:
+            Number of articles queued
+        '''
+
+        logger = logging.getLogger(__name__ + '.IngestPool.put_many()')
+        queued = 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self.condition:
+            for item in items:
+                title = item['title']
+
+                if not self.accepting:
+                    logger.info('Ingest pool shutting down, not queuing "%s"', title)
+                    break
+
+                duplicate = self.queued_ids[item['id']] > 0 or item['id'] in self.in_flight
+
+                if self.policy == 'coalesce' and duplicate:
+                    self.counts['coalesced'] += 1
+                    logger.info('"%s" already queued for ingest', title)
+                    continue
+
+                if len(self.queue) >= self.max_queue:
+
+                    if self.policy == 'drop-oldest':
+                        dropped = self.queue.popleft()
+                        self.queued_ids[dropped['id']] -= 1
+                        self.counts['dropped'] += 1
+                        logger.info('Ingest queue full, dropped "%s"', dropped['title'])
+
+                    elif not self.condition.wait_for(
+                        lambda: len(self.queue) < self.max_queue or not self.accepting,
+                        timeout=None if deadline is None else max(0, deadline - time.monotonic())
+                    ) or not self.accepting:
+                        self.counts['dropped'] += 1
+                        logger.info('Ingest queue full, not queuing "%s"', title)
+                        continue
+
+                self.queue.append(item)
+                self.queued_ids[item['id']] += 1
+                queued += 1
+
+            self.condition.notify_all()
+
+        return queued
+
+
+    def shutdown(self, timeout: float = 30) -> bool:
+        '''Stops accepting new articles, waits for queued and in-flight
+        articles to finish and stops the workers.
+
+        Args:
+            timeout: seconds to wait for the queue to drain
+
+        Returns:
+            True if the queue drained before the timeout
+        '''
+
+        logger = logging.getLogger(__name__ + '.IngestPool.shutdown()')
+
+        with self.condition:
+            self.accepting = False
+            self.condition.notify_all()
+
+            drained = self.condition.wait_for(
+                lambda: len(self.queue) == 0 and len(self.in_flight) == 0,
+                timeout=timeout
+            )
+
+            self.stopping = True
+            self.condition.notify_all()
+
+        for worker in self.workers:
+            worker.join(timeout=1)
+
+        logger.info('Ingest pool stopped, drained: %s', drained)
+
+        return drained
+
+
+    def status(self) -> dict:
+        '''Gets ingest queue depth, in-flight titles, counters and recent
+        per-article ingest latencies.
+
+        Returns:
+            Status dictionary
+        '''
+
+        with self.condition:
+            latencies = list(self.latencies)
+
+            status = {
+                'workers': self.n_workers,
+                'policy': self.policy,
+                'queue_depth': len(self.queue),
+                'max_queue': self.max_queue,
+                'in_flight': sorted(self.in_flight.values()),
+                'counts': dict(self.counts),
+                'recent_latencies': [
+                    {'title': title, 'seconds': round(seconds, 3)}
+                    for title, seconds in latencies
+                ]
+            }
+
+        if len(latencies) > 0:
+            status['mean_latency'] = round(sum(seconds for _, seconds in latencies) / len(latencies), 3)
+
+        return status
+
+
+    def _work(self) -> None:
+        '''Worker loop: takes articles off the queue, chunks them and
+        upserts them to the vector store.'''
+
+        logger = logging.getLogger(__name__ + '.IngestPool._work()')
+
+        store = vector_store.get_store()
+
+        # Chunk in the worker processes if they are running, otherwise load
+        # the tokenizer and build the splitter once for this worker
+        if process_pool.enabled():
+            chunker = process_pool.chunk
 
         else:
-            logger.info('%s already in RAG namespace', title)
+            chunker = build_splitter().chunks
+
+        while True:
+
+            # Share what is queued with the other idle workers, up to
+            # take_size articles each, so articles queued together are
+            # checked and marked as ingested together but not all by one
+            # worker
+            with self.condition:
+                self.idle += 1
+                self.condition.wait_for(lambda: len(self.queue) > 0 or self.stopping)
+                self.idle -= 1
+
+                if self.stopping and len(self.queue) == 0:
+                    return
+
+                share = -(-len(self.queue) // (self.idle + 1))
+                items = [self.queue.popleft() for _ in range(min(share, self.take_size))]
+
+                for item in items:
+                    self.queued_ids[item['id']] -= 1
+                    self.in_flight[item['id']] = item['title']
+
+                self.condition.notify_all()
+
+            digests = [item.get('hash') or identity.content_hash(item['content']) for item in items]
+            markers = {}
+
+            try:
+                needed = self._needs_ingest(digests)
+
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logger.error('Error checking ingested content: %s', e)
+                needed = set(digests)
+
+            for item, digest in zip(items, digests):
+                title = item['title']
+                start_time = time.monotonic()
+
+                try:
+                    if digest in needed:
+                        logger.info('Got "%s" from RAG ingest queue', title)
+
+                        with metrics.stage('rag_ingest'):
+                            n_chunks = _ingest_article(store, chunker, item, self.upsert_batch_size)
+
+                        logger.info('Ingested %s chunks into vector DB', n_chunks)
+                        result = 'ingested'
+
+                        # Content repeated within the batch is ingested once
+                        needed.discard(digest)
+                        markers[identity.embedded_key(digest)] = item['id']
+
+                    else:
+                        logger.info('"%s" content already in vector DB', title)
+                        result = 'skipped'
+
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    logger.error('Error ingesting "%s": %s', title, e)
+                    result = 'failed'
+
+                with self.condition:
+                    self.counts[result] += 1
+
+                    if result == 'ingested':
+                        self.embedded.add(digest)
+                        self.latencies.append((title, time.monotonic() - start_time))
+
+            # Mark the batch's content as ingested for this and other
+            # processes, in one request
+            try:
+                cache.set_many(markers)
+
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logger.error('Error marking content as ingested: %s', e)
+
+            with self.condition:
+                for item in items:
+                    self.in_flight.pop(item['id'], None)
+
+                self.condition.notify_all()
+
+
+    def _needs_ingest(self, digests: list) -> set:
+        '''Checks which content has not been ingested yet, first in the
+        pool's local set of content hashes, then in the cache, which also
+        knows about content ingested by other processes. The cache is asked
+        about all of the unknown hashes in one request.
+
+        Args:
+            digests: article content hashes
+
+        Returns:
+            Set of the hashes whose content is not in the vector store yet
+        '''
+
+        with self.condition:
+            unknown = [digest for digest in dict.fromkeys(digests) if digest not in self.embedded]
+
+        if len(unknown) == 0:
+            return set()
+
+        cached = cache.get_many([identity.embedded_key(digest) for digest in unknown])
+        ingested = {digest for digest in unknown if cached[identity.embedded_key(digest)] is not None}
+
+        with self.condition:
+            self.embedded.update(ingested)
+
+        return set(unknown) - ingested
+
+
+def build_splitter() -> TextSplitter:
+    '''Loads the tokenizer and builds the semantic text splitter.
+
+    Returns:
+        TextSplitter
+    '''
+
+    tokenizer = Tokenizer.from_pretrained('bert-base-uncased')
+
+    return TextSplitter.from_huggingface_tokenizer(tokenizer, CHUNK_TOKENS)
+
+
+def _ingest_article(store, chunker, item: dict, batch_size: int) -> int:
+    '''Chunks one article and upserts the chunks in batches.
+
+    Args:
+        store: vector store to upsert to
+        chunker: callable splitting article content into a list of chunks
+        item: article dictionary with 'id', 'title' and 'content' keys
+        batch_size: number of chunks to upsert per request
+
+    Returns:
+        Number of chunks upserted
+    '''
+
+    title = item['title']
+
+    with metrics.stage('chunking'):
+        chunks = chunker(item['content'])
+
+    # Chunk ids only depend on the article id, so re-ingesting an article
+    # replaces its vectors instead of adding duplicates
+    vectors = [
+        (
+            f"{item['id']}-{i}",
+            chunk,
+            {'namespace': title, 'article_id': item['id'], 'chunk': i, 'chunks': len(chunks)}
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+
+    for start in range(0, len(vectors), batch_size):
+        with metrics.upstream('vector', 'upsert'):
+            store.upsert(vectors[start:start + batch_size])
+
+    # If the article got shorter, its old trailing chunks would still match
+    # queries, delete them once the new chunks are in
+    with metrics.upstream('vector', 'delete'):
+        store.delete_chunks(item['id'], len(vectors))
+
+    return len(vectors)
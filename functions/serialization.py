@@ -0,0 +1,84 @@
+'''Serialization for cached article payloads. Text is wrapped in a small
+versioned envelope, 'rss1:<codec>:<payload>', and compressed when it is
+long enough for that to pay off. Values without an envelope, e.g. written
+before it existed, are passed through as-is.'''
+
+import base64
+import logging
+import zlib
+
+try:
+    import zstandard
+
+except ImportError:
+    zstandard = None
+
+ENVELOPE_VERSION = 'rss1'
+
+# Payloads shorter than this many bytes are stored uncompressed
+COMPRESS_THRESHOLD = 512
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# zstd if the zstandard package is installed, zlib otherwise
+CODEC = 'zstd' if zstandard is not None else 'zlib'
+
+
+def encode(text: str) -> str:
+    '''Wraps text in the envelope, compressing it if it is long enough.
+
+    Args:
+        text: string to encode
+
+    Returns:
+        Envelope string, None if text is None
+    '''
+
+    if text is None:
+        return None
+
+    data = text.encode('utf-8')
+
+    if len(data) < COMPRESS_THRESHOLD:
+        return f'{ENVELOPE_VERSION}:raw:{text}'
+
+    if CODEC == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    else:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+
+    payload = base64.b64encode(compressed).decode('ascii')
+
+    return f'{ENVELOPE_VERSION}:{CODEC}:{payload}'
+
+
+def decode(value):
+    '''Unwraps an envelope, decompressing the payload if needed.
+
+    Args:
+        value: envelope string, or a value stored without an envelope
+
+    Returns:
+        Decoded string, or value unchanged if it has no envelope
+    '''
+
+    if not isinstance(value, str) or not value.startswith(ENVELOPE_VERSION + ':'):
+        return value
+
+    _, codec, payload = value.split(':', 2)
+
+    if codec == 'raw':
+        return payload
+
+    data = base64.b64decode(payload)
+
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+
+    if codec == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+
+    logging.getLogger(__name__ + '.decode').error('Cannot decode %s payload', codec)
+
+    return None
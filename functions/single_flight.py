@@ -0,0 +1,198 @@
+'''Request coalescing: concurrent callers asking for the same key wait for
+one in-flight computation instead of each running it.'''
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, Future
+
+
+class SingleFlight:
+    '''Runs at most one call per key at a time. Callers arriving while a
+    call for their key is running get its result, or its exception,
+    when it finishes. Results are not kept after that, caching is left to
+    the caller.
+
+    Calls run with do(), submit(), asubmit() and ado() share one future
+    per key, so threads and coroutines on any event loop asking for the
+    same key wait for the same call. do() blocks until the call is done,
+    so it must not be used on an event loop's thread for keys ado() calls
+    run on that loop.'''
+
+    def __init__(self, name: str):
+        '''Args:
+            name: what is being coalesced, for logging
+        '''
+
+        self.name = name
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.counts = {'calls': 0, 'coalesced': 0}
+
+
+    def do(self, key, function, *args, **kwargs):
+        '''Runs function(*args, **kwargs) for key, or waits for the call
+        already running for key.
+
+        Args:
+            key: hashable key identifying the work
+            function: callable doing the work
+            *args: positional arguments for function
+            **kwargs: keyword arguments for function
+
+        Returns:
+            Return value of function
+        '''
+
+        future, leader = self._join(key)
+
+        if not leader:
+            logging.getLogger(__name__ + '.SingleFlight.do').info(
+                'Waiting for in-flight %s: %s', self.name, key
+            )
+
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+
+        except BaseException as e:
+            self._forget(key, future)
+            future.set_exception(e)
+            raise
+
+        self._forget(key, future)
+        future.set_result(result)
+
+        return result
+
+
+    def submit(self, executor: Executor, key, function, *args, **kwargs) -> Future:
+        '''Submits function(*args, **kwargs) for key to executor, or gets the
+        future already submitted for key. Coalescing when submitting, rather
+        than in the executor's worker, also covers calls still waiting in
+        the executor's queue.
+
+        Args:
+            executor: executor to run the call on
+            key: hashable key identifying the work
+            function: callable doing the work
+            *args: positional arguments for function
+            **kwargs: keyword arguments for function
+
+        Returns:
+            Future resolving to the return value of function
+        '''
+
+        with self.lock:
+            future = self.futures.get(key)
+
+            if future is not None:
+                self.counts['coalesced'] += 1
+                return future
+
+            future = executor.submit(function, *args, **kwargs)
+            self.futures[key] = future
+            self.counts['calls'] += 1
+
+        future.add_done_callback(lambda done: self._forget(key, done))
+
+        return future
+
+
+    async def asubmit(self, executor: Executor, key, function, *args, **kwargs):
+        '''Awaits submit(), for coroutines sharing an executor, and the
+        limit its workers set, with threads. The call is not cancelled if
+        the caller is.
+
+        Args:
+            executor: executor to run the call on
+            key: hashable key identifying the work
+            function: callable doing the work
+            *args: positional arguments for function
+            **kwargs: keyword arguments for function
+
+        Returns:
+            Return value of function
+        '''
+
+        future = self.submit(executor, key, function, *args, **kwargs)
+
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+
+    async def ado(self, key, function, *args, **kwargs):
+        '''Awaits function(*args, **kwargs) for key, or waits for the call
+        already running or submitted for key. The call runs as a task, so a
+        caller being cancelled doesn't cancel it for the others.
+
+        Args:
+            key: hashable key identifying the work
+            function: coroutine function doing the work
+            *args: positional arguments for function
+            **kwargs: keyword arguments for function
+
+        Returns:
+            Return value of function
+        '''
+
+        future, leader = self._join(key)
+
+        if leader:
+            task = asyncio.ensure_future(function(*args, **kwargs))
+            task.add_done_callback(lambda done: self._settle(key, future, done))
+
+        else:
+            logging.getLogger(__name__ + '.SingleFlight.ado').info(
+                'Waiting for in-flight %s: %s', self.name, key
+            )
+
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+
+    def in_flight(self) -> int:
+        '''Gets the number of calls currently running or submitted.'''
+
+        with self.lock:
+            return len(self.futures)
+
+
+    def _join(self, key) -> tuple:
+        '''Gets the future of the call for key, starting a new one if there
+        is none. Returns (future, True) if the caller has to run the call.'''
+
+        with self.lock:
+            future = self.futures.get(key)
+
+            if future is not None:
+                self.counts['coalesced'] += 1
+                return future, False
+
+            future = Future()
+            self.futures[key] = future
+            self.counts['calls'] += 1
+
+        return future, True
+
+
+    def _settle(self, key, future: Future, task: asyncio.Task) -> None:
+        '''Passes a finished ado() call's outcome on to its waiters.'''
+
+        self._forget(key, future)
+
+        if task.cancelled():
+            future.cancel()
+
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+
+        else:
+            future.set_result(task.result())
+
+
+    def _forget(self, key, future: Future) -> None:
+        '''Removes a finished call, unless key has a newer one.'''
+
+        with self.lock:
+            if self.futures.get(key) is future:
+                del self.futures[key]
@@ -2,46 +2,116 @@
 
 import os
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from openai import OpenAI
-from upstash_redis import Redis
 
-REDIS = Redis(
-    url='https://sensible-midge-19304.upstash.io',
-    token=os.environ['UPSTASH_REDIS_KEY']
-)
+import functions.cache as cache
+import functions.identity as identity
+import functions.metrics as metrics
+from functions.single_flight import SingleFlight
 
-def summarize_content(title: str, content: str) -> str:
+MODAL_BASE_URL = 'https://gperdrizet--vllm-openai-compatible-summarization-serve.modal.run/v1'
+
+# Maximum number of summaries being generated at once, by the sync and
+# the async tools together: all summaries run on SUMMARY_POOL
+SUMMARY_WORKERS = 4
+
+SUMMARY_POOL = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix='summary')
+
+# Shared client and the id of the model it serves, set on first use
+CLIENT = None
+MODEL_ID = None
+CLIENT_LOCK = threading.Lock()
+
+# Sync, submitted and async summaries of the same content share one call
+SUMMARY_FLIGHTS = SingleFlight('summary')
+
+
+def summarize_content(title: str, content: str, use_cache: bool = True) -> str:
     '''Generates summary of article content using Modal inference endpoint.
     
     Args:
-        content: string containing the text content to be summarized
+        title: article title
+        content: string containing the text content to be summarized, its
+        hash is used for the summary cache key
+        use_cache: if False, skip the cache lookup and write, for callers
+        that batch cache access themselves, defaults to True. Concurrent
+        calls for the same content share one summary either way.
         
     Returns:
         Summarized text as string
     '''
 
+    return submit_summary(title, content, use_cache=use_cache).result()
+
+
+def _summarize_content(title: str, content: str, cache_key: str, use_cache: bool) -> str:
+    '''Generates summary, see summarize_content().'''
+
+    with metrics.stage('summarize'):
+        return _generate_summary(title, content, cache_key, use_cache)
+
+
+def _generate_summary(title: str, content: str, cache_key: str, use_cache: bool) -> str:
+    '''Checks the cache and generates summary, see summarize_content().'''
+
     logger = logging.getLogger(__name__ + '.summarize_content')
     logger.info('Summarizing extracted content')
 
     # Check Redis cache for summary
-    cache_key = f'{title} summary'
-    cached_summary = REDIS.get(cache_key)
+    cached_summary = cache.get(cache_key) if use_cache else None
 
     if cached_summary:
         logger.info('Got summary from Redis cache: "%s"', title)
         return cached_summary
 
     # It the summary is not in the cache, generate it
-    client = OpenAI(api_key=os.environ['MODAL_API_KEY'])
+    try:
+        client, model_id = get_client()
+
+        with metrics.upstream('llm', 'chat'):
+            response = client.chat.completions.create(model=model_id, **_completion_args(content))
+
+    except Exception as e: # pylint: disable=broad-exception-caught
+        response = None
+        logger.error('Error during Modal API call: %s', e)
+
+    if response is not None:
+        summary = response.choices[0].message.content
+
+    else:
+        summary = None
+
+    # Add the new summary to the cache
+    if use_cache:
+        cache.set(cache_key, summary)
+
+    logger.info('Summarized: "%s"', title)
+
+    return summary
+
+
+async def asummarize_content(title: str, content: str, use_cache: bool = True) -> str:
+    '''Async version of summarize_content(), waiting for the summary
+    without holding the event loop.'''
+
+    cache_key = identity.summary_key(identity.content_hash(content))
 
-    client.base_url = (
-        'https://gperdrizet--vllm-openai-compatible-summarization-serve.modal.run/v1'
+    return await SUMMARY_FLIGHTS.asubmit(
+        SUMMARY_POOL,
+        cache_key,
+        _summarize_content,
+        title,
+        content,
+        cache_key,
+        use_cache
     )
 
-    # Default to first avalible model
-    model = client.models.list().data[0]
-    model_id = model.id
+
+def _completion_args(content: str) -> dict:
+    '''Builds the chat completion arguments for summarizing content.'''
 
     messages = [
         {
@@ -50,8 +120,7 @@ def summarize_content(title: str, content: str) -> str:
         }
     ]
 
-    completion_args = {
-        'model': model_id,
+    return {
         'messages': messages,
         # "frequency_penalty": args.frequency_penalty,
         # "max_tokens": 128,
@@ -64,21 +133,54 @@ def summarize_content(title: str, content: str) -> str:
         # "top_p": args.top_p,
     }
 
-    try:
-        response = client.chat.completions.create(**completion_args)
 
-    except Exception as e: # pylint: disable=broad-exception-caught
-        response = None
-        logger.error('Error during Modal API call: %s', e)
+def submit_summary(title: str, content: str, use_cache: bool = False) -> Future:
+    '''Starts generating a summary on the shared summary pool.
 
-    if response is not None:
-        summary = response.choices[0].message.content
+    Args:
+        title: article title
+        content: string containing the text content to be summarized
+        use_cache: if True, check the cache first and store the new
+        summary, defaults to False
 
-    else:
-        summary = None
+    Returns:
+        Future resolving to the summary
+    '''
 
-    # Add the new summary to the cache
-    REDIS.set(cache_key, summary)
-    logger.info('Summarized: "%s"', title)
+    # Coalesce here too, a call for the same content still waiting for a
+    # summary worker would otherwise run after the first one has finished
+    cache_key = identity.summary_key(identity.content_hash(content))
+
+    return SUMMARY_FLIGHTS.submit(
+        SUMMARY_POOL,
+        cache_key,
+        _summarize_content,
+        title,
+        content,
+        cache_key,
+        use_cache
+    )
 
-    return summary
+
+def get_client() -> tuple:
+    '''Gets the shared Modal inference client, creating it and looking up
+    the model it serves on first use.
+
+    Returns:
+        Tuple of (OpenAI client, model id)
+    '''
+
+    global CLIENT, MODEL_ID # pylint: disable=global-statement
+
+    with CLIENT_LOCK:
+        if MODEL_ID is None:
+            client = OpenAI(api_key=os.environ['MODAL_API_KEY'], base_url=MODAL_BASE_URL)
+
+            # Default to first avalible model
+            with metrics.upstream('llm', 'models'):
+                MODEL_ID = client.models.list().data[0].id
+            CLIENT = client
+
+            logging.getLogger(__name__ + '.get_client').info('Using model: %s', MODEL_ID)
+
+        return CLIENT, MODEL_ID
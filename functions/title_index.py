@@ -0,0 +1,156 @@
+'''In-memory index of the article titles seen in feeds, for resolving
+approximate titles without an embedding call.'''
+
+import re
+import logging
+import threading
+from collections import defaultdict
+
+# Minimum similarity for resolve() to accept a candidate, and the bonus a
+# candidate gets when the query is a prefix of it
+MATCH_THRESHOLD = 0.5
+PREFIX_BONUS = 0.2
+
+NON_WORD_PATTERN = re.compile(r'[^\w\s]+')
+SPACE_PATTERN = re.compile(r'\s+')
+
+
+class TitleIndex:
+    '''Trigram inverted index over normalized article titles. Candidates are
+    ranked by the Dice coefficient of their trigram sets with the query's.'''
+
+    def __init__(self):
+
+        self.titles = {}
+        self.trigrams = {}
+        self.postings = defaultdict(set)
+        self.lock = threading.Lock()
+
+
+    def add(self, title: str) -> None:
+        '''Adds title to the index.
+
+        Args:
+            title: article title
+
+        Returns:
+            None
+        '''
+
+        key = normalize(title)
+
+        if len(key) == 0:
+            return
+
+        with self.lock:
+            if key in self.titles:
+                self.titles[key] = title
+                return
+
+            grams = trigrams(key)
+            self.titles[key] = title
+            self.trigrams[key] = grams
+
+            for gram in grams:
+                self.postings[gram].add(key)
+
+
+    def search(self, query: str, k: int = 5) -> list:
+        '''Finds the titles most similar to query.
+
+        Args:
+            query: approximate title
+            k: maximum number of candidates to return
+
+        Returns:
+            List of (title, score) tuples, best first. Score is 1.0 for an
+            exact match after normalization.
+        '''
+
+        key = normalize(query)
+
+        if len(key) == 0:
+            return []
+
+        with self.lock:
+            if key in self.titles:
+                return [(self.titles[key], 1.0)]
+
+            grams = trigrams(key)
+            shared = defaultdict(int)
+
+            for gram in grams:
+                for candidate in self.postings.get(gram, ()):
+                    shared[candidate] += 1
+
+            scored = []
+
+            for candidate, n_shared in shared.items():
+                score = 2 * n_shared / (len(grams) + len(self.trigrams[candidate]))
+
+                if candidate.startswith(key):
+                    score = min(score + PREFIX_BONUS, 1.0)
+
+                scored.append((self.titles[candidate], score))
+
+        scored.sort(key=lambda candidate: candidate[1], reverse=True)
+
+        return scored[:k]
+
+
+    def resolve(self, query: str, threshold: float = MATCH_THRESHOLD) -> str:
+        '''Gets the best matching title, if it is a good enough match.
+
+        Args:
+            query: approximate title
+            threshold: minimum score to accept
+
+        Returns:
+            Title string, None if nothing matched well enough
+        '''
+
+        candidates = self.search(query, k=1)
+
+        if len(candidates) == 0 or candidates[0][1] < threshold:
+            return None
+
+        logging.getLogger(__name__ + '.resolve').info(
+            'Resolved "%s" to "%s" (%.2f)', query, candidates[0][0], candidates[0][1]
+        )
+
+        return candidates[0][0]
+
+
+def normalize(title: str) -> str:
+    '''Lower-cases title, removes punctuation and collapses whitespace.
+
+    Args:
+        title: string to normalize
+
+    Returns:
+        Normalized string
+    '''
+
+    title = NON_WORD_PATTERN.sub(' ', title.lower())
+
+    return SPACE_PATTERN.sub(' ', title).strip()
+
+
+def trigrams(key: str) -> set:
+    '''Gets the set of character trigrams of a normalized string, padded
+    so that word starts and ends count.
+
+    Args:
+        key: normalized string
+
+    Returns:
+        Set of trigram strings
+    '''
+
+    padded = f'  {key} '
+
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Shared index of every title parse_feed has seen
+TITLES = TitleIndex()
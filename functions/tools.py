@@ -1,29 +1,133 @@
 '''Tool functions for MCP server'''
 
-import os
-import threading
+import atexit
 import time
 import json
 import logging
-import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
 from typing import Tuple
-from upstash_vector import Index
-from upstash_redis import Redis
 
+import functions.cache as cache
 import functions.feed_extraction as extraction_funcs
+import functions.identity as identity
+import functions.metrics as metrics
+import functions.poller as poller_funcs
+import functions.process_pool as process_pool
 import functions.summarization as summarization_funcs
 import functions.rag as rag_funcs
+import functions.title_index as title_index
+import functions.vector_store as vector_store
+from functions.single_flight import SingleFlight
+
+# Minimum title match score for find_article() to answer from the title
+# index without a vector search
+FIND_ARTICLE_TITLE_THRESHOLD = 0.8
+
+# Seconds a feed read waits for space in the RAG ingest queue before its
+# articles are dropped, get_ingest_status() reports them
+INGEST_PUT_TIMEOUT = 1
+
+# Background workers, started by start() rather than on import
+RAG_INGEST_POOL = rag_funcs.IngestPool()
+STARTED = False
+START_LOCK = threading.Lock()
+
 
-RAG_INGEST_QUEUE = queue.Queue()
+# Concurrent get_feed() calls for the same feed share one pipeline run,
+# sync and async ones alike
+FEED_FLIGHTS = SingleFlight('get_feed')
 
-rag_ingest_thread = threading.Thread(
-    target=rag_funcs.ingest,
-    args=(RAG_INGEST_QUEUE,)
-)
 
-rag_ingest_thread.start()
+def _run_feed(feed_uri: str, n: int) -> dict:
+    '''Runs feed through the get_feed() pipeline to completion, sharing the
+    run with any concurrent callers for the same feed.
+
+    Args:
+        feed_uri: RSS feed URI
+        n: number of articles to parse from feed
+
+    Returns:
+        Dictionary of finished articles, must not be modified
+    '''
+
+    def run() -> dict:
+        articles = {}
 
+        for articles in _feed_pipeline(feed_uri, n):
+            pass
 
+        return articles
+
+    return FEED_FLIGHTS.do((feed_uri, n), run)
+
+
+FEED_POLLER = poller_funcs.FeedPoller(process=_run_feed)
+
+
+def start() -> None:
+    '''Starts the background workers: the extraction/chunking worker
+    processes if enabled, the RAG ingest pool and the feed poller. Safe to
+    call more than once. The server calls it before it starts serving, so
+    the worker processes are forked before any of its threads are running,
+    and the feed pipelines call it in case it hasn't been.
+
+    Returns:
+        None
+    '''
+
+    global STARTED # pylint: disable=global-statement
+
+    with START_LOCK:
+        if STARTED:
+            return
+
+        process_pool.start()
+        RAG_INGEST_POOL.start()
+        FEED_POLLER.start()
+
+        # Finish ingesting queued articles before the process exits, then
+        # save the vector store. Exit handlers run last registered first.
+        atexit.register(vector_store.save_store)
+        atexit.register(RAG_INGEST_POOL.shutdown)
+
+        metrics.register_collector(_collect_metrics)
+
+        STARTED = True
+
+
+def _collect_metrics() -> list:
+    '''Reports cache, ingest pool and poller state for the metrics
+    endpoint, see metrics.register_collector().'''
+
+    cache_stats = cache.get_stats()
+    ingest_status = RAG_INGEST_POOL.status()
+
+    return [
+        (
+            'rss_cache_lookups_total',
+            'counter',
+            'Cache lookups by where they were answered',
+            [
+                ({'result': result}, cache_stats[result])
+                for result in ('local_hits', 'negative_hits', 'redis_hits', 'misses')
+            ]
+        ),
+        ('rss_cache_hit_ratio', 'gauge', 'Share of cache lookups that were hits', [({}, cache_stats['hit_ratio'])]),
+        ('rss_cache_local_keys', 'gauge', 'Keys held in the in-process cache', [({}, cache_stats['local_size'])]),
+        ('rss_ingest_queue_depth', 'gauge', 'Articles waiting for RAG ingest', [({}, ingest_status['queue_depth'])]),
+        ('rss_ingest_in_flight', 'gauge', 'Articles being ingested', [({}, len(ingest_status['in_flight']))]),
+        (
+            'rss_ingest_articles_total',
+            'counter',
+            'Articles taken by the RAG ingest pool, by outcome',
+            [({'result': result}, count) for result, count in ingest_status['counts'].items()]
+        ),
+        ('rss_polled_feeds', 'gauge', 'Feeds tracked by the background poller', [({}, len(FEED_POLLER.status()))]),
+    ]
+
+
+@metrics.tool
 def get_feed(website: str, n: int = 3) -> list:
     '''Gets RSS feed content from a given website. Can take a website or RSS
     feed URL directly, or the name of a website. Will attempt to find RSS
@@ -54,39 +158,175 @@ def get_feed(website: str, n: int = 3) -> list:
         logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
         return 'No feed found'
 
-    # Parse and extract content from the feed
-    articles = extraction_funcs.parse_feed(feed_uri, n)
-    logger.info('parse_feed() returned %s entries', len(list(articles.keys())))
+    # Run the pipeline to completion, keeping only the finished articles
+    articles = _run_feed(feed_uri, n)
+
+    # Keep this feed warm in the background from now on
+    FEED_POLLER.track(feed_uri, n, [item['title'] for item in articles.values() if 'title' in item])
+
+    logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+
+    # Return content dictionary as string
+    return json.dumps(articles)
+
+
+@metrics.tool
+def stream_feed(website: str, n: int = 3):
+    '''Streaming version of get_feed(). Gets RSS feed content from a given
+    website, first returning the title and link of the most recent n items in
+    the feed as soon as it has been read, then again each time an article's
+    summary is ready. Can take a website or RSS feed URL directly, or the name
+    of a website.
 
-    # Loop on the posts, sending them to RAG (nonblocking) and summarization (blocking)
-    for i, item in articles.items():
+    Args:
+        website: URL or name of website to extract RSS feed content from
+        n: (optional) number of articles to parse from feed, defaults to 3
+
+    Yields:
+        JSON string containing the feed content so far or 'No feed found' if
+        a RSS feed for the requested website could not be found
+    '''
+
+    start_time = time.time()
+
+    logger = logging.getLogger(__name__ + '.stream_feed()')
+    logger.info('Streaming feed content for: %s', website)
+
+    feed_uri = extraction_funcs.find_feed_uri(website)
+    logger.info('find_feed_uri() returned %s', feed_uri)
+
+    if 'No feed found' in feed_uri:
+        yield 'No feed found'
+        return
+
+    articles = {}
+
+    for articles in _feed_pipeline(feed_uri, n):
+        yield json.dumps(articles)
+
+    FEED_POLLER.track(feed_uri, n, [item['title'] for item in articles.values() if 'title' in item])
+
+    logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+
+
+def _feed_pipeline(feed_uri: str, n: int):
+    '''Reads the feed, then gets article content and summarizes each
+    article as soon as its content is in. The articles go to RAG ingest
+    together once all of their content is in.
+
+    Args:
+        feed_uri: RSS feed URI
+        n: number of articles to parse from feed
+
+    Yields:
+        Dictionary of articles with 'title', 'link', 'published' and, once
+        available, 'summary' keys, keyed by position in the feed. The same dictionary
+        is yielded each time it is updated, the last one is complete.
+    '''
+
+    logger = logging.getLogger(__name__ + '._feed_pipeline()')
+
+    start()
+
+    with metrics.stage('read_feed'):
+        entries, pending = extraction_funcs.read_feed(feed_uri, n)
+    logger.info('read_feed() returned %s entries', len(entries))
+
+    articles = feed_articles(entries)
+
+    yield articles
+
+    cached_summaries = cache.get_many(cached_summary_keys(entries))
+
+    new_summaries = {}
+    content_futures = {future: i for i, future in pending.items()}
+    summary_futures = {}
+    ingest_items = []
+
+    def content_ready(i: int) -> set:
+        '''Readies article for RAG ingest and starts its summary, returns
+        the set of summary futures started.'''
+
+        item = entries[i]
 
         # Check if content is present
-        if item['content'] is not None:
-            logger.info('Summarizing/RAG ingesting: %s', item)
+        if item['content'] is None:
+            return set()
 
-            # Send to RAG ingest
-            RAG_INGEST_QUEUE.put(item.copy())
-            logger.info('"%s" sent to RAG ingest', item['title'])
+        logger.info('Summarizing/RAG ingesting: %s', item)
+        item['hash'] = identity.content_hash(item['content'])
+        ingest_items.append(item.copy())
 
-            # Generate summary and add to content
-            summary = summarization_funcs.summarize_content(
-                item['title'],
-                item['content']
-            )
+        # Get summary from cache if we have it, otherwise start generating it
+        summary = cached_summaries.get(identity.summary_key(item['hash']))
 
+        if summary:
+            logger.info('Got summary from Redis cache: "%s"', item['title'])
             articles[i]['summary'] = summary
-            logger.info('Summary of "%s" generated', item['title'])
+            return set()
 
-        # Remove full-text content before returning
-        articles[i].pop('content', None)
+        future = summarization_funcs.submit_summary(item['title'], item['content'])
+        summary_futures[future] = i
 
-    logger.info('Completed in %s seconds', round(time.time()-start_time, 2))
+        return {future}
 
-    # Return content dictionary as string
-    return json.dumps(articles)
+    def send_to_ingest() -> None:
+        '''Sends the articles to RAG ingest together, once all of their
+        content is in.'''
+
+        with metrics.stage('ingest_put'):
+            RAG_INGEST_POOL.put_many(ingest_items, timeout=INGEST_PUT_TIMEOUT)
+
+        logger.info('%s articles sent to RAG ingest', len(ingest_items))
+
+    waiting = set(content_futures)
+    content_waiting = len(content_futures)
+
+    for i, entry in entries.items():
+        if 'title' in entry and i not in pending:
+            waiting |= content_ready(i)
 
+    if content_waiting == 0:
+        send_to_ingest()
 
+    if any('summary' in article for article in articles.values()):
+        yield articles
+
+    while len(waiting) > 0:
+        done, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+
+        for future in done:
+
+            if future in content_futures:
+                i = content_futures[future]
+
+                try:
+                    entries[i]['content'] = future.result()
+
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    logger.error('Error fetching "%s": %s', entries[i]['link'], e)
+
+                waiting |= content_ready(i)
+                content_waiting -= 1
+
+                if content_waiting == 0:
+                    send_to_ingest()
+
+            else:
+                i = summary_futures[future]
+                articles[i]['summary'] = future.result()
+                logger.info('Summary of "%s" generated', articles[i]['title'])
+
+                if articles[i]['summary'] is not None:
+                    new_summaries[identity.summary_key(entries[i]['hash'])] = articles[i]['summary']
+
+        yield articles
+
+    # Add the new entries and summaries to the cache
+    extraction_funcs.store_entries(entries, list(pending.keys()), extra=new_summaries)
+
+
+@metrics.tool
 def context_search(query: str, article_title: str = None) -> list[Tuple[float, str]]:
     '''Searches for context relevant to query. Use this Function to search 
     for additional general information if needed before answering the user's question 
@@ -103,27 +343,12 @@ def context_search(query: str, article_title: str = None) -> list[Tuple[float, s
         Text relevant to the query
     '''
 
-    logger = logging.getLogger(__name__ + 'context_search')
-
-    index = Index(
-        url='https://living-whale-89944-us1-vector.upstash.io',
-        token=os.environ['UPSTASH_VECTOR_KEY']
-    )
-
-    results = None
-
-    results = index.query(
-        data=query,
-        top_k=3,
-        include_data=True,
-        namespace=article_title
-    )
-
-    logger.info('Retrieved %s chunks for "%s"', len(results), query)
+    articles = vector_store.search_articles(query, **context_search_args(article_title))
 
-    return results[0].data
+    return context_passages(query, articles)
 
 
+@metrics.tool
 def find_article(query: str) -> list[Tuple[float, str]]:
     '''Uses vector search to find the most likely title of the article 
     referred to by query. Use this function if the user is asking about
@@ -136,80 +361,269 @@ def find_article(query: str) -> list[Tuple[float, str]]:
         Article title
     '''
 
-    logger = logging.getLogger(__name__ + 'context_search')
+    # If the query is close to a title we've seen, no need to embed it
+    title = title_index.TITLES.resolve(query, threshold=FIND_ARTICLE_TITLE_THRESHOLD)
 
-    index = Index(
-        url='https://living-whale-89944-us1-vector.upstash.io',
-        token=os.environ['UPSTASH_VECTOR_KEY']
-    )
+    if title is None:
+        title = found_title(query, vector_store.search_articles(query, k=1))
+
+    return title
+
+
+@metrics.tool
+def search_articles(query: str, k: int = 3) -> str:
+    '''Uses vector search to find the k articles most relevant to query,
+    with their best matching passages. Use this function when the user wants
+    to know which articles cover a topic, or when find_article() might
+    have picked the wrong one.
+
+    Args:
+        query: query to find articles for
+        k: (optional) number of articles to return, defaults to 3
 
-    results = None
+    Returns:
+        JSON string containing list of articles with 'title', 'score' and
+        'passages' keys, most relevant first
+    '''
 
-    results = index.query(
-        data=query,
-        top_k=3,
-        include_metadata=True,
-        include_data=True
-    )
+    logger = logging.getLogger(__name__ + '.search_articles()')
 
-    logger.info('Retrieved %s chunks for "%s"', len(results), query)
+    articles = vector_store.search_articles(query, k=int(k))
+    logger.info('Retrieved %s articles for "%s"', len(articles), query)
 
-    return results[0].metadata['namespace']
+    return json.dumps(articles)
 
 
+@metrics.tool
 def get_summary(title: str) -> str:
     '''Uses article title to retrieve summary of article content.
     
     Args:
-        title: exact title of article
+        title: title of article, approximate titles are matched to the
+        closest title seen in a feed
 
     Returns:
         Short summary of article content.
     '''
 
-    logger = logging.getLogger(__name__ + '.get_summary()')
+    return lookup_answer(title, 'summary', _lookup_article(title, 'summary'))
 
-    redis = Redis(
-        url='https://sensible-midge-19304.upstash.io',
-        token=os.environ['UPSTASH_REDIS_KEY']
-    )
 
-    cache_key = f'{title} summary'
-    summary = redis.get(cache_key)
+@metrics.tool
+def get_link(title: str) -> str:
+    '''Uses article title to look up direct link to article content webpage.
+    
+    Args:
+        title: title of article, approximate titles are matched to the
+        closest title seen in a feed
 
-    if summary:
+    Returns:
+        Article webpage URL.
+    '''
 
-        logger.info('Got summary for "%s": %s', title, summary[:100])
-        return summary
+    return lookup_answer(title, 'link', _lookup_article(title, 'link'))
 
-    logger.info('Could not find summary for: "%s"', title)
-    return f'No article called "{title}". Make sure you have the correct title.'
 
+def _lookup_article(title: str, field: str) -> str:
+    '''Looks up an article's summary or link by title, see lookup_keys().
 
-def get_link(title: str) -> str:
-    '''Uses article title to look up direct link to article content webpage.
-    
     Args:
-        title: exact title of article
+        title: article title
+        field: 'summary' or 'link'
 
     Returns:
-        Article webpage URL.
+        Summary or link string, None if not found
+    '''
+
+    keys = lookup_keys(title, field)
+    value = None
+
+    try:
+        while True:
+            value = cache.get(keys.send(value))
+
+    except StopIteration as lookup:
+        return lookup.value
+
+
+@metrics.tool
+def get_ingest_status() -> str:
+    '''Gets status of the RAG ingest workers that add article text to the
+    vector database used by context_search() and find_article(). Use this
+    function to check whether recently retrieved articles are searchable yet.
+
+    Returns:
+        JSON string with ingest queue depth, titles currently being ingested,
+        article counts, including articles dropped because the queue was
+        full, and recent per-article ingest latencies in seconds
     '''
 
-    logger = logging.getLogger(__name__ + '.get_link()')
+    logger = logging.getLogger(__name__ + '.get_ingest_status()')
 
-    redis = Redis(
-        url='https://sensible-midge-19304.upstash.io',
-        token=os.environ['UPSTASH_REDIS_KEY']
-    )
+    status = RAG_INGEST_POOL.status()
+    logger.info('Ingest queue depth: %s', status['queue_depth'])
 
-    cache_key = f'{title} link'
-    link = redis.get(cache_key)
+    return json.dumps(status)
+
+
+# Helpers shared with functions.async_tools, which only adds the awaiting
+def feed_articles(entries: dict) -> dict:
+    '''Builds the tool output for feed entries, before their summaries are
+    in.
+
+    Args:
+        entries: entry dictionaries from read_feed(), keyed by position
+
+    Returns:
+        Dictionary of articles with 'title', 'link' and 'published' keys,
+        keyed by position in the feed, empty for entries with no title
+    '''
+
+    return {
+        i: {
+            'title': entry['title'],
+            'link': entry['link'],
+            'published': extraction_funcs.format_date(entry['published'])
+        } if 'title' in entry else {}
+        for i, entry in entries.items()
+    }
+
+
+def cached_summary_keys(entries: dict) -> list:
+    '''Gets the summary cache keys of the entries whose content came from
+    the cache, so all of their summaries can be looked up at once, by
+    content hash. New summaries are stored with the new entries at the end
+    of the pipeline, so summaries cost one lookup and no extra write per
+    feed read.
+
+    Args:
+        entries: entry dictionaries from read_feed(), keyed by position
+
+    Returns:
+        List of summary cache keys
+    '''
+
+    return [
+        identity.summary_key(identity.content_hash(entry['content']))
+        for entry in entries.values() if entry.get('content') is not None
+    ]
+
+
+def context_search_args(article_title: str) -> dict:
+    '''Gets the vector search arguments for context_search(): from one
+    article, its best passages, otherwise the best passage from each of
+    the best matching articles.
+
+    Args:
+        article_title: article to search, None for all articles
+
+    Returns:
+        Keyword arguments for vector_store.search_articles()
+    '''
+
+    if article_title is not None:
+        return {'k': 1, 'namespace': article_title, 'passages': 3}
+
+    return {'k': 3, 'passages': 1}
+
+
+def context_passages(query: str, articles: list) -> str:
+    '''Joins the passages of context_search()'s search results.
+
+    Args:
+        query: the search query, for logging
+        articles: results of vector_store.search_articles()
+
+    Returns:
+        Passages separated by blank lines
+    '''
+
+    logger = logging.getLogger(__name__ + '.context_search()')
+
+    passages = [passage['text'] for article in articles for passage in article['passages']]
+    logger.info('Retrieved %s passages for "%s"', len(passages), query)
+
+    return '\n\n'.join(passages)
+
+
+def found_title(query: str, articles: list) -> str:
+    '''Gets find_article()'s answer from its vector search results.
+
+    Args:
+        query: the search query, for logging
+        articles: results of vector_store.search_articles()
+
+    Returns:
+        Title of the best matching article
+    '''
+
+    logger = logging.getLogger(__name__ + '.find_article()')
+    logger.info('Retrieved %s articles for "%s"', len(articles), query)
+
+    if len(articles) == 0:
+        return 'No matching article found'
+
+    return articles[0]['title']
+
+
+def lookup_keys(title: str, field: str):
+    '''Walks the cache from an article's title to its summary or link:
+    title to article id, then for summaries article id to content hash and
+    content hash to summary. Approximate titles are matched to the closest
+    title seen in a feed. Driven by _lookup_article() and its async
+    version, which get each key from the cache and send the value back.
+
+    Args:
+        title: article title
+        field: 'summary' or 'link'
+
+    Yields:
+        Cache keys to look up
+
+    Returns:
+        Summary or link string, None if not found
+    '''
+
+    article_id = yield identity.title_key(title)
+
+    # If we don't have the exact title, try the closest title we've seen
+    if article_id is None:
+        resolved_title = title_index.TITLES.resolve(title)
+
+        if resolved_title is not None and resolved_title != title:
+            article_id = yield identity.title_key(resolved_title)
+
+    if article_id is None:
+        return None
+
+    if field == 'link':
+        return (yield identity.link_key(article_id))
+
+    digest = yield identity.hash_key(article_id)
+
+    if digest is None:
+        return None
+
+    return (yield identity.summary_key(digest))
+
+
+def lookup_answer(title: str, field: str, value: str) -> str:
+    '''Gets get_summary()'s or get_link()'s answer from the looked up value.
+
+    Args:
+        title: title asked for
+        field: 'summary' or 'link'
+        value: summary or link, None if not found
+
+    Returns:
+        value, or a message saying there is no such article
+    '''
 
-    if link:
+    logger = logging.getLogger(__name__ + f'.get_{field}()')
 
-        logger.info('Got link for "%s": %s', title, link)
-        return link
+    if value:
+        logger.info('Got %s for "%s": %s', field, title, value[:100])
+        return value
 
-    logger.info('Could not find link for: "%s"', title)
+    logger.info('Could not find %s for: "%s"', field, title)
     return f'No article called "{title}". Make sure you have the correct title.'
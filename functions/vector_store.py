@@ -0,0 +1,645 @@
+'''Vector stores for article chunks. Upstash is the default, an embedded
+local store can be selected with VECTOR_BACKEND=local for in-process search
+with no network round-trips.
+
+Chunks are stored with the title of the article they came from in their
+'namespace' metadata field, and queries can be restricted to one article
+by passing its title as namespace. Their 'article_id', 'chunk' and
+'chunks' fields hold the article's id, the chunk's number and the
+article's number of chunks.'''
+
+import os
+import re
+import json
+import asyncio
+import logging
+import threading
+import zlib
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import functions.metrics as metrics
+
+# Which store get_store() returns: 'upstash' or 'local'
+VECTOR_BACKEND = os.environ.get('VECTOR_BACKEND', 'upstash')
+
+UPSTASH_VECTOR_URL = 'https://living-whale-89944-us1-vector.upstash.io'
+
+# Local store settings: where to persist it (not persisted if unset), how
+# often to save it there if it has changed, the sentence-transformers model
+# used to embed text and the size of the hashing embedder used if
+# sentence-transformers is not installed
+LOCAL_VECTOR_PATH = os.environ.get('LOCAL_VECTOR_PATH')
+LOCAL_SAVE_INTERVAL = 300
+LOCAL_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+HASHING_DIMENSIONS = 1024
+WORD_PATTERN = re.compile(r'\w+')
+
+# Article search: how many chunks to fetch per article wanted and at
+# least, how to combine chunk scores and the rank offset for reciprocal
+# rank fusion. 'sum' divides the summed scores by the article's number of
+# chunks, so long articles don't win just by having more chunks in the
+# results; it has the best recall in the search_recall benchmark. Fetching
+# at least MIN_FETCH chunks keeps k=1 lookups from ranking articles on one
+# or two chunks each.
+OVER_FETCH = 5
+MIN_FETCH = 15
+ARTICLE_AGGREGATION = 'sum'
+AGGREGATIONS = ['max', 'sum', 'rrf']
+RRF_K = 60
+
+QueryResult = namedtuple('QueryResult', ['id', 'score', 'data', 'metadata'])
+
+STORE = None
+STORE_LOCK = threading.Lock()
+
+
+def get_store():
+    '''Gets the shared vector store, creating it on first use.
+
+    Returns:
+        UpstashVectorStore or LocalVectorStore, depending on VECTOR_BACKEND
+    '''
+
+    global STORE # pylint: disable=global-statement
+
+    with STORE_LOCK:
+        if STORE is None:
+            if VECTOR_BACKEND == 'local':
+                STORE = LocalVectorStore(path=LOCAL_VECTOR_PATH)
+                STORE.start_autosave()
+
+            elif VECTOR_BACKEND == 'upstash':
+                STORE = UpstashVectorStore()
+
+            else:
+                raise ValueError(f'Unknown vector backend: {VECTOR_BACKEND}')
+
+            logging.getLogger(__name__ + '.get_store').info('Using %s vector store', VECTOR_BACKEND)
+
+        return STORE
+
+
+def set_store(store) -> None:
+    '''Replaces the shared vector store.
+
+    Args:
+        store: vector store to use
+
+    Returns:
+        None
+    '''
+
+    global STORE # pylint: disable=global-statement
+
+    with STORE_LOCK:
+        STORE = store
+
+
+def save_store() -> None:
+    '''Saves the shared vector store if it is a local store with a path, for
+    calling at shutdown.
+
+    Returns:
+        None
+    '''
+
+    with STORE_LOCK:
+        store = STORE
+
+    if isinstance(store, LocalVectorStore):
+        store.close()
+
+
+def search_articles(
+        query: str,
+        k: int = 3,
+        fetch_k: int = None,
+        aggregation: str = ARTICLE_AGGREGATION,
+        namespace: str = None,
+        passages: int = 2
+) -> list:
+    '''Over-fetches chunks for query, groups them by the article they came
+    from and ranks the articles by their aggregated chunk scores, so one long
+    article can't crowd out the rest.
+
+    Args:
+        query: query text
+        k: number of articles to return
+        fetch_k: number of chunks to fetch, defaults to k * OVER_FETCH or
+        MIN_FETCH, whichever is larger
+        aggregation: how to combine an article's chunk scores: 'max', 'sum'
+        (over the article's number of chunks) or 'rrf' (reciprocal rank
+        fusion), defaults to ARTICLE_AGGREGATION
+        namespace: optional article title to restrict the search to
+        passages: maximum number of passages to return per article
+
+    Returns:
+        List of dictionaries with 'id', 'title', 'score' and 'passages'
+        keys, best first. Passages are dictionaries with 'text' and 'score'
+        keys.
+    '''
+
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f'Unknown aggregation: {aggregation}')
+
+    if fetch_k is None:
+        fetch_k = max(k * OVER_FETCH, MIN_FETCH)
+
+    with metrics.upstream('vector', 'query'):
+        results = get_store().query(data=query, top_k=fetch_k, namespace=namespace)
+
+    return _rank_articles(results, k, aggregation, passages)
+
+
+async def asearch_articles(
+        query: str,
+        k: int = 3,
+        fetch_k: int = None,
+        aggregation: str = ARTICLE_AGGREGATION,
+        namespace: str = None,
+        passages: int = 2
+) -> list:
+    '''Async version of search_articles().'''
+
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f'Unknown aggregation: {aggregation}')
+
+    if fetch_k is None:
+        fetch_k = max(k * OVER_FETCH, MIN_FETCH)
+
+    store = await asyncio.to_thread(get_store)
+    with metrics.upstream('vector', 'query'):
+        results = await store.aquery(data=query, top_k=fetch_k, namespace=namespace)
+
+    return _rank_articles(results, k, aggregation, passages)
+
+
+def _rank_articles(results: list, k: int, aggregation: str, passages: int) -> list:
+    '''Groups chunk query results by article and ranks the articles, see
+    search_articles().'''
+
+    articles = {}
+    chunks = {}
+
+    # Articles are told apart by id, different articles can share a title.
+    # Chunks stored without an id or chunk count are grouped by title and
+    # divided by the number of them in the results.
+    for rank, result in enumerate(results):
+        title = result.metadata['namespace']
+        article_id = result.metadata.get('article_id', title)
+
+        if article_id not in articles:
+            articles[article_id] = {'id': article_id, 'title': title, 'score': 0.0, 'passages': []}
+            chunks[article_id] = result.metadata.get('chunks', 0)
+
+        article = articles[article_id]
+
+        if aggregation == 'max':
+            article['score'] = max(article['score'], result.score)
+
+        elif aggregation == 'sum':
+            article['score'] += result.score
+
+        else:
+            article['score'] += 1 / (RRF_K + rank + 1)
+
+        if 'chunks' not in result.metadata:
+            chunks[article_id] += 1
+
+        # Results come best first, so the first passages are the best ones
+        if len(article['passages']) < passages:
+            article['passages'].append({'text': result.data, 'score': result.score})
+
+    if aggregation == 'sum':
+        for article_id, article in articles.items():
+            article['score'] /= chunks[article_id]
+
+    ranked = sorted(articles.values(), key=lambda article: article['score'], reverse=True)
+
+    return ranked[:k]
+
+
+class UpstashVectorStore:
+    '''Upstash vector index, embedding is done by Upstash.'''
+
+    def __init__(self):
+
+        # Imported here so the local backend doesn't need upstash installed
+        from upstash_vector import Index # pylint: disable=import-outside-toplevel
+
+        self.index = Index(
+            url=UPSTASH_VECTOR_URL,
+            token=os.environ['UPSTASH_VECTOR_KEY']
+        )
+
+        # Created on first async query in each event loop
+        self.async_index = None
+        self.async_index_loop = None
+
+
+    def upsert(self, vectors: list) -> None:
+        '''Adds or replaces chunks.
+
+        Args:
+            vectors: list of (id, text, metadata) tuples
+
+        Returns:
+            None
+        '''
+
+        self.index.upsert(vectors)
+
+
+    def delete_chunks(self, article_id: str, start: int) -> None:
+        '''Deletes an article's chunks from chunk number start on, left over
+        from a longer version of the article.
+
+        Args:
+            article_id: id of the article the chunks came from
+            start: number of the first chunk to delete
+
+        Returns:
+            None
+        '''
+
+        self.index.delete(filter=f"article_id = '{article_id}' AND chunk >= {start}")
+
+
+    def query(self, data: str, top_k: int = 10, namespace: str = None) -> list:
+        '''Finds the chunks most similar to data.
+
+        Args:
+            data: query text
+            top_k: number of results to return
+            namespace: optional article title to restrict the search to
+
+        Returns:
+            List of results with id, score, data and metadata attributes,
+            most similar first
+        '''
+
+        return self.index.query(
+            data=data,
+            top_k=top_k,
+            include_metadata=True,
+            include_data=True,
+            filter=_namespace_filter(namespace)
+        )
+
+
+    async def aquery(self, data: str, top_k: int = 10, namespace: str = None) -> list:
+        '''Async version of query().'''
+
+        loop = asyncio.get_running_loop()
+
+        if self.async_index is None or self.async_index_loop is not loop:
+            from upstash_vector import AsyncIndex # pylint: disable=import-outside-toplevel
+
+            self.async_index_loop = loop
+
+            self.async_index = AsyncIndex(
+                url=UPSTASH_VECTOR_URL,
+                token=os.environ['UPSTASH_VECTOR_KEY']
+            )
+
+        return await self.async_index.query(
+            data=data,
+            top_k=top_k,
+            include_metadata=True,
+            include_data=True,
+            filter=_namespace_filter(namespace)
+        )
+
+
+class LocalVectorStore:
+    '''In-process vector store: an embedding matrix searched exactly with
+    one matrix-vector product per query.
+
+    A store with a path is loaded from it memory-mapped, so only the pages
+    queries touch are read into memory. Replaced rows are copied on write
+    and new rows are held in memory until the next save(), which writes
+    the matrix and maps it again.'''
+
+    def __init__(self, path: str = None, embedder=None):
+        '''Args:
+            path: optional directory to persist the store in, loaded if it
+            already exists
+            embedder: optional callable taking a list of strings and
+            returning a 2D array of embeddings, defaults to a
+            sentence-transformers model or the hashing embedder
+        '''
+
+        self.path = Path(path) if path is not None else None
+        self.embedder = embedder if embedder is not None else _default_embedder()
+        self.lock = threading.RLock()
+
+        self.embeddings = None
+        self.ids = []
+        self.data = []
+        self.metadata = []
+        self.rows = {}
+        self.namespace_rows = {}
+        self.dirty = False
+        self.stopping = threading.Event()
+
+        if self.path is not None and (self.path / 'embeddings.npy').exists():
+            self._load()
+
+
+    def upsert(self, vectors: list) -> None:
+        '''Embeds and adds or replaces chunks.
+
+        Args:
+            vectors: list of (id, text, metadata) tuples
+
+        Returns:
+            None
+        '''
+
+        if len(vectors) == 0:
+            return
+
+        embeddings = _normalize(np.asarray(
+            self.embedder([text for _, text, _ in vectors]),
+            dtype=np.float32
+        ))
+
+        with self.lock:
+            new_rows = []
+
+            for (vector_id, text, metadata), embedding in zip(vectors, embeddings):
+
+                if vector_id in self.rows:
+                    row = self.rows[vector_id]
+                    self.namespace_rows[self.metadata[row].get('namespace')].remove(row)
+                    self.embeddings[row] = embedding
+                    self.data[row] = text
+                    self.metadata[row] = metadata
+
+                else:
+                    row = len(self.ids)
+                    self.rows[vector_id] = row
+                    self.ids.append(vector_id)
+                    self.data.append(text)
+                    self.metadata.append(metadata)
+                    new_rows.append(embedding)
+
+                self.namespace_rows.setdefault(metadata.get('namespace'), []).append(row)
+
+            if len(new_rows) > 0:
+                new_rows = np.vstack(new_rows)
+
+                if self.embeddings is None:
+                    self.embeddings = new_rows
+
+                else:
+                    self.embeddings = np.vstack([self.embeddings, new_rows])
+
+            self.dirty = True
+
+
+    def delete_chunks(self, article_id: str, start: int) -> None:
+        '''Deletes an article's chunks from chunk number start on, left over
+        from a longer version of the article. Deleting rows rebuilds the
+        embedding matrix, so nothing is done if there are none.
+
+        Args:
+            article_id: id of the article the chunks came from
+            start: number of the first chunk to delete
+
+        Returns:
+            None
+        '''
+
+        with self.lock:
+            deleted = set()
+
+            while f'{article_id}-{start}' in self.rows:
+                deleted.add(self.rows[f'{article_id}-{start}'])
+                start += 1
+
+            if len(deleted) == 0:
+                return
+
+            kept = [row for row in range(len(self.ids)) if row not in deleted]
+
+            self.embeddings = self.embeddings[kept]
+            self.ids = [self.ids[row] for row in kept]
+            self.data = [self.data[row] for row in kept]
+            self.metadata = [self.metadata[row] for row in kept]
+            self._index_rows()
+            self.dirty = True
+
+
+    def query(self, data: str, top_k: int = 10, namespace: str = None) -> list:
+        '''Finds the chunks most similar to data by cosine similarity.
+
+        Args:
+            data: query text
+            top_k: number of results to return
+            namespace: optional article title to restrict the search to
+
+        Returns:
+            List of QueryResult, most similar first
+        '''
+
+        query = _normalize(np.asarray(self.embedder([data]), dtype=np.float32))[0]
+
+        with self.lock:
+            if self.embeddings is None:
+                return []
+
+            # Score every row, or just the article's rows for a namespace
+            if namespace is None:
+                rows = range(len(self.ids))
+                scores = self.embeddings @ query
+
+            else:
+                rows = self.namespace_rows.get(namespace, [])
+
+                if len(rows) == 0:
+                    return []
+
+                scores = self.embeddings[rows] @ query
+
+            top_k = min(top_k, len(scores))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                QueryResult(
+                    self.ids[rows[i]],
+                    float(scores[i]),
+                    self.data[rows[i]],
+                    self.metadata[rows[i]]
+                )
+                for i in top
+            ]
+
+
+    async def aquery(self, data: str, top_k: int = 10, namespace: str = None) -> list:
+        '''Async version of query(), embedding and scoring in a worker
+        thread.'''
+
+        return await asyncio.to_thread(self.query, data, top_k, namespace)
+
+
+    def save(self) -> None:
+        '''Writes the store to its path if it has changed since it was
+        loaded or last saved, then memory-maps the written embeddings.'''
+
+        if self.path is None:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        with self.lock:
+            if not self.dirty or self.embeddings is None:
+                return
+
+            # Write new files and swap them in, the current embeddings may
+            # be mapped from the old file
+            np.save(self.path / 'embeddings.tmp.npy', self.embeddings)
+
+            with open(self.path / 'chunks.tmp.json', 'w', encoding='utf-8') as chunks_file:
+                json.dump({'ids': self.ids, 'data': self.data, 'metadata': self.metadata}, chunks_file)
+
+            os.replace(self.path / 'embeddings.tmp.npy', self.path / 'embeddings.npy')
+            os.replace(self.path / 'chunks.tmp.json', self.path / 'chunks.json')
+
+            self.embeddings = np.load(self.path / 'embeddings.npy', mmap_mode='c')
+            self.dirty = False
+
+        logging.getLogger(__name__ + '.LocalVectorStore.save').info(
+            'Saved %s chunks to %s', len(self.ids), self.path
+        )
+
+
+    def start_autosave(self, interval: float = LOCAL_SAVE_INTERVAL) -> None:
+        '''Starts a background thread saving the store every interval
+        seconds, if it has a path.
+
+        Args:
+            interval: seconds between saves
+
+        Returns:
+            None
+        '''
+
+        if self.path is None:
+            return
+
+        threading.Thread(
+            target=self._autosave,
+            args=(interval,),
+            name='vector-store-save',
+            daemon=True
+        ).start()
+
+
+    def close(self) -> None:
+        '''Stops saving in the background and saves the store a last time.
+
+        Returns:
+            None
+        '''
+
+        self.stopping.set()
+        self.save()
+
+
+    def _autosave(self, interval: float) -> None:
+        '''Autosave thread loop, see start_autosave().'''
+
+        while not self.stopping.wait(interval):
+            try:
+                self.save()
+
+            except Exception as e: # pylint: disable=broad-exception-caught
+                logging.getLogger(__name__ + '.LocalVectorStore._autosave').error(
+                    'Error saving vector store: %s', e
+                )
+
+
+    def _load(self) -> None:
+        '''Reads the store from its path, memory-mapping the embeddings
+        copy-on-write, so replacing rows doesn't write to the file.'''
+
+        self.embeddings = np.load(self.path / 'embeddings.npy', mmap_mode='c')
+
+        with open(self.path / 'chunks.json', 'r', encoding='utf-8') as chunks_file:
+            chunks = json.load(chunks_file)
+
+        self.ids = chunks['ids']
+        self.data = chunks['data']
+        self.metadata = chunks['metadata']
+        self._index_rows()
+
+
+    def _index_rows(self) -> None:
+        '''Rebuilds the row lookups by chunk id and by namespace.'''
+
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.namespace_rows = {}
+
+        for row, metadata in enumerate(self.metadata):
+            self.namespace_rows.setdefault(metadata.get('namespace'), []).append(row)
+
+
+def _namespace_filter(namespace: str) -> str:
+    '''Gets the Upstash metadata filter restricting a query to namespace.'''
+
+    if namespace is None:
+        return ''
+
+    return "namespace = '{}'".format(namespace.replace("'", "\\'"))
+
+
+def hashing_embedder(texts: list) -> np.ndarray:
+    '''Embeds texts by hashing their lower-cased words into a fixed number of
+    buckets. No model to download, for offline use and testing.
+
+    Args:
+        texts: list of strings
+
+    Returns:
+        2D array of embeddings, one row per text
+    '''
+
+    embeddings = np.zeros((len(texts), HASHING_DIMENSIONS), dtype=np.float32)
+
+    for row, text in enumerate(texts):
+        for word in WORD_PATTERN.findall(text.lower()):
+            embeddings[row, zlib.crc32(word.encode()) % HASHING_DIMENSIONS] += 1
+
+    return embeddings
+
+
+def _default_embedder():
+    '''Gets the local sentence-transformers model, falling back to the
+    hashing embedder if sentence-transformers is not installed.'''
+
+    try:
+        from sentence_transformers import SentenceTransformer # pylint: disable=import-outside-toplevel
+
+    except ImportError:
+        logging.getLogger(__name__ + '._default_embedder').warning(
+            'sentence-transformers not installed, using hashing embedder'
+        )
+
+        return hashing_embedder
+
+    model = SentenceTransformer(LOCAL_EMBEDDING_MODEL)
+
+    return lambda texts: model.encode(texts, convert_to_numpy=True)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    '''Scales rows to unit length so dot products are cosine similarities.'''
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    return embeddings / np.maximum(norms, 1e-12)
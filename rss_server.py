@@ -7,11 +7,10 @@ from logging.handlers import RotatingFileHandler
 import gradio as gr
 import assets.text as text
 import functions.tools as tool_funcs
+import functions.async_tools as async_tool_funcs
 import functions.gradio_functions as gradio_funcs
-
-# Call the modal container so it spins up before the rest of
-# the app starts
-gradio_funcs.call_modal()
+import functions.log_buffer as log_buffer
+import functions.metrics as metrics
 
 # Set-up logging - make sure log directory exists
 Path('logs').mkdir(parents=True, exist_ok=True)
@@ -21,12 +20,16 @@ gradio_funcs.delete_old_logs('logs', 'rss_server')
 
 # Set up the root logger so we catch logs from everything
 logging.basicConfig(
-    handlers=[RotatingFileHandler(
-        'logs/rss_server.log',
-        maxBytes=100000,
-        backupCount=10,
-        mode='w'
-    )],
+    handlers=[
+        RotatingFileHandler(
+            'logs/rss_server.log',
+            maxBytes=100000,
+            backupCount=10,
+            mode='w'
+        ),
+        # In-memory tail for the log panel
+        log_buffer.LOG_BUFFER
+    ],
     level=logging.INFO,
     format='%(levelname)s - %(name)s - %(message)s'
 )
@@ -45,11 +48,24 @@ with gr.Blocks(title='RASS server') as demo:
     with gr.Row():
         dialog_output = gr.Textbox(label='Server logs', lines=7, max_lines=5)
 
+    # Each session's position in the log buffer
+    log_state = gr.State(None)
+
     timer = gr.Timer(0.5, active=True)
 
     timer.tick( # pylint: disable=no-member
-        lambda: gradio_funcs.update_log(), # pylint: disable=unnecessary-lambda
-        outputs=dialog_output,
+        gradio_funcs.update_log,
+        inputs=log_state,
+        outputs=[dialog_output, log_state],
+        show_api=False
+    )
+
+    # Summarization endpoint warm-up state
+    readiness_output = gr.Textbox(label='Summarization endpoint', lines=1, max_lines=1)
+
+    timer.tick( # pylint: disable=no-member
+        gradio_funcs.get_readiness,
+        outputs=readiness_output,
         show_api=False
     )
 
@@ -64,7 +80,7 @@ with gr.Blocks(title='RASS server') as demo:
         website_clear_button = gr.ClearButton(components=[website_url, feed_output])
 
     website_submit_button.click( # pylint: disable=no-member
-        fn=tool_funcs.get_feed,
+        fn=async_tool_funcs.get_feed,
         inputs=website_url,
         outputs=feed_output,
         api_name='Get RSS feed content'
@@ -91,7 +107,7 @@ with gr.Blocks(title='RASS server') as demo:
         )
 
     context_search_submit_button.click( # pylint: disable=no-member
-        fn=tool_funcs.context_search,
+        fn=async_tool_funcs.context_search,
         inputs=context_search_query,
         outputs=context_search_output,
         api_name='Context vector search'
@@ -118,7 +134,7 @@ with gr.Blocks(title='RASS server') as demo:
         )
 
     article_search_submit_button.click( # pylint: disable=no-member
-        fn=tool_funcs.find_article,
+        fn=async_tool_funcs.find_article,
         inputs=article_search_query,
         outputs=article_search_output,
         api_name='Article vector search'
@@ -145,7 +161,7 @@ with gr.Blocks(title='RASS server') as demo:
         )
 
     article_title_submit_button.click( # pylint: disable=no-member
-        fn=tool_funcs.get_summary,
+        fn=async_tool_funcs.get_summary,
         inputs=article_title,
         outputs=article_summary,
         api_name='Article summary search'
@@ -172,13 +188,108 @@ with gr.Blocks(title='RASS server') as demo:
         )
 
     article_link_submit_button.click( # pylint: disable=no-member
-        fn=tool_funcs.get_link,
+        fn=async_tool_funcs.get_link,
         inputs=article_title_link,
         outputs=article_link,
         api_name='Article link search'
     )
 
 
+    # Ingest status tool
+    gr.Markdown('### 6. `get_ingest_status()`')
+
+    ingest_status = gr.Textbox(
+        label='RAG ingest status',
+        lines=3,
+        max_lines=3
+    )
+
+    with gr.Row():
+        ingest_status_submit_button = gr.Button('Get status')
+        ingest_status_clear_button = gr.ClearButton(components=[ingest_status])
+
+    ingest_status_submit_button.click( # pylint: disable=no-member
+        fn=tool_funcs.get_ingest_status,
+        outputs=ingest_status,
+        api_name='RAG ingest status'
+    )
+
+
+    # Streaming get feed tool
+    gr.Markdown('### 7. `stream_feed()`')
+    stream_website_url = gr.Textbox('slashdot', label='Website')
+    stream_feed_output = gr.Textbox(label='RSS entries', lines=7, max_lines=7)
+
+    with gr.Row():
+        stream_website_submit_button = gr.Button('Submit website')
+        stream_website_clear_button = gr.ClearButton(
+            components=[stream_website_url, stream_feed_output]
+        )
+
+    stream_website_submit_button.click( # pylint: disable=no-member
+        fn=tool_funcs.stream_feed,
+        inputs=stream_website_url,
+        outputs=stream_feed_output,
+        api_name='Stream RSS feed content'
+    )
+
+
+    # Article search tool
+    gr.Markdown('### 8. `search_articles()`')
+
+    articles_search_query = gr.Textbox(
+        'How is the air traffic control system being updated?',
+        label='Articles search query'
+    )
+    articles_search_output = gr.Textbox(
+        label='Articles search results',
+        lines=7,
+        max_lines=7
+    )
+
+    with gr.Row():
+        articles_search_submit_button = gr.Button('Submit query')
+        articles_search_clear_button = gr.ClearButton(
+            components=[articles_search_query, articles_search_output]
+        )
+
+    articles_search_submit_button.click( # pylint: disable=no-member
+        fn=tool_funcs.search_articles,
+        inputs=articles_search_query,
+        outputs=articles_search_output,
+        api_name='Articles vector search'
+    )
+
+
+    # Get feeds tool
+    gr.Markdown('### 9. `get_feeds()`')
+    websites = gr.Textbox('slashdot, hackernews', label='Websites')
+    feeds_output = gr.Textbox(label='RSS entries', lines=7, max_lines=7)
+
+    with gr.Row():
+        websites_submit_button = gr.Button('Submit websites')
+        websites_clear_button = gr.ClearButton(components=[websites, feeds_output])
+
+    websites_submit_button.click( # pylint: disable=no-member
+        fn=async_tool_funcs.get_feeds,
+        inputs=websites,
+        outputs=feeds_output,
+        api_name='Get several RSS feeds content'
+    )
+
+
 if __name__ == '__main__':
 
-    demo.launch(mcp_server=True)
+    # Start the background workers before serving, then spin up the Modal
+    # container in the background rather than waiting for it
+    tool_funcs.start()
+    gradio_funcs.start_warm_up()
+
+    # Prometheus-style metrics on the app's /metrics, added once the app
+    # exists, and on a port of their own if METRICS_PORT is set, see
+    # functions/metrics.py
+    metrics.start_server()
+
+    demo.launch(mcp_server=True, prevent_thread_lock=True)
+    metrics.mount(demo.app)
+    demo.block_thread()
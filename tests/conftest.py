@@ -0,0 +1,31 @@
+'''Shared fixtures: the benchmark stand-ins for the upstream services,
+installed once per test session.'''
+
+import itertools
+
+import pytest
+
+import benchmarks.stand_ins as stand_ins_funcs
+
+# Each test reads feeds no other test has read, numbered from here
+FEED_NUMBERS = itertools.count(50000)
+
+
+@pytest.fixture(scope='session')
+def stand_ins():
+    '''Starts the stand-ins and points the functions modules at them.'''
+
+    stand_ins_funcs.use_offline_splitter()
+    installed = stand_ins_funcs.install(hosts=4, entries=20, llm_latency=0.05)
+
+    yield installed
+
+    installed['fixtures'].stop()
+    installed['llm'].stop()
+
+
+@pytest.fixture
+def new_feed():
+    '''Gets a callable returning the number of a feed not read before.'''
+
+    return lambda: next(FEED_NUMBERS)
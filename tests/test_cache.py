@@ -0,0 +1,98 @@
+'''The cache batches lookups and writes into one Redis round trip each,
+serves repeat lookups from the in-process tier, and get_feed() makes the
+same number of round trips however many articles it reads.'''
+
+import time
+
+import pytest
+
+import benchmarks.stand_ins as stand_ins_funcs
+import functions.cache as cache
+import functions.tools as tool_funcs
+
+KEYS = 10
+
+
+@pytest.fixture
+def redis():
+    '''In-memory Redis of its own, the cache's client is put back after.'''
+
+    previous = (cache.REDIS, cache.ASYNC_REDIS, cache.UPSTASH_CLIENTS)
+    client = stand_ins_funcs.InMemoryRedis()
+    cache.set_client(client)
+
+    yield client
+
+    cache.REDIS, cache.ASYNC_REDIS, cache.UPSTASH_CLIENTS = previous
+    cache.ASYNC_REDIS_LOOP = None
+    cache.clear_local()
+
+
+def test_set_many_is_one_round_trip(redis):
+    '''set_many() writes all of its values with one command and skips
+    None values.'''
+
+    mapping = {f'test key {i}': f'value {i}' for i in range(KEYS)}
+    cache.set_many({**mapping, 'test key none': None})
+
+    assert redis.commands == 1
+    assert redis.data == mapping
+
+    cache.set_many({'test key none': None})
+
+    assert redis.commands == 1
+
+
+def test_get_many_is_one_round_trip(redis):
+    '''get_many() asks Redis for all of the keys it doesn't hold with one
+    command, then answers from the in-process tier, misses included.'''
+
+    redis.data.update({f'test key {i}': f'value {i}' for i in range(KEYS)})
+    keys = [f'test key {i}' for i in range(KEYS)] + ['test key missing', 'test key 0']
+
+    results = cache.get_many(keys)
+
+    assert redis.commands == 1
+    assert results['test key missing'] is None
+    assert all(results[f'test key {i}'] == f'value {i}' for i in range(KEYS))
+
+    assert cache.get_many(keys) == results
+    assert redis.commands == 1
+
+
+def test_get_feed_round_trips_are_constant(stand_ins, new_feed):
+    '''A cold get_feed() makes as many Redis round trips for ten articles
+    as for three. The ingest pool checks and marks articles once per
+    worker taking part, so each read starts with all workers idle.'''
+
+    commands = {}
+    tool_funcs.start()
+
+    for n in (3, 10):
+        _wait_for_ingest()
+        feed_url = stand_ins['fixtures'].feed_url(new_feed())
+        before = stand_ins['redis'].commands
+
+        tool_funcs.get_feed(feed_url, n=n)
+        _wait_for_ingest()
+
+        commands[n] = stand_ins['redis'].commands - before
+
+    assert commands[3] == commands[10]
+
+
+def _wait_for_ingest(timeout: float = 10) -> None:
+    '''Waits for the RAG ingest pool to finish its queued articles, which
+    check and mark them as ingested in the cache, and for all of its
+    workers to be waiting for more.'''
+
+    pool = tool_funcs.RAG_INGEST_POOL
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        status = pool.status()
+
+        if status['queue_depth'] == 0 and len(status['in_flight']) == 0 and pool.idle == pool.n_workers:
+            return
+
+        time.sleep(0.01)
@@ -0,0 +1,58 @@
+'''Markup stripping and whitespace normalization of article text, and
+cached feed URI lookups.'''
+
+from collections import OrderedDict
+
+import functions.cache as cache
+import functions.feed_extraction as extraction_funcs
+
+
+def test_clean_html():
+    '''Scripts, styles, comments and tags go, entities are decoded and
+    whitespace runs of any length collapse.'''
+
+    html = (
+        '<html><head><style>p { color: red; }</style>'
+        '<script type="text/javascript">var a = "<p>";</script></head>'
+        '<body><!-- a > b --><p>Fish&nbsp;&amp;   chips\t\tand&#160;peas</p>\n'
+        '  \n\n\n<p>  Second   paragraph </p></body></html>'
+    )
+
+    assert extraction_funcs._clean_html(html) == 'Fish & chips and peas\nSecond paragraph' # pylint: disable=protected-access
+
+
+def test_normalize_whitespace():
+    '''Spaces around newlines and blank lines are dropped.'''
+
+    text = '  one \t two  \r\n\n \x0b three\n\n\n  four  '
+
+    assert extraction_funcs._normalize_whitespace(text) == 'one two\nthree\nfour' # pylint: disable=protected-access
+
+
+def test_cached_miss_without_expiry_is_ignored(stand_ins, new_feed):
+    '''A miss cached under the feed URI key, as misses were before they
+    expired, doesn't stop the website being probed again.'''
+
+    feed = new_feed()
+    site_url = stand_ins['fixtures'].site_url(feed)
+    cache.set(f'{site_url} feed uri', f'No feed found for {site_url}')
+
+    assert extraction_funcs.find_feed_uri(site_url) == stand_ins['fixtures'].feed_url(feed)
+
+
+def test_feed_state_is_bounded(monkeypatch):
+    '''Parsed feeds and incremental state are kept for the MAX_FEEDS most
+    recently read feeds only.'''
+
+    monkeypatch.setattr(extraction_funcs, 'MAX_FEEDS', 2)
+    monkeypatch.setattr(extraction_funcs, 'PARSED_FEEDS', OrderedDict())
+    monkeypatch.setattr(extraction_funcs, 'FEED_STATES', OrderedDict())
+
+    for feed_uri in ['one', 'two', 'one', 'three']:
+        extraction_funcs._parse_feed_content(feed_uri, b'<rss version="2.0"></rss>', {}) # pylint: disable=protected-access
+
+        with extraction_funcs.FEED_STATES_LOCK:
+            extraction_funcs._feed_state(feed_uri) # pylint: disable=protected-access
+
+    assert list(extraction_funcs.PARSED_FEEDS) == ['one', 'three']
+    assert list(extraction_funcs.FEED_STATES) == ['one', 'three']
@@ -0,0 +1,135 @@
+'''Repeated polls through the shared HTTP client cost fewer bytes and
+connections than plain requests: unchanged feeds come back as 304s with no
+body, over one kept-alive connection.'''
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+import functions.http_client as http_client
+
+POLLS = 5
+
+# Stub feed and its ETag
+FEED = (
+    b'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+    b'<title>Stub feed</title><item><title>Only entry</title>'
+    b'<link>http://127.0.0.1/only.html</link></item></channel></rss>'
+)
+
+ETAG = '"stub-feed-1"'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    '''Serves FEED with its ETag, or a 304 when the client already has it.
+    Counts connections, full responses, 304s and body bytes sent.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        '''Counts the new connection, the handler lives as long as it does.'''
+
+        super().setup()
+        self.server.count('connections')
+
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Sends the feed, or 304 if If-None-Match matches its ETag.'''
+
+        if self.headers.get('If-None-Match') == ETAG:
+            self.server.count('not_modified')
+            body = b''
+            self.send_response(304)
+
+        else:
+            self.server.count('feeds')
+            body = FEED
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rss+xml')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+
+        # Counted first, so the count is in by the time the client has it
+        self.server.count('bytes', len(body))
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        '''Keeps request logs off stderr.'''
+
+
+class _StubServer(ThreadingHTTPServer):
+    '''HTTP server keeping the counts its handler reports.'''
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.stats = {'feeds': 0, 'not_modified': 0, 'connections': 0, 'bytes': 0}
+        self.lock = threading.Lock()
+
+
+    def count(self, kind: str, amount: int = 1) -> None:
+        '''Adds amount to the count of kind.'''
+
+        with self.lock:
+            self.stats[kind] += amount
+
+
+@pytest.fixture
+def server():
+    '''Stub feed server of its own, so no other test's connections to it
+    are already in the client's pool.'''
+
+    stub = _StubServer()
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    yield stub
+
+    stub.shutdown()
+    stub.server_close()
+
+
+def _feed_url(stub: _StubServer) -> str:
+    return f'http://127.0.0.1:{stub.server_address[1]}/feed.xml'
+
+
+def test_repeated_polls_are_conditional(server):
+    '''Polls after the first send the feed's ETag and get 304s.'''
+
+    feed_url = _feed_url(server)
+    results = [http_client.conditional_get(feed_url) for _ in range(POLLS)]
+
+    assert results[0][0] is True and results[0][1] == FEED
+    assert all(modified is False and content is None for modified, content, _ in results[1:])
+    assert server.stats['feeds'] == 1
+    assert server.stats['not_modified'] == POLLS - 1
+
+    http_client.forget(feed_url)
+
+
+def test_repeated_polls_cost_less(server):
+    '''Polling through the shared client uses one connection and sends the
+    feed body once, plain unconditional requests use a connection and get
+    the body every time.'''
+
+    feed_url = _feed_url(server)
+
+    for _ in range(POLLS):
+        http_client.conditional_get(feed_url)
+
+    http_client.forget(feed_url)
+    polled = dict(server.stats)
+
+    for _ in range(POLLS):
+        httpx.get(feed_url)
+
+    plain = {kind: server.stats[kind] - polled[kind] for kind in polled}
+
+    assert polled['connections'] == 1
+    assert plain['connections'] == POLLS
+    assert plain['bytes'] == POLLS * polled['bytes']
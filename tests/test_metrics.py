@@ -0,0 +1,41 @@
+'''Metrics are served on a FastAPI app's /metrics, and a metrics server
+that can't listen on its port logs it instead of failing.'''
+
+import socket
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import functions.metrics as metrics
+
+
+def test_mount():
+    '''The mounted path serves the rendered metrics.'''
+
+    app = FastAPI()
+    metrics.mount(app)
+
+    with metrics.stage('test_stage'):
+        pass
+
+    response = TestClient(app).get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'stage="test_stage"' in response.text
+
+
+def test_start_server_port_in_use(caplog):
+    '''start_server() returns None and logs the error when its port is
+    taken.'''
+
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+
+        with caplog.at_level(logging.ERROR, logger='functions.metrics'):
+            assert metrics.start_server(port=port, host='127.0.0.1') is None
+
+    assert 'Not serving metrics' in caplog.text
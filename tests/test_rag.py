@@ -0,0 +1,61 @@
+'''The RAG ingest pool shares queued articles between its idle workers and
+drops articles that wait too long for queue space.'''
+
+import time
+import threading
+
+import functions.rag as rag
+
+
+def articles(name: str, n: int) -> list:
+    '''Gets n article dictionaries no other test ingests.'''
+
+    return [
+        {'id': f'{name}-{i}', 'title': f'{name} {i}', 'content': f'Content of {name} article {i}.'}
+        for i in range(n)
+    ]
+
+
+def test_idle_workers_share_queue(stand_ins, monkeypatch): # pylint: disable=unused-argument
+    '''Articles queued together are split between the idle workers instead
+    of all being taken by the first one to wake.'''
+
+    ingested_by = {}
+    lock = threading.Lock()
+
+    def ingest(store, chunker, item: dict, batch_size: int) -> int: # pylint: disable=unused-argument
+        with lock:
+            ingested_by[item['id']] = threading.current_thread().name
+
+        time.sleep(0.1)
+
+        return 1
+
+    monkeypatch.setattr(rag, '_ingest_article', ingest)
+
+    pool = rag.IngestPool(n_workers=2)
+    pool.start()
+
+    while pool.idle < 2:
+        time.sleep(0.01)
+
+    assert pool.put_many(articles('shared queue', 4)) == 4
+    assert pool.shutdown(timeout=10)
+
+    assert sorted(list(ingested_by.values()).count(worker.name) for worker in pool.workers) == [2, 2]
+    assert pool.status()['counts']['ingested'] == 4
+
+
+def test_put_many_timeout_drops():
+    '''Blocking put_many() gives up on the articles that don't fit once its
+    timeout has passed in total, and counts them as dropped.'''
+
+    pool = rag.IngestPool(n_workers=0, max_queue=1, policy='block')
+
+    start_time = time.monotonic()
+    queued = pool.put_many(articles('timeout', 4), timeout=0.2)
+    elapsed = time.monotonic() - start_time
+
+    assert queued == 1
+    assert elapsed < 0.4
+    assert pool.status()['counts']['dropped'] == 3
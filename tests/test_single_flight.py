@@ -0,0 +1,217 @@
+'''Concurrent identical work happens once: single-flight calls on their
+own, and concurrent get_feed() callers against the stand-ins.'''
+
+import time
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import benchmarks.corpus as corpus
+import functions.async_tools as async_tools
+import functions.tools as tool_funcs
+from functions.single_flight import SingleFlight
+
+CALLERS = 8
+N = 3
+
+
+def counts(stand_ins: dict, feed: int) -> dict:
+    '''Gets the requests for one feed and its articles, and the LLM
+    completions. Other tests' feeds can still be polled or probed in the
+    background, so their requests aren't counted.'''
+
+    fixtures = stand_ins['fixtures']
+    article_prefix = corpus.article_path(feed, 0).rsplit('/', 1)[0] + '/'
+
+    with fixtures.lock:
+        return {
+            'feeds': fixtures.paths[corpus.feed_path(feed)],
+            'articles': sum(count for path, count in fixtures.paths.items() if path.startswith(article_prefix)),
+            'completions': stand_ins['llm'].completions
+        }
+
+
+def delta(before: dict, after: dict) -> dict:
+    '''Gets the change in each counter.'''
+
+    return {name: after[name] - before[name] for name in before}
+
+
+def test_single_flight_runs_once():
+    '''Concurrent callers for one key share one call and its result.'''
+
+    flights = SingleFlight('test')
+    calls = []
+    lock = threading.Lock()
+
+    def work(value: int) -> int:
+        with lock:
+            calls.append(value)
+
+        time.sleep(0.2)
+
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        results = list(executor.map(lambda _: flights.do('key', work, 21), range(CALLERS)))
+
+    assert results == [42] * CALLERS
+    assert calls == [21]
+    assert flights.in_flight() == 0
+
+
+def test_async_single_flight_runs_once():
+    '''Concurrent coroutines for one key share one call and its result.'''
+
+    flights = SingleFlight('test')
+    calls = []
+
+    async def work(value: int) -> int:
+        calls.append(value)
+        await asyncio.sleep(0.2)
+
+        return value * 2
+
+    async def main() -> list:
+        return await asyncio.gather(*[flights.ado('key', work, 21) for _ in range(CALLERS)])
+
+    assert asyncio.run(main()) == [42] * CALLERS
+    assert calls == [21]
+    assert flights.in_flight() == 0
+
+
+def test_threads_and_coroutines_share_calls():
+    '''Threads, and coroutines on an event loop in another thread, asking
+    for one key share one call, whichever of them starts it.'''
+
+    flights = SingleFlight('test')
+    calls = []
+
+    def work(value: int) -> int:
+        calls.append(value)
+        time.sleep(0.2)
+
+        return value * 2
+
+    async def awork(value: int) -> int:
+        calls.append(value)
+        await asyncio.sleep(0.2)
+
+        return value * 2
+
+    async def main(key: str) -> list:
+        return await asyncio.gather(*[flights.ado(key, awork, 21) for _ in range(CALLERS)])
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        for key, first, rest in [('sync first', 'thread', 'coroutines'), ('async first', 'coroutines', 'thread')]:
+            runs = {
+                'thread': lambda key=key: executor.submit(flights.do, key, work, 21),
+                'coroutines': lambda key=key: executor.submit(asyncio.run, main(key))
+            }
+
+            leader = runs[first]()
+            time.sleep(0.05)
+            waiter = runs[rest]()
+
+            assert {first: leader.result(), rest: waiter.result()} == {'thread': 42, 'coroutines': [42] * CALLERS}
+
+    assert calls == [21, 21]
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_submit_covers_queued_calls():
+    '''Calls submitted for one key while the first is still waiting for a
+    worker share its future.'''
+
+    flights = SingleFlight('test')
+    calls = []
+    release = threading.Event()
+
+    def work(value: int) -> int:
+        release.wait()
+        calls.append(value)
+
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        blocker = executor.submit(release.wait)
+        futures = [flights.submit(executor, 'key', work, 21) for _ in range(CALLERS)]
+        release.set()
+
+        assert [future.result() for future in futures] == [42] * CALLERS
+        assert blocker.result()
+
+    assert calls == [21]
+    assert flights.in_flight() == 0
+
+
+def test_concurrent_get_feed(stand_ins, new_feed):
+    '''Concurrent get_feed() calls for a new feed make one feed request,
+    one fetch per article and one completion per article, including when
+    callers ask for different numbers of articles.'''
+
+    feed = new_feed()
+    feed_url = stand_ins['fixtures'].feed_url(feed)
+    before = counts(stand_ins, feed)
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        results = list(executor.map(lambda i: tool_funcs.get_feed(feed_url, n=N + i % 3), range(CALLERS)))
+
+    change = delta(before, counts(stand_ins, feed))
+
+    assert change['feeds'] == 1
+    assert change['articles'] == N + 2
+    assert change['completions'] == N + 2
+
+    for i, result in enumerate(results):
+        assert sum(1 for article in json.loads(result).values() if article.get('summary')) == N + i % 3
+
+
+def test_concurrent_async_get_feed(stand_ins, new_feed):
+    '''As test_concurrent_get_feed(), for the async tools.'''
+
+    feed = new_feed()
+    feed_url = stand_ins['fixtures'].feed_url(feed)
+    before = counts(stand_ins, feed)
+
+    async def main() -> list:
+        return await asyncio.gather(*[
+            async_tools.get_feed(feed_url, n=N + i % 3)
+            for i in range(CALLERS)
+        ])
+
+    results = asyncio.run(main())
+    change = delta(before, counts(stand_ins, feed))
+
+    assert change['feeds'] == 1
+    assert change['articles'] == N + 2
+    assert change['completions'] == N + 2
+
+    for i, result in enumerate(results):
+        assert sum(1 for article in json.loads(result).values() if article.get('summary')) == N + i % 3
+
+
+def test_concurrent_sync_and_async_get_feed(stand_ins, new_feed):
+    '''As test_concurrent_get_feed(), with sync and async get_feed() calls
+    for the same feed at the same time.'''
+
+    feed = new_feed()
+    feed_url = stand_ins['fixtures'].feed_url(feed)
+    before = counts(stand_ins, feed)
+
+    async def main() -> list:
+        return await asyncio.gather(*[async_tools.get_feed(feed_url, n=N) for _ in range(CALLERS // 2)])
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        sync_results = [executor.submit(tool_funcs.get_feed, feed_url, N) for _ in range(CALLERS // 2)]
+        results = asyncio.run(main()) + [result.result() for result in sync_results]
+
+    change = delta(before, counts(stand_ins, feed))
+
+    assert change['feeds'] == 1
+    assert change['articles'] == N
+    assert change['completions'] == N
+
+    for result in results:
+        assert sum(1 for article in json.loads(result).values() if article.get('summary')) == N
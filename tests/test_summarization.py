@@ -0,0 +1,118 @@
+'''Summaries share one client, look the model up once and run up to
+SUMMARY_WORKERS at a time, against the fake LLM server.'''
+
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import functions.summarization as summarization_funcs
+
+ARTICLES = 3 * summarization_funcs.SUMMARY_WORKERS
+LATENCY = 0.2
+
+
+@pytest.fixture
+def llm(stand_ins):
+    '''Fake LLM server with slower completions, so summaries overlap, and
+    its counters read from zero.'''
+
+    server = stand_ins['llm']
+    latency = server.latency
+
+    with server.lock:
+        server.latency = LATENCY
+        server.models = 0
+        server.completions = 0
+        server.max_active = 0
+
+    yield server
+
+    server.latency = latency
+
+
+def articles(name: str) -> list:
+    '''Gets (title, content) pairs no other test summarizes.'''
+
+    return [
+        (f'{name} {i}', f'Content of {name} article {i}. ' * 20)
+        for i in range(ARTICLES)
+    ]
+
+
+def test_shared_client(llm, monkeypatch):
+    '''Concurrent summaries share one client, created with one model
+    listing.'''
+
+    monkeypatch.setattr(summarization_funcs, 'CLIENT', None)
+    monkeypatch.setattr(summarization_funcs, 'MODEL_ID', None)
+
+    with ThreadPoolExecutor(max_workers=ARTICLES) as executor:
+        summaries = list(executor.map(
+            lambda article: summarization_funcs.summarize_content(*article, use_cache=False),
+            articles('shared client')
+        ))
+
+    assert all(summary.startswith('Summary:') for summary in summaries)
+    assert llm.models == 1
+    assert llm.completions == ARTICLES
+    assert summarization_funcs.get_client()[0] is summarization_funcs.get_client()[0]
+
+
+def test_in_flight_limit(llm):
+    '''Submitted summaries run SUMMARY_WORKERS at a time, so they take
+    about as long as the slowest of each round rather than their sum.'''
+
+    start_time = time.monotonic()
+    futures = [summarization_funcs.submit_summary(*article) for article in articles('in flight')]
+    summaries = [future.result() for future in futures]
+    elapsed = time.monotonic() - start_time
+
+    assert all(summary.startswith('Summary:') for summary in summaries)
+    assert llm.max_active == summarization_funcs.SUMMARY_WORKERS
+    assert elapsed < ARTICLES * LATENCY / 2
+
+
+def test_async_in_flight_limit(llm):
+    '''As test_in_flight_limit(), for asummarize_content().'''
+
+    async def main() -> list:
+        return await asyncio.gather(*[
+            summarization_funcs.asummarize_content(*article, use_cache=False)
+            for article in articles('async in flight')
+        ])
+
+    start_time = time.monotonic()
+    summaries = asyncio.run(main())
+    elapsed = time.monotonic() - start_time
+
+    assert all(summary.startswith('Summary:') for summary in summaries)
+    assert llm.max_active == summarization_funcs.SUMMARY_WORKERS
+    assert elapsed < ARTICLES * LATENCY / 2
+
+
+def test_shared_in_flight_limit(llm):
+    '''Sync and async summaries at the same time are held to
+    SUMMARY_WORKERS between them.'''
+
+    sync_articles = articles('shared sync in flight')
+    async_articles = articles('shared async in flight')
+
+    async def main() -> list:
+        return await asyncio.gather(*[
+            summarization_funcs.asummarize_content(*article, use_cache=False)
+            for article in async_articles
+        ])
+
+    with ThreadPoolExecutor(max_workers=ARTICLES) as executor:
+        sync_summaries = [
+            executor.submit(summarization_funcs.summarize_content, *article, use_cache=False)
+            for article in sync_articles
+        ]
+
+        summaries = asyncio.run(main()) + [summary.result() for summary in sync_summaries]
+
+    assert all(summary.startswith('Summary:') for summary in summaries)
+    assert llm.completions == 2 * ARTICLES
+    assert llm.max_active == summarization_funcs.SUMMARY_WORKERS
@@ -0,0 +1,126 @@
+'''The local vector store saves to its path and loads back memory-mapped,
+without reading the embeddings into memory up front, and drops an
+article's stale chunks when it is re-ingested shorter.'''
+
+import numpy as np
+
+import functions.rag as rag
+import functions.vector_store as vector_store
+
+
+def chunks(article: int, n: int = 3) -> list:
+    '''Gets n (id, text, metadata) chunks of an article.'''
+
+    return [
+        (f'{article}-{i}', f'article {article} chunk {i} about topic {article * 10 + i}',
+         {'namespace': f'Article {article}', 'article_id': str(article)})
+        for i in range(n)
+    ]
+
+
+def new_store(path) -> vector_store.LocalVectorStore:
+    '''Gets a local store at path using the hashing embedder.'''
+
+    return vector_store.LocalVectorStore(path=str(path), embedder=vector_store.hashing_embedder)
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    '''A saved store loads back memory-mapped and answers queries as the
+    original did.'''
+
+    store = new_store(tmp_path)
+    store.upsert(chunks(1) + chunks(2))
+    store.save()
+
+    loaded = new_store(tmp_path)
+
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.ids == store.ids
+    assert loaded.query('topic 21', top_k=2) == store.query('topic 21', top_k=2)
+
+
+def test_updates_after_load(tmp_path):
+    '''Replacing rows of a loaded store doesn't change the saved file until
+    the next save, which keeps new rows too and maps the file again.'''
+
+    store = new_store(tmp_path)
+    store.upsert(chunks(1))
+    store.save()
+
+    loaded = new_store(tmp_path)
+    loaded.upsert([('1-0', 'replaced text', {'namespace': 'Article 1', 'article_id': '1'})])
+
+    assert new_store(tmp_path).data[0] == 'article 1 chunk 0 about topic 10'
+    assert not np.array_equal(np.load(tmp_path / 'embeddings.npy')[0], loaded.embeddings[0])
+
+    loaded.upsert(chunks(2))
+    loaded.save()
+    reloaded = new_store(tmp_path)
+
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert len(reloaded.ids) == 6
+    assert reloaded.data[0] == 'replaced text'
+    assert reloaded.query('topic 21', top_k=1)[0].id == '2-1'
+
+
+def test_save_only_when_changed(tmp_path):
+    '''Saving an unchanged store writes nothing, close() saves changes.'''
+
+    store = new_store(tmp_path)
+    store.save()
+
+    assert not (tmp_path / 'embeddings.npy').exists()
+
+    store.upsert(chunks(1))
+    store.close()
+    written = (tmp_path / 'embeddings.npy').stat().st_mtime_ns
+
+    store.save()
+
+    assert (tmp_path / 'embeddings.npy').stat().st_mtime_ns == written
+    assert new_store(tmp_path).ids == store.ids
+
+
+def test_reingest_shorter_article(tmp_path):
+    '''Re-ingesting an article that got shorter deletes its old trailing
+    chunks, and the store still saves and loads.'''
+
+    store = new_store(tmp_path)
+    store.upsert(chunks(1, n=4) + chunks(2))
+
+    item = {'id': '1', 'title': 'Article 1', 'content': 'new chunk zero\nnew chunk one'}
+    assert rag._ingest_article(store, str.splitlines, item, 32) == 2 # pylint: disable=protected-access
+
+    assert store.ids == ['1-0', '1-1', '2-0', '2-1', '2-2']
+    assert {result.id for result in store.query('chunk', top_k=5, namespace='Article 1')} == {'1-0', '1-1'}
+    assert store.query('topic 21', top_k=1)[0].id == '2-1'
+
+    store.save()
+
+    assert new_store(tmp_path).ids == store.ids
+
+
+def test_rank_articles_by_id():
+    '''Articles sharing a title are ranked separately, and summed scores are
+    divided by the article's number of chunks, so a long article's many
+    weak matches don't outrank a short article's strong one.'''
+
+    def result(article_id: str, title: str, score: float, chunks: int):
+        return vector_store.QueryResult(
+            f'{article_id}-0', score, 'text', {'namespace': title, 'article_id': article_id, 'chunks': chunks}
+        )
+
+    results = [
+        result('short', 'Short', 0.9, 1),
+        result('long', 'Long', 0.5, 10),
+        result('long', 'Long', 0.5, 10),
+        result('long', 'Long', 0.5, 10),
+        result('other', 'Short', 0.4, 1)
+    ]
+
+    ranked = vector_store._rank_articles(results, 3, 'sum', 1) # pylint: disable=protected-access
+
+    assert [(article['id'], article['title']) for article in ranked] == [
+        ('short', 'Short'), ('other', 'Short'), ('long', 'Long')
+    ]
+    assert ranked[2]['score'] == 0.15